@@ -0,0 +1,428 @@
+# analytics.py
+# 플레이 기록(event_log.py 세그먼트)으로 밸런스 지표를 낸다.
+#   - 장면별 실패율 (실패 장면으로 가거나 오답/타이밍 실패한 비율)
+#   - 체크포인트 도착 시 신뢰도 분포
+#   - 단계별 체류 시간
+#   - attempt_em2 / attempt_s6 퍼즐의 시도 횟수 (+ 실패 장면별 체크포인트 재시도 수)
+#
+# 닫힌 세그먼트를 한 번씩만 읽어 열 단위 이진 파일(열 하나 = 고정 폭 배열 파일 하나)에 덧붙여 두고,
+# 집계는 그 파일들을 mmap 으로 열어 한 번에 계산한다. 밤마다 돌려도 새 세그먼트만 읽는다.
+# numpy 가 있으면 np.memmap + 벡터 연산, 없으면 같은 파일을 array 모듈로 읽어 파이썬 반복문으로 계산한다.
+#
+#   python analytics.py                 # 새 세그먼트 반영 후 보고서
+#   python analytics.py report --json
+#   python analytics.py bench --sessions 20000
+import os
+import sys
+import json
+import time
+import array
+import hashlib
+import argparse
+from collections import Counter, defaultdict
+
+import event_log
+import scenes
+
+try:
+    import numpy as np
+    _has_numpy = True
+except ImportError:
+    _has_numpy = False
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", os.path.join(BASE_DIR, ".cache", "analytics"))
+IDLE_CAP = float(os.getenv("ANALYTICS_IDLE_CAP", "600"))   # 이보다 긴 간격은 자리를 비운 것으로 보고 체류 시간에서 뺀다
+
+# 열 이름 → array 타입 코드 (numpy dtype 문자와 같다)
+COLUMNS = (
+    ("ts", "d"),            # 시각
+    ("sid", "q"),           # 세션 토큰의 64비트 해시
+    ("kind", "b"),          # KINDS 의 번호
+    ("scene", "h"),         # 출발 장면 번호 (manifest["scenes"])
+    ("to", "h"),            # 도착 장면 번호 (내레이션 이벤트는 scene 과 같다)
+    ("trust_before", "h"),  # 없으면 -1
+    ("trust_after", "h"),
+    ("streak", "h"),
+    ("ok", "b"),            # 답변/타이밍 성공 1, 실패 0, 해당 없음 -1
+    ("llm_ms", "f"),        # 내레이션 지연 (없으면 NaN)
+)
+KINDS = ("choice", "answer", "timing", "auto", "retry", "restore", "quit", "narration")
+TRANSITIONS = ("choice", "answer", "timing", "auto")   # 플레이어가 장면에서 한 행동
+STAGES = ("intro", "briefing", "info", "story1", "story2", "story3", "ending")
+PUZZLES = ("attempt_em2", "attempt_s6")
+
+
+def _sid(value) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "little", signed=True)
+
+
+# ==== 열 저장소 ====
+class ColumnStore:
+    """
+    directory/manifest.json + 열마다 <이름>.col. manifest 는 열을 다 덧붙인 뒤에 바꾸므로,
+    도중에 죽어도 다음 실행이 manifest 의 행 수에 맞춰 열 파일을 잘라 낸다.
+    """
+
+    def __init__(self, directory=ANALYTICS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = {"rows": 0, "segments": [], "scenes": []}
+        path = self._path("manifest.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        self._codes = {s: i for i, s in enumerate(self.manifest["scenes"])}
+        self._repair()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _repair(self):
+        rows = self.manifest["rows"]
+        for name, code in COLUMNS:
+            path = self._path(f"{name}.col")
+            size = rows * array.array(code).itemsize
+            if not os.path.exists(path):
+                open(path, "wb").close()
+            if os.path.getsize(path) != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _scene(self, scene_id) -> int:
+        code = self._codes.get(scene_id)
+        if code is None:
+            code = self._codes[scene_id] = len(self.manifest["scenes"])
+            self.manifest["scenes"].append(scene_id)
+        return code
+
+    def _row(self, event, cols):
+        kind = event.get("kind")
+        if kind not in KINDS:
+            return False
+        scene = self._scene(f"{event.get('stage')}/{event.get('sub')}")
+        cols["ts"].append(float(event.get("ts") or 0.0))
+        cols["sid"].append(_sid(event.get("sid")))
+        cols["kind"].append(KINDS.index(kind))
+        cols["scene"].append(scene)
+        cols["to"].append(self._scene(event["to"]) if event.get("to") else scene)
+        for name in ("trust_before", "trust_after", "streak"):
+            value = event.get(name)
+            cols[name].append(-1 if value is None else int(value))
+        ok = event.get("ok")
+        cols["ok"].append(-1 if ok is None else int(bool(ok)))
+        ms = event.get("llm_ms")
+        cols["llm_ms"].append(float("nan") if ms is None else float(ms))
+        return True
+
+    def ingest(self, events_dir=event_log.EVENT_LOG_DIR) -> dict:
+        """아직 읽지 않은 닫힌 세그먼트를 열 파일에 덧붙인다."""
+        done = set(self.manifest["segments"])
+        new = [p for p in event_log.segments(events_dir) if os.path.basename(p) not in done]
+        added = bad = 0
+        for path in new:
+            cols = {name: array.array(code) for name, code in COLUMNS}
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        ok = self._row(json.loads(line), cols)
+                    except (ValueError, TypeError, KeyError):
+                        ok = False
+                    bad += not ok
+            for name, _code in COLUMNS:
+                with open(self._path(f"{name}.col"), "ab") as out:
+                    cols[name].tofile(out)
+            n = len(cols["ts"])
+            self.manifest["rows"] += n
+            self.manifest["segments"].append(os.path.basename(path))
+            self._save_manifest()
+            added += n
+        return {"segments": len(new), "rows": added, "skipped": bad, "total_rows": self.manifest["rows"]}
+
+    def _save_manifest(self):
+        tmp = self._path("manifest.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp, self._path("manifest.json"))
+
+    def columns(self) -> dict:
+        """열 이름 → 배열. numpy 면 읽기 전용 memmap (행이 없으면 빈 배열)."""
+        rows = self.manifest["rows"]
+        out = {}
+        for name, code in COLUMNS:
+            path = self._path(f"{name}.col")
+            if _has_numpy:
+                out[name] = np.memmap(path, dtype=np.dtype(code), mode="r", shape=(rows,)) if rows else np.zeros(0, code)
+            else:
+                a = array.array(code)
+                with open(path, "rb") as f:
+                    a.frombytes(f.read(rows * a.itemsize))
+                out[name] = a
+        return out
+
+
+# ==== 장면 그래프에서 가져오는 기준 ====
+def graph_facts(scene_ids, graph=None):
+    """장면 번호별 (실패 장면 여부, 체크포인트 여부, 단계 번호) 와 퍼즐 → 장면 번호."""
+    graph = graph or scenes.GRAPH
+    checkpoints = {o.checkpoint for s in graph.nodes.values() for o in s.outcomes() if o.checkpoint}
+    puzzles = {s.answer.attempts: s.id for s in graph.nodes.values() if s.answer is not None and s.answer.attempts}
+    fail, ckpt, stage = [], [], []
+    for sid in scene_ids:
+        node = graph.nodes.get(sid)
+        fail.append(node is not None and node.kind == "fail")
+        ckpt.append(sid in checkpoints)
+        head = sid.split("/", 1)[0]
+        stage.append(STAGES.index(head) if head in STAGES else len(STAGES))
+    codes = {s: i for i, s in enumerate(scene_ids)}
+    return fail, ckpt, stage, {p: codes.get(puzzles.get(p)) for p in PUZZLES}
+
+
+def _summary(values):
+    """정렬된 값 목록 → 요약 (파이썬 경로)."""
+    if not values:
+        return {"n": 0}
+    pick = lambda q: values[min(len(values) - 1, max(0, round(q * (len(values) - 1))))]   # numpy method="nearest"
+    return {"n": len(values), "mean": round(sum(values) / len(values), 2), "p10": pick(0.1), "p50": pick(0.5),
+            "p90": pick(0.9), "max": values[-1]}
+
+
+# ==== 집계 (numpy) ====
+def _report_numpy(cols, scene_ids):
+    fail, ckpt, stage, puzzles = graph_facts(scene_ids)
+    S = len(scene_ids)
+    fail, ckpt, stage = np.array(fail + [False]), np.array(ckpt + [False]), np.array(stage + [len(STAGES)])
+    kind, scene, to, ok = cols["kind"], cols["scene"], cols["to"], cols["ok"]
+    trans = np.isin(kind, [KINDS.index(k) for k in TRANSITIONS])
+
+    # 장면별 실패율
+    failed = trans & (fail[to] | (ok == 0))
+    n = np.bincount(scene[trans], minlength=S)
+    bad = np.bincount(scene[failed], minlength=S)
+    failures = [{"scene": scene_ids[i], "n": int(n[i]), "failed": int(bad[i]), "rate": round(bad[i] / n[i], 4)}
+                for i in np.flatnonzero(n)]
+
+    # 체크포인트 도착 시 신뢰도
+    arrive = trans & ckpt[to]
+    trust = {}
+    for c in np.unique(to[arrive]):
+        v = np.asarray(cols["trust_after"][arrive & (to == c)], dtype=np.float64)
+        p10, p50, p90 = np.percentile(v, [10, 50, 90], method="nearest").astype(int).tolist()
+        trust[scene_ids[c]] = {"n": int(v.size), "mean": round(float(v.mean()), 2), "p10": p10, "p50": p50, "p90": p90,
+                               "hist": np.bincount(np.minimum(v // 10, 9).astype(np.int64), minlength=10).tolist()}
+
+    # 단계별 체류 시간: 한 이벤트의 도착 장면에서 같은 세션의 다음 이벤트까지
+    moves = kind != KINDS.index("narration")
+    sid, ts, dest = cols["sid"][moves], cols["ts"][moves], to[moves]
+    order = np.lexsort((ts, sid))
+    sid, ts, dest = sid[order], ts[order], dest[order]
+    dt = np.diff(ts)
+    valid = (sid[1:] == sid[:-1]) & (dt >= 0) & (dt <= IDLE_CAP)
+    st = stage[dest[:-1]][valid]
+    seconds = np.bincount(st, weights=dt[valid], minlength=len(STAGES) + 1)
+    pairs = np.unique(np.column_stack((sid[:-1][valid], st)), axis=0) if st.size else np.zeros((0, 2), np.int64)
+    visits = np.bincount(pairs[:, 1].astype(np.int64), minlength=len(STAGES) + 1)
+    stages = {name: {"sessions": int(visits[i]), "total_s": round(float(seconds[i]), 1),
+                     "mean_s": round(float(seconds[i] / visits[i]), 1) if visits[i] else None}
+              for i, name in enumerate(STAGES) if visits[i]}
+
+    # 퍼즐 시도 횟수 (세션별 답변 제출 수)
+    retries = {}
+    answer = kind == KINDS.index("answer")
+    for name, code in puzzles.items():
+        if code is None:
+            continue
+        m = answer & (scene == code)
+        sessions, counts = np.unique(cols["sid"][m], return_counts=True)
+        solved = np.unique(cols["sid"][m & (ok == 1)]).size
+        if counts.size:
+            retries[name] = {"sessions": int(sessions.size), "solved": int(solved),
+                             "mean": round(float(counts.mean()), 2),
+                             "p50": int(np.percentile(counts, 50, method="nearest")),
+                             "p90": int(np.percentile(counts, 90, method="nearest")), "max": int(counts.max()),
+                             "multi": round(float((counts > 1).mean()), 4)}
+    r = kind == KINDS.index("retry")
+    ck = np.bincount(scene[r], minlength=S)
+    retries["checkpoint_retries"] = {scene_ids[i]: int(ck[i]) for i in np.flatnonzero(ck)}
+    return failures, trust, stages, retries
+
+
+# ==== 집계 (파이썬) ====
+def _report_python(cols, scene_ids):
+    fail, ckpt, stage, puzzles = graph_facts(scene_ids)
+    trans_kinds = {KINDS.index(k) for k in TRANSITIONS}
+    narration, answer, retry = KINDS.index("narration"), KINDS.index("answer"), KINDS.index("retry")
+    kind, scene, to, ok, trust_after = cols["kind"], cols["scene"], cols["to"], cols["ok"], cols["trust_after"]
+    n, bad, arrive, ck = Counter(), Counter(), defaultdict(list), Counter()
+    per_session = defaultdict(list)
+    attempts, solved = {p: Counter() for p in puzzles}, {p: set() for p in puzzles}
+    codes = {code: p for p, code in puzzles.items() if code is not None}
+    for i in range(len(kind)):
+        k = kind[i]
+        if k != narration:
+            per_session[cols["sid"][i]].append((cols["ts"][i], to[i]))
+        if k == retry:
+            ck[scene[i]] += 1
+        if k not in trans_kinds:
+            continue
+        n[scene[i]] += 1
+        if fail[to[i]] or ok[i] == 0:
+            bad[scene[i]] += 1
+        if ckpt[to[i]]:
+            arrive[to[i]].append(trust_after[i])
+        if k == answer and scene[i] in codes:
+            p = codes[scene[i]]
+            attempts[p][cols["sid"][i]] += 1
+            if ok[i] == 1:
+                solved[p].add(cols["sid"][i])
+
+    failures = [{"scene": scene_ids[c], "n": n[c], "failed": bad[c], "rate": round(bad[c] / n[c], 4)} for c in sorted(n)]
+    trust = {}
+    for c in sorted(arrive):
+        values = sorted(arrive[c])
+        s = _summary(values)
+        hist = [0] * 10
+        for v in values:
+            hist[min(v // 10, 9)] += 1
+        trust[scene_ids[c]] = {"n": s["n"], "mean": s["mean"], "p10": s["p10"], "p50": s["p50"], "p90": s["p90"],
+                               "hist": hist}
+    seconds, visits = Counter(), Counter()
+    for rows in per_session.values():
+        rows.sort()
+        seen = set()
+        for (t0, dest), (t1, _) in zip(rows, rows[1:]):
+            dt = t1 - t0
+            if 0 <= dt <= IDLE_CAP:
+                seconds[stage[dest]] += dt
+                seen.add(stage[dest])
+        visits.update(seen)
+    stages = {name: {"sessions": visits[i], "total_s": round(seconds[i], 1), "mean_s": round(seconds[i] / visits[i], 1)}
+              for i, name in enumerate(STAGES) if visits[i]}
+    retries = {}
+    for p, counter in attempts.items():
+        if counter:
+            s = _summary(sorted(counter.values()))
+            retries[p] = {"sessions": s["n"], "solved": len(solved[p]), "mean": s["mean"], "p50": s["p50"],
+                          "p90": s["p90"], "max": s["max"],
+                          "multi": round(sum(1 for v in counter.values() if v > 1) / s["n"], 4)}
+    retries["checkpoint_retries"] = {scene_ids[c]: ck[c] for c in sorted(ck)}
+    return failures, trust, stages, retries
+
+
+def report(store: ColumnStore) -> dict:
+    cols = store.columns()
+    scene_ids = store.manifest["scenes"]
+    started = time.perf_counter()
+    if not len(cols["ts"]):
+        failures, trust, stages, retries = [], {}, {}, {}
+    elif _has_numpy:
+        failures, trust, stages, retries = _report_numpy(cols, scene_ids)
+    else:
+        failures, trust, stages, retries = _report_python(cols, scene_ids)
+    failures.sort(key=lambda r: -r["rate"])
+    return {"rows": store.manifest["rows"], "segments": len(store.manifest["segments"]),
+            "engine": "numpy" if _has_numpy else "python", "seconds": round(time.perf_counter() - started, 3),
+            "failure_rates": failures, "trust_at_checkpoints": trust, "time_per_stage": stages,
+            "puzzle_attempts": retries}
+
+
+def print_report(r):
+    print(f"행 {r['rows']:,} (세그먼트 {r['segments']}), {r['engine']} 집계 {r['seconds']}s")
+    print("\n[장면별 실패율]")
+    for row in r["failure_rates"]:
+        print(f"  {row['scene']:40s} {row['rate']:7.2%}  ({row['failed']}/{row['n']})")
+    print("\n[체크포인트 도착 시 신뢰도]  (히스토그램: 0-9, 10-19, ..., 90-100)")
+    for sid, s in r["trust_at_checkpoints"].items():
+        print(f"  {sid:40s} n={s['n']} 평균 {s['mean']} p10/50/90 {s['p10']:.0f}/{s['p50']:.0f}/{s['p90']:.0f}  {s['hist']}")
+    print("\n[단계별 체류 시간]")
+    for name, s in r["time_per_stage"].items():
+        print(f"  {name:10s} 세션 {s['sessions']:>8,}  평균 {s['mean_s']}s")
+    print("\n[퍼즐 시도 횟수]")
+    for name, s in r["puzzle_attempts"].items():
+        if name == "checkpoint_retries":
+            continue
+        print(f"  {name:12s} 세션 {s['sessions']:,} 성공 {s['solved']:,}  평균 {s['mean']} p50 {s['p50']:.0f} "
+              f"p90 {s['p90']:.0f} 최대 {s['max']}  2회 이상 {s['multi']:.1%}")
+    for sid, count in r["puzzle_attempts"].get("checkpoint_retries", {}).items():
+        print(f"  체크포인트 재시도 {sid:30s} {count:,}")
+
+
+# ==== 벤치마크 ====
+def bench(args) -> int:
+    """loadtest 의 무작위 플레이어로 기록을 만들어 반영/집계 시간을 잰다."""
+    import random
+    import tempfile
+    import scene_graph
+    from itertools import islice
+    from loadtest import playthrough, random_policy, start_state
+
+    rng = random.Random(args.seed)
+    engine = scene_graph.Engine(scenes.GRAPH)
+    with tempfile.TemporaryDirectory() as tmp:
+        events_dir = os.path.join(tmp, "events")
+        log = event_log.EventLog(events_dir, max_queue=10 ** 9, flush_interval=0.05,
+                                 rotate_bytes=args.segment_mb * 1024 * 1024)
+        started = time.perf_counter()
+        for i in range(args.sessions):
+            state = start_state(f"요원{i}")
+            ts = 1.7e9 + rng.random() * 86400
+            for before, kind, action, _, ok in islice(playthrough(engine, state, random_policy, rng), args.clicks):
+                event = {}
+                if kind == "choice":
+                    event["choice"] = action.key
+                elif ok is not None:
+                    event["ok"] = ok
+                ts += rng.expovariate(1 / 8.0)
+                log.emit({"ts": ts, "sid": i, "kind": kind, "stage": before[0], "sub": before[1],
+                          "to": f"{state['stage']}/{state['sub']}", "trust_before": before[2],
+                          "trust_after": state["trust"], "streak": state["streak"], **event})
+        log.close()
+        print(f"기록 생성 {log.written:,}행, {len(event_log.segments(events_dir))} 세그먼트 "
+              f"({time.perf_counter() - started:.1f}s)")
+        store = ColumnStore(os.path.join(tmp, "analytics"))
+        t = time.perf_counter()
+        print(f"반영: {store.ingest(events_dir)} ({time.perf_counter() - t:.2f}s)")
+        t = time.perf_counter()
+        again = store.ingest(events_dir)
+        print(f"다시 반영(새 세그먼트 없음): {again['segments']} 세그먼트 ({time.perf_counter() - t:.3f}s)")
+        r = report(store)
+        print_report(r)
+    return 0 if again["segments"] == 0 and r["rows"] == log.written else 1
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="플레이 기록 집계")
+    sub = ap.add_subparsers(dest="cmd")
+    for name in ("ingest", "report"):
+        p = sub.add_parser(name, help="새 세그먼트 반영" if name == "ingest" else "새 세그먼트 반영 후 보고서")
+        p.add_argument("--events", default=event_log.EVENT_LOG_DIR)
+        p.add_argument("--store", default=ANALYTICS_DIR)
+        p.add_argument("--json", action="store_true")
+    b = sub.add_parser("bench", help="합성 기록으로 반영/집계 시간 측정")
+    b.add_argument("--sessions", type=int, default=5000)
+    b.add_argument("--clicks", type=int, default=60, help="세션 당 최대 행동 수")
+    b.add_argument("--segment-mb", type=float, default=4)
+    b.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    if args.cmd == "bench":
+        return bench(args)
+    if args.cmd is None:
+        args = ap.parse_args(["report", *(argv or sys.argv[1:])])
+
+    store = ColumnStore(args.store)
+    added = store.ingest(args.events)
+    if args.cmd == "ingest":
+        print(json.dumps(added, ensure_ascii=False))
+        return 0
+    r = report(store)
+    r["ingested"] = added
+    if args.json:
+        print(json.dumps(r, ensure_ascii=False, indent=2))
+    else:
+        print(f"새 세그먼트 {added['segments']}개, {added['rows']:,}행 반영")
+        print_report(r)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+# assets.py
+# 배경 이미지 / BGM 같은 정적 에셋을 한 번만 읽고 가공해 재사용한다.
+# 프로세스 내 LRU 뒤에 워커 간 공유 캐시(shared_cache.py)를 두어, 다른 워커가 이미 인코딩한 결과도 가져다 쓴다.
+import os
+import io
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from importlib.util import find_spec
+
+import shared_cache
+
+# Pillow 는 처음 인코딩할 때 불러온다 (시작 경로에서 import 하지 않음)
+_has_pil = find_spec("PIL") is not None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Streamlit 정적 서빙(.streamlit/config.toml 의 enableStaticServing)은 앱 루트의 static/ 폴더를 app/static/ 로 노출한다.
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_URL = "app/static"
+
+BG_MAX_WIDTH = int(os.getenv("BG_MAX_WIDTH", "1280"))
+BG_QUALITY = int(os.getenv("BG_QUALITY", "70"))
+BG_FORMAT = os.getenv("BG_FORMAT", "WEBP").upper()  # WEBP | JPEG
+BG_STATIC = os.getenv("BG_STATIC", "1") != "0"      # 0이면 작은 data-URI로 인라인
+ASSET_CACHE_MB = int(os.getenv("ASSET_CACHE_MB", "32"))
+
+_MIME = {"WEBP": "image/webp", "JPEG": "image/jpeg", ".png": "image/png",
+         ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp",
+         ".mp3": "audio/mp3", ".ogg": "audio/ogg", ".wav": "audio/wav"}
+_EXT = {"image/webp": ".webp", "image/jpeg": ".jpg", "image/png": ".png"}
+
+
+# ==== 용량 제한 LRU (세션 간 공유) ====
+class BytesLRU:
+    """총 바이트 수 기준으로 오래된 항목부터 내보내는 스레드 안전 LRU."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value, nbytes: int):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[0]
+            if nbytes > self.max_bytes:
+                return value  # 캐시에 담을 수 없는 크기 → 저장하지 않고 그대로 반환
+            self._items[key] = (nbytes, value)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (n, _) = self._items.popitem(last=False)
+                self.size -= n
+            return value
+
+
+_cache = BytesLRU(ASSET_CACHE_MB * 1024 * 1024)
+_urls = {}  # digest -> 이미 만들어 둔 URL (정적 파일 존재 확인/base64 재인코딩 생략)
+
+
+def _shared_key(key) -> str:
+    return ":".join(map(str, key))
+
+
+def _file_key(path: str):
+    """경로 + mtime 으로 캐시 키를 만든다. 파일이 바뀌면 자동으로 새 키가 된다."""
+    path = path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+    return os.path.abspath(path), os.path.getmtime(path)
+
+
+# ==== 배경 이미지 ====
+def _encode_background(path: str):
+    """뷰포트 크기로 축소 + WebP/JPEG 재압축. Pillow가 없으면 원본을 그대로 쓴다."""
+    if not _has_pil:
+        with open(path, "rb") as f:
+            data = f.read()
+        return data, _MIME.get(os.path.splitext(path)[1].lower(), "image/png")
+
+    from PIL import Image
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        if img.width > BG_MAX_WIDTH:
+            h = round(img.height * BG_MAX_WIDTH / img.width)
+            img = img.resize((BG_MAX_WIDTH, h), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format=BG_FORMAT, quality=BG_QUALITY, optimize=True)
+    return buf.getvalue(), _MIME[BG_FORMAT]
+
+
+def background_variant(path: str):
+    """(bytes, mime, digest) — (경로, mtime, 가공 옵션) 당 한 번만 인코딩한다."""
+    key = ("bg",) + _file_key(path) + (BG_MAX_WIDTH, BG_QUALITY, BG_FORMAT)
+    hit = _cache.get(key)
+    if hit is not None:
+        return hit
+    shared = shared_cache.get_shared()
+    blob = shared.get("asset", _shared_key(key)) if shared is not None else None
+    if blob is not None:
+        mime, data = blob.split(b"\n", 1)
+        mime = mime.decode()
+    else:
+        data, mime = _encode_background(key[1])
+        if shared is not None:
+            shared.put("asset", _shared_key(key), mime.encode() + b"\n" + data)
+    digest = hashlib.sha1(data).hexdigest()[:12]
+    return _cache.put(key, (data, mime, digest), len(data))
+
+
+def background_url(path: str) -> str:
+    """
+    배경 URL을 돌려준다.
+    정적 서빙이 켜져 있으면 content-hash 파일명(static/bg-<hash>.webp)으로 한 번만 써두고
+    그 URL을 돌려주므로 브라우저가 캐시한다. 아니면 축소된 data-URI를 돌려준다.
+    """
+    data, mime, digest = background_variant(path)
+    url = _urls.get(digest)
+    if url is not None:
+        return url
+    if BG_STATIC:
+        name = f"bg-{digest}{_EXT[mime]}"
+        target = os.path.join(STATIC_DIR, name)
+        if not os.path.exists(target):
+            os.makedirs(STATIC_DIR, exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        url = f"{STATIC_URL}/{name}"
+    else:
+        url = f"data:{mime};base64,{base64.b64encode(data).decode()}"
+    _urls[digest] = url
+    return url
+
+
+_css = {}  # 경로 → 마지막으로 만든 배경 <style> 블록
+
+
+def background_css(path: str) -> str:
+    """배경을 적용하는 <style> 블록. 정적 서빙 시 수백 바이트에 불과하다."""
+    _css[path] = css = f"""
+        <style>
+        .stApp {{
+            background: url("{background_url(path)}");
+            background-size: cover;
+            background-position: center;
+            background-attachment: fixed;
+        }}
+        </style>
+        """
+    return css
+
+
+def background_css_cached(path: str):
+    """이 프로세스에서 이미 만든 배경 <style> 블록. 없으면 None (파일/공유 캐시를 건드리지 않는다)."""
+    return _css.get(path)
+
+
+# ==== BGM ====
+def audio_bytes(path: str) -> bytes:
+    """오디오 파일 바이트를 (경로, mtime) 당 한 번만 읽어 모든 세션이 공유한다."""
+    key = ("audio",) + _file_key(path)
+    hit = _cache.get(key)
+    if hit is not None:
+        return hit
+    shared = shared_cache.get_shared()
+    data = shared.get("asset", _shared_key(key)) if shared is not None else None
+    if data is None:
+        with open(key[1], "rb") as f:
+            data = f.read()
+        if shared is not None:
+            shared.put("asset", _shared_key(key), data)
+    return _cache.put(key, data, len(data))
+
+
+def audio_mime(path: str) -> str:
+    return _MIME.get(os.path.splitext(path)[1].lower(), "audio/mp3")
+
+
+def cache_stats() -> dict:
+    out = {"bytes": _cache.size, "max_bytes": _cache.max_bytes,
+           "hits": _cache.hits, "misses": _cache.misses}
+    shared = shared_cache.get_shared()
+    if shared is not None:
+        out["shared"] = shared.stats().get("asset", {"entries": 0, "bytes": 0})
+    return out
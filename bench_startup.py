@@ -0,0 +1,173 @@
+# bench_startup.py
+# 콜드 스타트 회귀 검사. 새 파이썬 프로세스에서
+#   1) game.py 가 불러오는 이 저장소의 모듈을 import 하는 시간 (streamlit 자체는 먼저 불러 두고 재지 않는다)
+#   2) (streamlit 이 설치돼 있으면) AppTest 로 game.py 를 처음 실행해 이름 등록 폼을 그리는 시간
+# 을 재고, 그동안 앱 폴더의 파일 I/O / SQLite 연결 / 소켓 연결이 있었는지, 무거운 모듈(openai 등)을
+# 새로 불러왔는지 감사 훅(sys.addaudithook)으로 확인한다.
+#
+#   python bench_startup.py            # 측정 → 예산/기준선을 넘거나 첫 화면 전에 I/O 가 있으면 종료 코드 1
+#   python bench_startup.py --save     # 지금 측정값을 기준선(.cache/startup_baseline.json)으로 저장
+import os
+import ast
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(BASE_DIR, "game.py")
+BASELINE = os.path.join(BASE_DIR, ".cache", "startup_baseline.json")
+# 기본 예산은 측정값(imports 약 85ms, 첫 화면 약 370ms)의 약 1.5배. 기준선 파일(.cache, 커밋하지 않음)이
+# 없는 CI 에서도 이 예산만으로 회귀가 잡히도록 빡빡하게 둔다. 느린 머신에서는 환경 변수로 올린다.
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "130"))
+RENDER_BUDGET_MS = float(os.getenv("STARTUP_RENDER_BUDGET_MS", "550"))
+TOLERANCE = 0.3      # 기준선 대비 허용 증가율
+SLACK_MS = 20.0      # 짧은 측정값의 흔들림 허용치
+
+# 첫 화면 전에 불러오면 안 되는 모듈 (필요한 곳에서 늦게 불러온다)
+HEAVY = ("openai", "httpx", "PIL", "numpy", "pandas", "redis")
+_WATCHED = ("sqlite3.connect", "socket.connect", "mmap.__new__", "os.mkdir")
+
+
+def app_modules(path=APP):
+    """game.py 최상위 import 중 이 저장소의 모듈."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.append(node.module)
+    return [n for n in names if os.path.exists(os.path.join(BASE_DIR, f"{n}.py"))]
+
+
+# ==== 자식 프로세스 ====
+def _install_hook(events):
+    skip = (".py", ".pyc", ".pth")
+
+    def hook(event, args):
+        if event == "open":
+            path = args[0]
+            if not isinstance(path, str):
+                return
+            path = os.path.abspath(path)
+            if (path.startswith(BASE_DIR + os.sep) and not path.endswith(skip) and "__pycache__" not in path
+                    and os.sep + ".streamlit" + os.sep not in path):
+                events.append(f"open {os.path.relpath(path, BASE_DIR)}")
+        elif event in _WATCHED:
+            events.append(f"{event} {str(args[0])[:120]}")
+    sys.addaudithook(hook)
+
+
+def child(phase):
+    sys.path.insert(0, BASE_DIR)
+    # 프레임워크 import 비용과 그 자신의 설정 파일 읽기는 이 앱의 회귀가 아니므로 측정 전에 끝내 둔다
+    try:
+        import streamlit  # noqa: F401
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        AppTest = None
+    preloaded = {m for m in HEAVY if m in sys.modules}
+    events = []
+    _install_hook(events)
+    out = {"phase": phase}
+    if phase == "imports":
+        started = time.perf_counter()
+        missing = []
+        for name in app_modules():
+            try:
+                __import__(name)
+            except ImportError:
+                missing.append(name)
+        out["ms"] = (time.perf_counter() - started) * 1000
+        out["missing"] = missing
+    else:
+        if AppTest is None:
+            print(json.dumps({"phase": phase, "skipped": "streamlit 없음"}))
+            return 0
+        started = time.perf_counter()
+        at = AppTest.from_file(APP, default_timeout=30).run()
+        out["ms"] = (time.perf_counter() - started) * 1000
+        out["errors"] = [str(e.value) for e in at.exception]
+        out["name_form"] = any(w.key == "name_input" for w in at.text_input)
+    out["io"] = events
+    out["heavy"] = [m for m in HEAVY if m in sys.modules and m not in preloaded]
+    print(json.dumps(out, ensure_ascii=False))
+    return 0
+
+
+# ==== 측정 ====
+def run_phase(phase, repeat):
+    results = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", phase],
+                              capture_output=True, text=True, cwd=BASE_DIR)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{phase} 측정 실패:\n{proc.stderr[-2000:]}")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    first = results[0]
+    if "skipped" in first:
+        return first
+    first["ms"] = statistics.median(r["ms"] for r in results)
+    first["runs"] = [round(r["ms"], 1) for r in results]
+    return first
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="콜드 스타트(import + 첫 화면) 회귀 검사")
+    ap.add_argument("--repeat", type=int, default=5, help="새 프로세스로 반복 측정할 횟수 (중앙값 사용)")
+    ap.add_argument("--save", action="store_true", help="측정값을 기준선으로 저장")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--child", choices=("imports", "render"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.child:
+        return child(args.child)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    budgets = {"imports": IMPORT_BUDGET_MS, "render": RENDER_BUDGET_MS}
+    failures, measured = [], {}
+    for phase in ("imports", "render"):
+        r = run_phase(phase, args.repeat)
+        if "skipped" in r:
+            print(f"{phase:8s} 건너뜀 ({r['skipped']})")
+            continue
+        measured[phase] = r["ms"]
+        base = baseline.get(phase)
+        note = f" (기준선 {base:.1f}ms)" if base else ""
+        print(f"{phase:8s} {r['ms']:8.1f}ms  {r['runs']}{note}")
+        if r.get("missing"):
+            print(f"         설치되지 않아 건너뛴 모듈: {', '.join(r['missing'])}")
+        if r["io"]:
+            failures.append(f"{phase}: 첫 화면 전 I/O {len(r['io'])}건")
+            for e in r["io"][:10]:
+                print(f"         I/O: {e}")
+        if r["heavy"]:
+            failures.append(f"{phase}: 무거운 모듈을 미리 불러옴 ({', '.join(r['heavy'])})")
+        if r.get("errors"):
+            failures.append(f"{phase}: 스크립트 예외 {r['errors'][:1]}")
+        if phase == "render" and not r.get("name_form"):
+            failures.append("render: 이름 등록 폼이 그려지지 않음")
+        if r["ms"] > budgets[phase]:
+            failures.append(f"{phase}: {r['ms']:.1f}ms > 예산 {budgets[phase]:.0f}ms")
+        if base and r["ms"] > base * (1 + TOLERANCE) + SLACK_MS:
+            failures.append(f"{phase}: 기준선 대비 느려짐 ({base:.1f} → {r['ms']:.1f}ms)")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({k: round(v, 1) for k, v in measured.items()}, f)
+        print(f"기준선 저장: {args.baseline}")
+        return 0
+    for msg in failures:
+        print(f"FAIL {msg}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# event_log.py
+# 플레이 이벤트 기록: 선택/답변/자동 전이/재시도/내레이션마다 한 줄씩 JSONL 로 남긴다.
+# 클릭 처리 중에는 dict 하나를 대기열(deque)에 붙이기만 하고 (잠금 없음, 직렬화도 하지 않음),
+# 백그라운드 스레드가 모아서 직렬화/쓰기를 한다. 대기열이 가득 차면 새 이벤트를 버리고 개수를 센다.
+#
+# 파일은 EVENT_LOG_DIR 아래 세그먼트 단위로 돌려 쓴다.
+#   events-<시작 시각>-<pid>.jsonl.part   쓰는 중
+#   events-<시작 시각>-<pid>.jsonl        닫힌 세그먼트 (크기/시간 상한에 닿거나 프로세스 종료 시 이름을 바꾼다)
+# 워커 프로세스마다 자기 세그먼트를 쓰므로 서로 섞이지 않는다. 집계는 닫힌 세그먼트만 읽으면 된다.
+# 워커가 비정상 종료(SIGKILL, OOM)해 .part 로 남은 세그먼트는 다음에 기록을 시작하는 프로세스가 닫아 준다.
+#
+#   EVENT_LOG=1 (기본) | 0    EVENT_LOG_DIR=.cache/events    EVENT_LOG_ROTATE_MB=32    EVENT_LOG_ROTATE_SECONDS=3600
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+from collections import deque
+
+from metrics import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EVENT_LOG = os.getenv("EVENT_LOG", "1") != "0"
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", os.path.join(BASE_DIR, ".cache", "events"))
+EVENT_LOG_QUEUE = int(os.getenv("EVENT_LOG_QUEUE", "10000"))                   # 대기열 상한 (넘으면 버림)
+EVENT_FLUSH_SECONDS = float(os.getenv("EVENT_FLUSH_SECONDS", "0.5"))
+EVENT_LOG_ROTATE_MB = float(os.getenv("EVENT_LOG_ROTATE_MB", "32"))
+EVENT_LOG_ROTATE_SECONDS = float(os.getenv("EVENT_LOG_ROTATE_SECONDS", "3600"))
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".jsonl"
+OPEN_SUFFIX = ".part"
+
+
+def segments(directory=EVENT_LOG_DIR, closed_only=True):
+    """세그먼트 파일 경로 (이름 순 = 시작 시각 순)."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(n for n in os.listdir(directory) if n.startswith(SEGMENT_PREFIX)
+                   and (n.endswith(SEGMENT_SUFFIX) or (not closed_only and n.endswith(SEGMENT_SUFFIX + OPEN_SUFFIX))))
+    return [os.path.join(directory, n) for n in names]
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True  # 윈도에서 os.kill(pid, 0) 은 프로세스를 끝내 버리므로 확인하지 않는다 (봉인하지 않음)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # 다른 사용자의 살아 있는 프로세스
+    return True
+
+
+def seal_orphans(directory=EVENT_LOG_DIR) -> int:
+    """쓰던 프로세스가 더 이상 없는 .part 세그먼트의 이름을 바꿔 닫는다. 닫은 개수."""
+    sealed = 0
+    for path in segments(directory, closed_only=False):
+        if not path.endswith(OPEN_SUFFIX):
+            continue
+        # events-<시작 시각>-<pid>[.<n>].jsonl.part
+        name = os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX + OPEN_SUFFIX)]
+        try:
+            pid = int(name.rsplit("-", 1)[1].split(".", 1)[0])
+        except (IndexError, ValueError):
+            continue
+        if pid == os.getpid() or _pid_alive(pid):
+            continue
+        try:
+            os.replace(path, path[:-len(OPEN_SUFFIX)])
+        except OSError:
+            continue  # 다른 워커가 먼저 닫았다
+        sealed += 1
+    if sealed:
+        metrics.inc("event_log_orphans_sealed", sealed)
+    return sealed
+
+
+class EventLog:
+    """
+    emit() 는 deque.append 한 번 (GIL 아래에서 원자적이라 잠금이 필요 없다).
+    flusher 스레드만 파일을 만지므로 쓰기 쪽에도 잠금이 없다.
+    """
+
+    def __init__(self, directory=EVENT_LOG_DIR, max_queue=EVENT_LOG_QUEUE, flush_interval=EVENT_FLUSH_SECONDS,
+                 rotate_bytes=int(EVENT_LOG_ROTATE_MB * 1024 * 1024), rotate_seconds=EVENT_LOG_ROTATE_SECONDS):
+        self.directory = directory
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.dropped = 0
+        self.written = 0
+        self._queue = deque()
+        self._file = None
+        self._path = None
+        self._opened = 0.0
+        self._wake = threading.Event()
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        seal_orphans(directory)
+        self._thread = threading.Thread(target=self._loop, name="event-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, event: dict):
+        """이벤트 하나를 대기열에 넣는다. 호출자는 이후 event 를 고치지 않아야 한다."""
+        if self._closed or len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            metrics.inc("event_log", result="dropped")
+            return
+        event.setdefault("ts", time.time())
+        self._queue.append(event)
+
+    # ---- 세그먼트 ----
+    def _open(self):
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        base = os.path.join(self.directory, f"{SEGMENT_PREFIX}{stamp}-{os.getpid()}")
+        path, n = base + SEGMENT_SUFFIX, 1
+        while os.path.exists(path) or os.path.exists(path + OPEN_SUFFIX):
+            path, n = f"{base}.{n}{SEGMENT_SUFFIX}", n + 1   # 같은 초에 돌린 경우
+        self._path = path
+        self._file = open(path + OPEN_SUFFIX, "a", encoding="utf-8")
+        self._opened = time.time()
+
+    def _seal(self):
+        """지금 세그먼트를 닫고 .part 를 뗀다."""
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path + OPEN_SUFFIX, self._path)
+        self._file = None
+        metrics.inc("event_log_segments")
+
+    def flush(self):
+        """대기열을 비워 쓴다 (flusher 스레드와 close 에서만 부른다)."""
+        n = len(self._queue)
+        if not n:
+            if self._file is not None and time.time() - self._opened > self.rotate_seconds:
+                self._seal()
+            return 0
+        lines = []
+        for _ in range(n):
+            lines.append(json.dumps(self._queue.popleft(), ensure_ascii=False, separators=(",", ":"), default=str))
+        if self._file is None:
+            self._open()
+        try:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+        except OSError:
+            self.dropped += n
+            metrics.inc("event_log", n, result="write_error")
+            return 0
+        self.written += n
+        metrics.inc("event_log", n, result="written")
+        if self._file.tell() >= self.rotate_bytes or time.time() - self._opened > self.rotate_seconds:
+            self._seal()
+        return n
+
+    def _loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                metrics.inc("event_log", result="flush_error")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=2.0)
+        self.flush()
+        self._seal()
+
+    def stats(self) -> dict:
+        return {"queued": len(self._queue), "written": self.written, "dropped": self.dropped,
+                "segment": os.path.basename(self._path) if self._file is not None else None}
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """프로세스 당 하나. EVENT_LOG=0 이거나 디렉터리를 만들 수 없으면 None."""
+    global _log
+    with _log_lock:
+        if _log is None and EVENT_LOG:
+            try:
+                _log = EventLog()
+            except OSError:
+                return None
+        return _log
+
+
+# ==== 벤치마크 ====
+def main(argv=None):
+    import random
+    import tempfile
+    import scenes
+    import scene_graph
+    from loadtest import playthrough, random_policy, start_state
+
+    ap = argparse.ArgumentParser(description="이벤트 기록 지연 측정 (클릭 한 번 = emit 한 번)")
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--clicks", type=int, default=40, help="세션 당 클릭 수")
+    ap.add_argument("--queue", type=int, default=EVENT_LOG_QUEUE)
+    ap.add_argument("--rotate-kb", type=int, default=256, help="세그먼트 크기 상한 (돌려 쓰기 확인용으로 작게)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    engine = scene_graph.Engine(scenes.GRAPH)
+    with tempfile.TemporaryDirectory() as tmp:
+        log = EventLog(tmp, max_queue=args.queue, rotate_bytes=args.rotate_kb * 1024)
+        plays = [playthrough(engine, start_state(f"요원{i}"), random_policy, rng) for i in range(args.sessions)]
+        lat = []
+        for _ in range(args.clicks):
+            for i, play in enumerate(plays):
+                step = next(play, None)
+                if step is None:
+                    continue  # 끝난 판
+                before, state = step.before, step.state
+                action = step.action.key if step.kind == "choice" else step.action
+                started = time.perf_counter()
+                log.emit({"sid": i, "kind": step.kind, "stage": before[0], "sub": before[1], "action": action,
+                          "to": f"{state['stage']}/{state['sub']}", "trust_before": before[2],
+                          "trust_after": state["trust"], "streak": state["streak"]})
+                lat.append(time.perf_counter() - started)
+        log.close()
+        rows = 0
+        for path in segments(tmp):
+            with open(path, encoding="utf-8") as f:
+                rows += sum(1 for _ in f)
+        lat.sort()
+        p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1e6
+        print(f"emits={len(lat)} p50={p(0.5):.1f}us p99={p(0.99):.1f}us max={lat[-1] * 1e6:.1f}us")
+        print(f"written={log.written} dropped={log.dropped} segments={len(segments(tmp))} rows={rows}")
+        ok = rows == log.written and rows + log.dropped == len(lat)
+    return 0 if ok and p(0.99) < 100 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+# explorer.py
+# 신뢰도/연속 가중치 규칙 위에서 장면 그래프의 모든 경로를 따져 보는 분석 도구.
+# 상태를 (장면, trust, streak, 조건에 쓰이는 값들, 체크포인트, 남은 재시도, 같은 장면 시도 횟수) 로 묶어
+# 메모이즈하므로, 선택 순서가 달라도 같은 상태로 모이는 경로는 한 번만 계산한다.
+# 아무것도 바꾸지 않고 같은 상태로 돌아오는 순환(정보 메뉴를 다시 읽기 등)은 플레이어가 결국 빠져나온다고 보고
+# 그 분기를 빼고 나머지 확률을 다시 나눈다.
+# streak 는 부호가 바뀌어도 초기화되지 않고 끝없이 쌓이므로(오답 루프, 신뢰도 펌프) 그대로 두면 상태 공간이
+# 유한하지 않다. 탐색에서는 ±STREAK_CAP 에서 멈추게 한다 (--streak-cap 0 이면 제한 없음, 매우 느림).
+#
+#   python explorer.py                          # 무작위 플레이어(정답률 0.6, 재시도 1회)의 엔딩 확률
+#   python explorer.py --policy best            # 성공 확률을 최대로 하는 플레이
+#   python explorer.py --policy greedy --json
+import sys
+import time
+import json
+import copy
+import argparse
+from collections import defaultdict
+
+import scenes
+import scene_graph
+from scene_graph import Engine, resolve, lookup, split_id
+
+SUCCESS = "ending/final"
+GAVE_UP = "(gave_up)"   # 같은 퍼즐에서 max_attempts 번 연속 실패하면 포기한 것으로 본다
+STREAK_CAP = 8          # |streak| 8 이면 가중치만 16 — 신뢰도 변화량(최대 12)보다 커서 이미 방향이 정해진다
+
+
+def guard_paths(graph):
+    """전이에 영향을 주는 상태 경로 (선택지 표시/활성 조건, 결과 조건). 메모 키에 들어간다."""
+    paths = set()
+    for scene in graph.nodes.values():
+        for choice in scene.choices:
+            paths.update(g.path for g in choice.when + choice.enabled)
+        for outcome in scene.outcomes():
+            paths.update(g.path for g in outcome.when)
+    paths.discard("trust")
+    return tuple(sorted(paths))
+
+
+def _values(state, paths):
+    out = []
+    for p in paths:
+        try:
+            out.append(lookup(state, p))
+        except (KeyError, TypeError):
+            out.append(None)
+    return tuple(out)
+
+
+def _copy(state):
+    """체크포인트 고리는 불변(freeze)이라 그대로 공유하고 나머지만 깊은 복사한다."""
+    return {k: v if k == "checkpoints" else copy.deepcopy(v) for k, v in state.items()}
+
+
+# ==== 정책 ====
+# policy(engine, state, scene, accuracy) -> [(확률, 행동, 인자), ...]
+#   행동: "choose"(Choice) / "answer"(bool 정답 여부) / "timing"(bool 성공 여부)
+def _options(engine, state, scene):
+    return [c for c in scene.choices if engine.visible(state, c) and engine.enabled(state, c)]
+
+
+def _puzzle(scene, accuracy):
+    return [(accuracy, scene.kind, True), (1 - accuracy, scene.kind, False)]
+
+
+def uniform_policy(engine, state, scene, accuracy):
+    if scene.kind in ("answer", "timing"):
+        return _puzzle(scene, accuracy)
+    options = _options(engine, state, scene)
+    return [(1 / len(options), "choose", c) for c in options]
+
+
+def greedy_policy(engine, state, scene, accuracy):
+    """
+    loadtest.greedy_policy 와 같은 기준(실패 장면으로 가지 않는 선택 중 신뢰도 변화가 가장 큰 것)으로 줄 세운다.
+    탐색은 이 중 순환하지 않는 첫 선택을 따른다.
+    """
+    if scene.kind in ("answer", "timing"):
+        return _puzzle(scene, accuracy)
+
+    def score(choice):
+        outcome = resolve(choice.outcomes, state)
+        return engine.graph.nodes[outcome.goto].kind != "fail", outcome.trust or 0
+    return [(1.0, "choose", c) for c in sorted(_options(engine, state, scene), key=score, reverse=True)]
+
+
+# 이름 → (정책, 선택 장면에서 분기를 합치는 방식: mix=확률 가중 / first=첫 분기 / best=성공 확률 최대)
+POLICIES = {"uniform": (uniform_policy, "mix"), "greedy": (greedy_policy, "first"), "best": (uniform_policy, "best")}
+
+
+# ==== 탐색 ====
+class Explorer:
+    """
+    explore(state) 는 {엔딩: 확률}. policy="best" 면 선택 장면에서 성공 확률이 가장 큰 선택 하나만 따르고,
+    "greedy" 는 정책이 매긴 순서의 첫 선택을 따른다. 퍼즐 정답률은 어느 경우든 확률로 둔다.
+    """
+
+    def __init__(self, graph=None, policy="uniform", accuracy=0.6, retries=1, max_attempts=3,
+                 streak_cap=STREAK_CAP):
+        self.graph = graph or scenes.GRAPH
+        self.engine = Engine(self.graph)
+        self.policy, self.mode = POLICIES[policy]
+        self.accuracy = accuracy
+        self.retries = retries
+        self.max_attempts = max_attempts
+        self.streak_cap = streak_cap
+        self.paths = guard_paths(self.graph)
+        self.memo = {}
+        self._stack = set()        # 지금 계산 중인 상태 키 (순환 감지)
+        self.visited = set()       # 방문한 장면
+        self.offered = set()       # (장면, 선택 key) — 어떤 상태에서든 고를 수 있었던 선택지
+        self.taken = set()         # (장면, 선택 key 또는 kind, 결과 번호) — 실제로 일어난 결과
+        self.loops = set()         # 같은 상태로 되돌아오는 선택 (장면:선택 key)
+
+    def _key(self, state, retries, attempts):
+        ring = state["checkpoints"]
+        snap = (ring[-1]["scene"], _values(ring[-1]["state"], self.paths)) if ring else None
+        return (state["stage"], state["sub"], state["trust"], state["streak"], _values(state, self.paths),
+                snap, retries, attempts)
+
+    def _mark(self, scene, tag, outcomes, state):
+        outcome = resolve(outcomes, state)
+        if outcome is not None:
+            self.taken.add((scene.id, tag, outcomes.index(outcome)))
+
+    def _step(self, state, scene, action, arg):
+        nxt = _copy(state)
+        if action == "choose":
+            self._mark(scene, arg.key, arg.outcomes, state)
+            self.engine.choose(nxt, arg)
+        elif action == "answer":
+            spec = scene.answer
+            self.taken.add((scene.id, "answer", int(not arg)))
+            if spec.attempts:
+                nxt[spec.attempts] += 1
+            outcome = spec.success if arg else spec.failure
+            if outcome is not None:
+                self.engine.apply(nxt, outcome)
+        else:
+            self.taken.add((scene.id, "timing", int(not arg)))
+            spec = scene.timing
+            self.engine.apply(nxt, spec.success if arg else spec.failure, elapsed=0.0 if arg else spec.limit + 1)
+        return nxt
+
+    def explore(self, state, retries=None, attempts=0):
+        """{엔딩: 확률}. 계산 중인 상태로 되돌아오는 순환이면 None."""
+        retries = self.retries if retries is None else retries
+        if self.streak_cap:
+            state["streak"] = max(-self.streak_cap, min(self.streak_cap, state["streak"]))
+        key = self._key(state, retries, attempts)
+        if key in self.memo:
+            return self.memo[key]
+        if key in self._stack:
+            return None
+        self._stack.add(key)
+        try:
+            result = self._explore(state, retries, attempts)
+        finally:
+            self._stack.discard(key)
+        self.memo[key] = result
+        return result
+
+    def _explore(self, state, retries, attempts):
+        scene = self.engine.scene(state)
+        self.visited.add(scene.id)
+        if scene.kind == "final":
+            result = {scene.id: 1.0}
+        elif scene.kind == "fail":
+            if retries > 0 and state["checkpoints"]:
+                nxt = _copy(state)
+                self.engine.retry(nxt)
+                result = self.explore(nxt, retries - 1)
+            else:
+                result = {scene.id: 1.0}
+        elif scene.auto and resolve(scene.auto, state) is not None:
+            self._mark(scene, "auto", scene.auto, state)
+            nxt = _copy(state)
+            self.engine.run_auto(nxt, scene)
+            result = self.explore(nxt, retries)
+        else:
+            if scene.kind == "choice":
+                self.offered.update((scene.id, c.key) for c in _options(self.engine, state, scene))
+            branches = []
+            for prob, action, arg in self.policy(self.engine, state, scene, self.accuracy):
+                nxt = self._step(state, scene, action, arg)
+                if (nxt["stage"], nxt["sub"]) == (state["stage"], state["sub"]):
+                    # 같은 장면에 머무름 (오답 등)
+                    sub = {GAVE_UP: 1.0} if attempts + 1 >= self.max_attempts else self.explore(nxt, retries, attempts + 1)
+                else:
+                    sub = self.explore(nxt, retries)
+                if sub is not None:
+                    branches.append((prob, sub))
+                    if self.mode == "first" and scene.kind == "choice":
+                        break
+                elif action == "choose":
+                    self.loops.add(f"{scene.id}:{arg.key}")
+            if not branches:
+                return None
+            if self.mode == "best" and scene.kind == "choice":
+                branches = [(1.0, max((sub for _p, sub in branches), key=lambda sub: sub.get(SUCCESS, 0.0)))]
+            total = sum(prob for prob, _sub in branches)
+            result = defaultdict(float)
+            for prob, sub in branches:
+                for ending, p in sub.items():
+                    result[ending] += prob / total * p
+            result = dict(result)
+        return result
+
+    def dead_branches(self):
+        """그래프에는 있지만 어떤 도달 가능한 상태에서도 쓰이지 않는 장면/선택지/결과."""
+        out = {"unreachable_scenes": sorted(set(self.graph.nodes) - self.visited),
+               "never_offered_choices": [], "never_taken_outcomes": [], "loops": sorted(self.loops)}
+        for sid in sorted(self.visited):
+            scene = self.graph.nodes[sid]
+            for c in scene.choices:
+                if (sid, c.key) not in self.offered and scene.kind == "choice" and not scene.auto:
+                    out["never_offered_choices"].append(f"{sid}:{c.key}")
+                for i, o in enumerate(c.outcomes):
+                    if (sid, c.key) in self.offered and (sid, c.key, i) not in self.taken:
+                        out["never_taken_outcomes"].append(f"{sid}:{c.key}[{i}] -> {o.goto}")
+            for i, o in enumerate(scene.auto):
+                if (sid, "auto", i) not in self.taken:
+                    out["never_taken_outcomes"].append(f"{sid}:auto[{i}] -> {o.goto}")
+        return out
+
+
+def start_state(graph=None):
+    graph = graph or scenes.GRAPH
+    state = scene_graph.initial_state("분석")
+    state["stage"], state["sub"] = split_id(graph.start)
+    return state
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="엔딩 도달 확률 / 죽은 분기 분석")
+    ap.add_argument("--policy", choices=sorted(POLICIES), default="uniform")
+    ap.add_argument("--accuracy", type=float, default=0.6, help="퍼즐(주관식/타이밍) 정답 확률")
+    ap.add_argument("--retries", type=int, default=1, help="실패 시 체크포인트 재시도 횟수")
+    ap.add_argument("--max-attempts", type=int, default=3, help="한 퍼즐에서 연속 오답 시 포기 기준")
+    ap.add_argument("--streak-cap", type=int, default=STREAK_CAP, help="탐색 중 |streak| 상한 (0이면 제한 없음)")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    sys.setrecursionlimit(10000)
+    started = time.perf_counter()
+    ex = Explorer(policy=args.policy, accuracy=args.accuracy, retries=args.retries, max_attempts=args.max_attempts,
+                  streak_cap=args.streak_cap)
+    endings = ex.explore(start_state()) or {}
+    # 죽은 분기는 정책과 무관하게 모든 선택을 열어 둔 탐색으로 판정한다
+    full = ex if args.policy == "uniform" else Explorer(policy="uniform", accuracy=0.5, retries=args.retries,
+                                                         max_attempts=args.max_attempts, streak_cap=args.streak_cap)
+    if full is not ex:
+        full.explore(start_state())
+    dead = full.dead_branches()
+    elapsed = time.perf_counter() - started
+    report = {"policy": args.policy, "accuracy": args.accuracy, "retries": args.retries,
+              "endings": dict(sorted(endings.items(), key=lambda kv: -kv[1])),
+              "states": len(ex.memo), "seconds": round(elapsed, 3), "dead": dead}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    print(f"정책={args.policy} 정답률={args.accuracy} 재시도={args.retries}  "
+          f"상태 {len(ex.memo):,}개, {elapsed:.2f}s")
+    for ending, p in report["endings"].items():
+        print(f"  {ending:32s} {p:7.2%}")
+    for name, items in dead.items():
+        print(f"{name}: {len(items)}")
+        for item in items:
+            print(f"  - {item}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
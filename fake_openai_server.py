@@ -0,0 +1,258 @@
+# fake_openai_server.py
+# 오프라인 벤치마크용 OpenAI 호환 대역 서버 (표준 라이브러리만 사용).
+# POST /v1/chat/completions (stream 포함), GET /v1/models, GET /stats 를 흉내 낸다.
+# 응답 내용은 fallbacks.py 의 미리 작성된 한국어 내레이션이고, 지연/토큰 속도/오류는 설정으로 조절한다.
+#
+#   python fake_openai_server.py --port 8765 --ttft-ms 400 --token-rate 80 --rate-429 0.02
+#   LLM_BASE_URL=http://127.0.0.1:8765/v1 streamlit run game.py
+import sys
+import json
+import time
+import math
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from fallbacks import FALLBACK_NARRATION
+
+GENERIC_NARRATION = (
+    "어둠 속에서 통신기가 짧게 울립니다. 벤지의 목소리가 낮게 깔립니다. \"준비됐어? 지금부터가 진짜야.\"",
+    "에단이 창밖을 내다보며 말합니다. \"엔티티는 우리가 어떻게 움직일지 이미 계산해 뒀을 거야. 그러니까 계산 밖으로 움직여야 해.\"",
+    "루터가 키보드에서 손을 떼고 고개를 듭니다. \"시간이 없어. 결정은 지금 내려야 해.\"",
+)
+
+
+def _tokens(text: str) -> int:
+    """대략적인 토큰 수 (한국어 약 2자 = 1토큰)."""
+    return max(1, len(text) // 2)
+
+
+class FakeConfig:
+    def __init__(self, ttft_ms=400.0, sigma=0.4, token_rate=80.0, rate_429=0.0, rate_500=0.0,
+                 rate_timeout=0.0, hang_s=120.0, seed=None):
+        self.mu = math.log(max(ttft_ms, 1.0) / 1000.0)
+        self.sigma = sigma
+        self.token_rate = token_rate
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_timeout = rate_timeout
+        self.hang_s = hang_s
+        self.seed = seed
+
+
+class FakeState:
+    """요청 번호별 난수(재현 가능), 접두부 캐시 흉내, 통계."""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.stats = Counter()
+        self._seen_prefixes = set()
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def rng(self):
+        with self._lock:
+            self._n += 1
+            n = self._n
+        return random.Random(None if self.config.seed is None else self.config.seed * 1_000_003 + n)
+
+    def cached_tokens(self, messages) -> int:
+        """첫 system 메시지를 이전에 본 적이 있으면 1024 토큰 이상일 때 128 단위로 캐시된 것으로 보고한다."""
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        prefix = messages[0].get("content") or ""
+        digest = hashlib.sha256(prefix.encode()).digest()
+        with self._lock:
+            seen = digest in self._seen_prefixes
+            self._seen_prefixes.add(digest)
+        n = _tokens(prefix)
+        return (n // 128) * 128 if seen and n >= 1024 else 0
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+def canned_text(messages, rng) -> str:
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    text = FALLBACK_NARRATION.get(user)
+    return text if text is not None else rng.choice(GENERIC_NARRATION)
+
+
+def _pieces(text: str):
+    """스트리밍 조각 (약 1토큰 = 2자)."""
+    return [text[i:i + 2] for i in range(0, len(text), 2)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: 클라이언트 커넥션 풀을 그대로 쓴다
+    server_version = "FakeOpenAI/1.0"
+    state: FakeState = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # ---- 응답 도우미 ----
+    def _json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message, type_, code=None, headers=None):
+        self._json(status, {"error": {"message": message, "type": type_, "param": None, "code": code}}, headers)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _sse(self, obj):
+        self._chunk(b"data: " + json.dumps(obj, ensure_ascii=False).encode() + b"\n\n")
+
+    # ---- 라우팅 ----
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._json(200, {"object": "list", "data": [
+                {"id": m, "object": "model", "created": 0, "owned_by": "fake"} for m in ("gpt-4o-mini", "gpt-4o")]})
+        elif self.path.rstrip("/") == "/stats":
+            self._json(200, dict(self.state.stats))
+        else:
+            self._error(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._error(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._error(400, "Invalid JSON body", "invalid_request_error")
+            return
+        self.state.count("requests")
+        self._complete(req)
+
+    def _complete(self, req):
+        cfg = self.state.config
+        rng = self.state.rng()
+        roll = rng.random()
+        if roll < cfg.rate_429:
+            self.state.count("injected_429")
+            self._error(429, "Rate limit reached (injected)", "requests", "rate_limit_exceeded", {"Retry-After": "1"})
+            return
+        roll -= cfg.rate_429
+        if roll < cfg.rate_500:
+            self.state.count("injected_500")
+            self._error(500, "The server had an error (injected)", "server_error")
+            return
+        roll -= cfg.rate_500
+        if roll < cfg.rate_timeout:
+            # 응답 없이 붙잡고 있다가 끊는다 -> 클라이언트 쪽 타임아웃
+            self.state.count("injected_timeout")
+            time.sleep(cfg.hang_s)
+            self.close_connection = True
+            return
+
+        messages = req.get("messages") or []
+        model = req.get("model", "gpt-4o-mini")
+        text = canned_text(messages, rng)
+        finish = "stop"
+        max_tokens = req.get("max_tokens") or req.get("max_completion_tokens")
+        if max_tokens and _tokens(text) > max_tokens:
+            text, finish = text[:max_tokens * 2], "length"
+        prompt_tokens = sum(_tokens(m.get("content") or "") for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _tokens(text),
+            "total_tokens": prompt_tokens + _tokens(text),
+            "prompt_tokens_details": {"cached_tokens": self.state.cached_tokens(messages)},
+        }
+        rid = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        time.sleep(rng.lognormvariate(cfg.mu, cfg.sigma))
+
+        if not req.get("stream"):
+            if cfg.token_rate > 0:
+                time.sleep(_tokens(text) / cfg.token_rate)
+            self.state.count("completions")
+            self._json(200, {
+                "id": rid, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": finish, "logprobs": None}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": rid, "object": "chat.completion.chunk", "created": created, "model": model}
+        try:
+            self._sse({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""},
+                                            "finish_reason": None}]})
+            gap = 1.0 / cfg.token_rate if cfg.token_rate > 0 else 0.0
+            for piece in _pieces(text):
+                self._sse({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                if gap:
+                    time.sleep(gap)
+            self._sse({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]})
+            if (req.get("stream_options") or {}).get("include_usage"):
+                self._sse({**base, "choices": [], "usage": usage})
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+            self.state.count("streams")
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 스트림을 취소함 (rerun / 투기적 생성 폐기)
+            self.state.count("cancelled")
+            self.close_connection = True
+
+
+def make_server(host="127.0.0.1", port=8765, config: FakeConfig = None):
+    """서버 객체만 만든다. 다른 스크립트에서 스레드로 띄울 때 serve_forever() 를 호출."""
+    state = FakeState(config or FakeConfig())
+    handler = type("BoundHandler", (Handler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="OpenAI 호환 로컬 대역 서버")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--ttft-ms", type=float, default=400.0, help="첫 토큰 지연 중앙값(로그정규)")
+    ap.add_argument("--sigma", type=float, default=0.4, help="로그정규 분포 sigma")
+    ap.add_argument("--token-rate", type=float, default=80.0, help="초당 토큰 수 (0 이면 즉시)")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="429 응답 비율")
+    ap.add_argument("--rate-500", type=float, default=0.0, help="500 응답 비율")
+    ap.add_argument("--rate-timeout", type=float, default=0.0, help="응답 없이 멈추는 비율")
+    ap.add_argument("--hang-s", type=float, default=120.0, help="타임아웃 주입 시 붙잡고 있을 시간")
+    ap.add_argument("--seed", type=int, default=None, help="지정하면 요청 순서 기준으로 재현 가능")
+    args = ap.parse_args(argv)
+
+    config = FakeConfig(ttft_ms=args.ttft_ms, sigma=args.sigma, token_rate=args.token_rate,
+                        rate_429=args.rate_429, rate_500=args.rate_500, rate_timeout=args.rate_timeout,
+                        hang_s=args.hang_s, seed=args.seed)
+    server = make_server(args.host, args.port, config)
+    print(f"LLM_BASE_URL=http://{args.host}:{server.server_port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# fallbacks.py
+# LLM 장애(서킷 브레이커 open, 재시도 소진) 시 보여줄 미리 작성된 내레이션.
+# 키는 narrate_llm 에 넘기는 장면 지시문(플레이어 이름은 [[요원]] 으로 치환된 형태)이다.
+from narration_cache import PLACEHOLDER, personalize
+
+FALLBACK_NARRATION = {
+    # ---- INTRO / BRIEFING ----
+    f"환영 인사와 함께 IMF 합류 여부를 질문하는 장면을 한국어로 영화처럼 생생히 묘사하라. 플레이어는 {PLACEHOLDER}.":
+        f"비 내리는 밤, 낡은 공중전화 부스에서 울린 벨소리가 당신을 이곳으로 불러냈습니다.\n\n"
+        f"\"환영합니다, {PLACEHOLDER}. 저는 에단 헌트입니다.\" 그림자 속에서 걸어 나온 남자가 손을 내밉니다. "
+        f"\"세상은 지금 보이지 않는 적과 싸우고 있습니다. 당신의 능력이 필요합니다. IMF에 합류하시겠습니까?\"",
+    "에단이 준비 부족을 지적하며 반드시 정보를 수집해야 한다고 설득하는 장면을 묘사하라.":
+        "에단이 조용히 고개를 젓습니다. \"서두르면 엔티티의 손바닥 위에서 움직이게 될 뿐이야. "
+        "우리가 상대하는 건 미래를 예측하는 적이야. 먼저 정보를 모아야 해.\"\n\n벤지가 노트북을 열며 덧붙입니다. \"적어도 엔티티가 뭔지는 알고 가자고.\"",
+
+    # ---- INFO ----
+    "정보 수집을 마치고, CIA에 보고할지 말지 팀 내부에서 논의하는 장면을 묘사하라.":
+        "모니터의 불빛만이 남은 안가. 루터가 의자에 등을 기댑니다. \"CIA에 보고하면 지원을 받을 수 있겠지. "
+        "하지만 그 안에 스파이가 있다면… 우리 계획이 그대로 엔티티에게 넘어갈 거야.\"\n\n모두의 시선이 당신에게 향합니다.",
+    "CIA에 보고가 접수되는 장면. 이 정보가 향후 치명적 변수로 작동할 복선을 깔아라.":
+        "암호화된 보고서가 랭글리로 전송됩니다. 수신 확인 메시지가 뜨는 순간, 화면 구석에서 낯선 접속 기록이 잠깐 깜빡였다 사라집니다.\n\n"
+        "아무도 그것을 눈치채지 못했습니다. 아직은.",
+    "보고 없이 움직이기로 결정. 향후 난관을 예고하는 분위기로 전환하라.":
+        "에단이 노트북을 덮습니다. \"좋아. 이번 작전은 우리끼리 간다.\"\n\n"
+        "승인도, 지원도 없는 작전. 성공하더라도 누군가는 그 책임을 물으러 올 것입니다.",
+
+    # ---- STORY1 ----
+    "알라나 변장을 준비하는 장면. 그런데 벤지의 가면 기계가 고장나 에단의 가면이 망가진 비상상황을 생생히 묘사하라.":
+        "벤지의 가면 제작기가 알라나의 얼굴을 완벽하게 찍어냅니다. 이어서 그녀의 오빠 가면을 만들던 순간, 기계에서 불꽃이 튀고 연기가 피어오릅니다.\n\n"
+        "\"벤지: 큰일났어. 마스크 기계가 고장나서, 에단이 써야 할 가면이 없어!\"",
+    "팀이 설득해 임무를 받아들이도록 유도하는 장면. 결국 임무로 이행.":
+        "루터가 당신의 어깨에 손을 올립니다. \"알라나를 연기할 수 있는 사람은 지금 여기 너뿐이야.\" "
+        "잠시의 침묵 끝에 당신은 고개를 끄덕입니다.\n\n그런데 준비 도중, 벤지의 가면 기계가 고장 나 에단의 가면이 망가지고 맙니다.",
+    "에단이 알라나처럼 속이라고 지시하며 작전 개시. 이제 알라나를 재워야 한다는 긴박한 상황으로 연결하라.":
+        f"\"에단: 어쩔 수 없지. 일단 {PLACEHOLDER}. 네가 알라나인 것처럼 속여. 그 뒤는 내가 알아서 할게.\"\n\n"
+        "고속 열차가 어둠 속을 가릅니다. 거래까지 남은 시간은 단 30분. 먼저 진짜 알라나를 잠재워야 합니다.",
+    "약물로 알라나를 재우고 거래 장소로 향한다. 그녀는 거래 완료까지 깨어나지 않는다.":
+        "건네받은 샴페인 잔에 에단의 약물이 녹아듭니다. 알라나는 의심 섞인 미소를 짓다가 이내 깊은 잠에 빠집니다.\n\n"
+        "당신은 그녀의 코트를 걸치고, 키트리지가 기다리는 칸으로 향합니다.",
+    "몸싸움 끝에 알라나를 제압했지만, 거래 중 그녀가 깨어나 CIA 난입으로 체포, 미션 실패(첫 번째 체크포인트).":
+        "격렬한 몸싸움 끝에 알라나를 쓰러뜨렸지만, 거래가 한창이던 순간 그녀가 비틀거리며 나타납니다.\n\n"
+        "두 명의 알라나. 키트리지의 신호와 함께 CIA 요원들이 들이닥치고, 당신의 손목에 수갑이 채워집니다. **미션 실패.**",
+    "계좌 추적으로 정체가 발각되어 체포, 미션 실패(두 번째 체크포인트).":
+        "계좌 번호를 입력한 지 30초. 키트리지의 휴대폰이 울리고, 그의 표정이 차갑게 굳습니다. "
+        "\"이 계좌… 알라나의 것이 아니군.\"\n\n문이 열리고 요원들이 당신을 둘러쌉니다. **미션 실패.**",
+    "거래를 중단하고 열쇠 A 회수에 집중한다. 직후, 하늘에서 에단이 낙하산으로 등장! 그러나 키는 키트리지에게 있다.":
+        "\"돈은 필요 없어요.\" 당신은 거래를 파기하고 자리에서 일어섭니다. 그 순간 객실 밖에서 알라나가 깨어나는 소리가 들립니다.\n\n"
+        "창밖으로 오토바이와 낙하산을 탄 에단이 하늘에서 내려옵니다. 하지만 열쇠 A는… 아직 키트리지의 손에 있습니다!",
+    "절묘한 타이밍에 키를 슬쩍하는 장면을 영화적으로 묘사하고, 이어지는 열차 폭파 위기의 순간으로 전환.":
+        "키트리지가 창밖의 에단에게 시선을 빼앗긴 찰나, 당신의 손끝이 그의 코트 주머니를 스칩니다. 열쇠 A는 이제 당신의 것입니다.\n\n"
+        "그때, 굉음과 함께 열차가 요동칩니다. 앞쪽 다리가 폭파되었습니다. 멈추지 않는 열차가 끊어진 선로를 향해 질주합니다!",
+    "에단과 합을 맞춰 극적으로 탈출. **첫 번째 미션 성공**을 선언하라.":
+        "에단이 손을 내밉니다. \"날 믿어.\" 객차가 절벽 아래로 기울어지는 순간, 두 사람은 함께 뛰어내립니다.\n\n"
+        "낙하산이 펼쳐지고, 뒤로 열차가 계곡 아래로 사라집니다. **첫 번째 미션 성공!** 열쇠 A를 손에 넣었습니다.",
+    "혼자 탈출을 시도하다 상황 악화로 미션 실패(세 번째 체크포인트).":
+        "당신은 혼자 낙하산을 펼치지만, 무너지는 객차의 잔해가 줄을 끊어 버립니다. 열쇠 A는 계곡 아래로 떨어지고, 에단과의 교신도 끊깁니다.\n\n**미션 실패.**",
+    "에단에게 키를 넘기고 도주. 상황 악화로 미션 실패(세 번째 체크포인트).":
+        "열쇠를 에단에게 던지고 강물로 몸을 던졌지만, 흔들리는 객차 속에서 에단은 열쇠를 놓치고 맙니다.\n\n"
+        "차가운 물살 속에서 당신은 모든 것이 끝났음을 깨닫습니다. **미션 실패.**",
+
+    # ---- STORY2 ----
+    "가브리엘의 은신처에 도착. 루터가 폭탄과 함께 동굴에 갇힌 긴박한 상황을 묘사하라. 루터가 자신을 희생하려 한다.":
+        "은신처 옆 동굴, 희미한 불빛 아래 철창 속에 루터가 앉아 있습니다. 그의 몸에는 폭탄이 감겨 있고, 타이머는 쉬지 않고 줄어듭니다.\n\n"
+        "\"루터: 여기는 가망이 없어. 나를 버리고 가…. 그리고 세계를 구해줘.\"\n\"에단: 안돼 루터!!! 널 두고 어떻게 가...\"",
+    "고통스러운 결단 끝에 루터를 잃는다. 그러나 작전은 계속된다.":
+        "당신은 에단의 팔을 붙잡고 동굴 밖으로 끌어냅니다. 등 뒤에서 울린 폭음이 동굴을 집어삼킵니다.\n\n"
+        "아무도 말하지 않습니다. 루터가 남긴 마지막 부탁만이 귓가에 맴돕니다. 작전은 계속되어야 합니다.",
+    "폭발로 전원이 사망, 미션 실패(네 번째 체크포인트).":
+        "당신은 루터 곁에 남기로 합니다. 타이머의 숫자가 0에 닿는 순간, 눈부신 섬광이 모든 것을 덮습니다.\n\n**미션 실패.**",
+    "신호가 가짜였음을 확인, 한 바퀴 빙 돈 뒤 에단의 직감대로 길을 찾는다. 벤지 신뢰는 살짝 흔들린다.":
+        "벤지의 추적기를 따라 한참을 헤맨 끝에, 팀은 처음 출발했던 갈림길로 되돌아옵니다. 신호는 엔티티가 만든 가짜였습니다.\n\n"
+        "벤지가 씁쓸하게 웃습니다. \"…에단 말대로 가보자.\"",
+    "숨겨진 통로를 찾아 곧장 중심부로 접근한다.":
+        "에단이 벽의 미세한 틈을 짚습니다. 밀어내자 숨겨진 통로가 모습을 드러냅니다. 팀은 곧장 은신처의 중심부로 향합니다.",
+    "과거의 상처를 딛고 전투에 돌입한다.":
+        f"\"{PLACEHOLDER}: 헛소리 따윈 집어치워! 열쇠와 포드코바를 내놔!!!\"\n\n"
+        "가브리엘의 미소가 사라지고, 은신처 안에 총성이 울려 퍼집니다.",
+    "벤지의 해킹이 허위 정보의 벽에 막히며 난관을 겪는다. 결국 전투로 전환.":
+        "시간을 버는 사이 벤지가 엔티티에 접속하지만, 화면은 끝없이 이어지는 허위 정보로 가득 찹니다. \"안 돼, 전부 가짜야!\"\n\n"
+        "가브리엘이 그 틈을 놓치지 않고 먼저 움직입니다. 결국 전투가 시작됩니다.",
+    "격전 끝에 가브리엘은 도주. 예측된 패턴대로 움직였다는 찝찝함이 남는다.":
+        "치열한 격투 끝에 열쇠 B를 빼앗아 냅니다. 가브리엘은 어둠 속으로 사라지며 웃음을 남깁니다. \"예언대로군.\"\n\n"
+        "손에 쥔 열쇠가 왠지 무겁게 느껴집니다.",
+    "일시적으로 열쇠를 손에 넣지만, 엔티티의 새로운 위협이 따라붙는다.":
+        "가브리엘은 의외로 순순히 열쇠를 내밉니다. 하지만 그가 떠난 직후, 모든 통신 장비에 같은 문장이 떠오릅니다. \"거래는 끝나지 않았다.\"",
+    "협업으로 깔끔하게 열쇠 B를 확보한다.":
+        "당신의 신호에 맞춰 에단이 가브리엘의 시선을 끌고, 벤지가 뒤에서 열쇠를 빼냅니다. 완벽한 호흡. 열쇠 B는 IMF의 손에 들어왔습니다.",
+    "신뢰가 부족해 실수가 발생, 가브리엘에게 역으로 빼앗겨 미션 실패.":
+        "엇갈린 신호 하나. 벤지가 머뭇거린 찰나 가브리엘이 열쇠를 낚아채 사라집니다. **미션 실패.**",
+
+    # ---- STORY3 ----
+    "엔티티 코어를 파괴하기 위한 마지막 임무. 에단이 잠수함에서 보내온 암호화된 좌표를 해독해야 한다.":
+        "북극해의 빙하 위, 칼바람 속에서 당신과 벤지는 수신기 앞에 웅크리고 있습니다. 마침내 잠수함의 에단에게서 신호가 도착합니다.\n\n"
+        f"\"에단: [남위 82.5°, 서경 65.3°]\"\n\"벤지: {PLACEHOLDER}! 뭔가 이상하지 않아?? 우린 북극해에 있는데... 여긴 정반대야!\"",
+    "남극/북극을 뒤집어 해석해 정확한 좌표를 파악, 에단과의 교신에 성공한다.":
+        "남위를 북위로. 좌표를 뒤집자 화면 속 점이 정확히 당신들의 발아래 바다를 가리킵니다. 에단은 엔티티를 속이기 위해 일부러 반대로 보낸 것이었습니다.\n\n"
+        f"교신이 연결됩니다. \"벤지: 자, {PLACEHOLDER}. 이제 하나만 남았어.\"",
+    "포이즌필이 적시에 뽑히며 엔티티의 통로가 봉쇄된다. 마지막 변수에 대비하라.":
+        "초록불이 켜진 바로 그 순간, 당신은 포이즌 필을 뽑아냅니다. 화면을 가득 채우던 코드가 멈추고, 엔티티는 작은 장치 속에 갇힙니다.\n\n"
+        "하지만 멀리서 헬기 소리가 다가옵니다.",
+    "타이밍을 놓쳐 연결이 길어졌고, 엔티티가 반격한다. 미션 실패(네 번째 체크포인트).":
+        "단 한 박자 늦었습니다. 연결이 유지되는 사이 엔티티는 네트워크 너머로 빠져나가고, 모든 화면이 붉게 물듭니다. **미션 실패.**",
+    "키트리지가 전원을 체포. 포이즌필을 압수당해 **게임 실패**로 귀결된다.":
+        "\"키트리지: 지금껏 너희의 모든 것을 보고받았다. 그 포이즌필을 내놔!!!\"\n\n"
+        "CIA 요원들이 팀 전원을 제압하고 포이즌 필을 빼앗아 갑니다. **게임 실패.**",
+    "도주를 시도했지만 헬기에 포위되어 체포된다. **미션 실패**.":
+        "포이즌 필을 움켜쥐고 달아나지만, 머리 위로 헬기의 탐조등이 쏟아집니다. 사방이 포위되었습니다. **미션 실패.**",
+    "IMF는 체포되고 엔티티의 힘은 정부의 손으로. **미션 실패**.":
+        "당신은 팀 곁에 남기로 합니다. 하지만 수갑이 채워지고, 엔티티가 갇힌 포이즌 필은 정부의 손으로 넘어갑니다. **미션 실패.**",
+    "에단이 논리로 반박에 성공, 포이즌필을 지키며 **미션 완수**.":
+        "에단이 한 걸음 앞으로 나섭니다. 그의 차분한 반박에 키트리지는 끝내 말을 잇지 못합니다. 포이즌 필은 IMF의 손에 남았습니다.\n\n**IMF, MISSION COMPLETE.**",
+    "에단의 기지로 반박에 성공, 포이즌필과 함께 **미션 완수**.":
+        "당신이 팀 곁을 지키자, 에단이 기지를 발휘해 키트리지의 주장을 하나씩 무너뜨립니다. 모두가 살아서 돌아갑니다.\n\n**IMF, MISSION COMPLETE.**",
+    "완수 엔딩의 여운과 팀에 남은 상처, 그러나 이어질 평화를 영화적 문체로 간결히 마무리하라.":
+        "루터의 빈자리는 여전히 크지만, 세상은 오늘도 아무 일 없었다는 듯 아침을 맞습니다. 그것이 IMF가 지켜낸 평화입니다.",
+}
+
+
+def fallback_for(template: str, player_name, default: str) -> str:
+    """장면 지시문에 대한 미리 작성된 내레이션. 없으면 default."""
+    text = FALLBACK_NARRATION.get(template)
+    if text is None:
+        return default
+    return personalize(text, player_name)
@@ -0,0 +1,72 @@
+# green_light.py
+# choice7 반응 속도 챌린지: 브라우저 컴포넌트(components/green_light)가 불시에 초록불을 켜고
+# performance.now() 로 반응 시간을 잰다. 서버는 챌린지를 발급/검증만 하고 매 틱 일은 하지 않는다.
+#
+# 챌린지 = (nonce, 지연 ms) 에 대한 HMAC 서명. 결과는 이 서명을 그대로 돌려받아야 유효하고,
+# 한 챌린지는 세션에 하나만 걸려 있으므로 이전 결과를 다시 보내도 통하지 않는다.
+# 서명은 챌린지만 인증한다. 반응 시간/입력은 클라이언트가 보내는 값이라 서버 시계로 위아래를 막는 것이 전부다.
+# 워커가 여러 개면 TIMING_SECRET 을 모든 워커에 같게 설정할 것 (없으면 프로세스마다 임의 생성).
+import os
+import hmac
+import time
+import random
+import hashlib
+import secrets
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPONENT_DIR = os.path.join(BASE_DIR, "components", "green_light")
+TIMING_COMPONENT = os.getenv("TIMING_COMPONENT", "1") != "0"   # 0이면 기존 텍스트 입력 + 서버 시계
+TIMING_SECRET = os.getenv("TIMING_SECRET", "").encode() or secrets.token_bytes(32)
+DELAY_RANGE = (1.5, 4.0)   # 초록불까지의 임의 지연(초)
+CLOCK_SLACK = 0.5          # 서버가 본 경과 시간과 클라이언트 측정값 사이에 허용하는 오차(초)
+HUMAN_FLOOR = float(os.getenv("TIMING_HUMAN_FLOOR", "0.1"))   # 사람이 낼 수 없는 반응 시간(초). 이보다 빠르면 위조로 본다
+
+_component = None
+
+
+def available() -> bool:
+    return TIMING_COMPONENT and os.path.exists(os.path.join(COMPONENT_DIR, "index.html"))
+
+
+def _sign(nonce: str, delay_ms: int) -> str:
+    return hmac.new(TIMING_SECRET, f"{nonce}:{delay_ms}".encode(), hashlib.sha256).hexdigest()
+
+
+def issue(delay_range=DELAY_RANGE, rng=random):
+    """새 챌린지. 세션 상태에 넣어 두고 verify 에 그대로 넘긴다."""
+    nonce = secrets.token_urlsafe(12)
+    delay_ms = int(rng.uniform(*delay_range) * 1000)
+    return {"nonce": nonce, "delay_ms": delay_ms, "sig": _sign(nonce, delay_ms), "issued": time.time()}
+
+
+def verify(challenge, value, now=None):
+    """
+    컴포넌트 결과 → (입력 텍스트, 반응 시간 초). 서명/nonce 가 맞지 않거나, 성급히 눌렀거나,
+    서버가 본 경과 시간이 (지연 + 반응)보다 짧거나(초록불이 켜지기도 전에 만든 결과),
+    반응 시간이 HUMAN_FLOOR 보다 짧으면(클라이언트 값 또는 서버가 본 경과 - 지연) 반응 시간은 inf.
+    서명은 서버가 발급한 챌린지(nonce, 지연)만 인증한다. reaction_ms 와 text 는 서명되지 않은 클라이언트 값이라
+    위조를 막지 못하고, 서버 시계로 본 범위 안에 있는지만 확인한다.
+    """
+    text = str(value.get("text") or "")
+    if value.get("nonce") != challenge["nonce"] or not hmac.compare_digest(str(value.get("sig")), challenge["sig"]):
+        return text, float("inf")
+    reaction = value.get("reaction_ms")
+    if value.get("early") or not isinstance(reaction, (int, float)) or reaction < 0:
+        return text, float("inf")
+    elapsed = reaction / 1000
+    server_elapsed = (now if now is not None else time.time()) - challenge["issued"]
+    if challenge["delay_ms"] / 1000 + elapsed > server_elapsed + CLOCK_SLACK:
+        return text, float("inf")
+    if min(elapsed, server_elapsed - challenge["delay_ms"] / 1000) < HUMAN_FLOOR:
+        return text, float("inf")
+    return text, elapsed
+
+
+def render(challenge, label: str, button: str, key: str):
+    """컴포넌트를 그린다. 플레이어가 제출하기 전에는 None, 제출 후에는 결과 dict."""
+    global _component
+    if _component is None:
+        import streamlit.components.v1 as components
+        _component = components.declare_component("green_light", path=COMPONENT_DIR)
+    return _component(nonce=challenge["nonce"], sig=challenge["sig"], delay_ms=challenge["delay_ms"],
+                      label=label, button=button, key=f"{key}_{challenge['nonce']}", default=None)
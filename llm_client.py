@@ -0,0 +1,212 @@
+# llm_client.py
+# 모든 세션이 공유하는 비동기 LLM 클라이언트 계층.
+# 프로세스 당 이벤트 루프 스레드 하나에서 AsyncOpenAI(공유 httpx 커넥션 풀)를 돌리고,
+# Streamlit 스크립트 스레드는 concurrent Future 로 결과만 기다린다.
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import defaultdict
+from importlib.util import find_spec
+
+import resilience
+from metrics import metrics
+
+# openai/httpx 는 import 만으로 수백 ms 가 걸린다. 설치 여부만 봐 두고 실제 import 는 런타임을 만들 때 한다.
+_has_openai = find_spec("openai") is not None and find_spec("httpx") is not None
+
+try:
+    import streamlit as st
+    _cache_resource = st.cache_resource
+except Exception:
+    from functools import lru_cache
+    _cache_resource = lru_cache(maxsize=None)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))  # 동시에 나가는 요청 상한
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "100"))              # keep-alive 커넥션 수
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))                # 호출 당 제한 시간(초)
+# OpenAI 호환 엔드포인트 주소. 로컬 대역 서버(fake_openai_server.py)로 돌릴 때 지정한다
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+
+_DONE = object()
+
+
+# ==== 사용량 보고 훅 ====
+# 응답의 usage(특히 prompt caching 으로 재사용된 cached_tokens)를 받아 보는 콜백들.
+# 이벤트 루프 스레드에서 호출되므로 스레드 안전해야 한다.
+_usage_hooks = []
+
+
+def on_usage(fn):
+    """
+    fn(info: dict) 등록. info = {model, prompt_tokens, cached_tokens, completion_tokens, tags}
+    tags 는 호출자가 submit/stream 에 넘긴 라벨(장면 stage/sub 등). 집계 훅은 telemetry.py 에 있다.
+    """
+    _usage_hooks.append(fn)
+    return fn
+
+
+def _report_usage(usage, model, tags=None):
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    info = {
+        "model": model,
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "tags": dict(tags or {}),
+    }
+    for hook in list(_usage_hooks):
+        try:
+            hook(info)
+        except Exception:
+            pass
+
+
+class LLMRuntime:
+    """이벤트 루프 스레드 + AsyncOpenAI + 동시성 세마포어 + 세션별 진행 중 호출 목록."""
+
+    def __init__(self, api_key=None):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-loop", daemon=True)
+        self.thread.start()
+        self._inflight = defaultdict(set)  # owner -> {Future}
+        self._lock = threading.Lock()
+        asyncio.run_coroutine_threadsafe(self._build(api_key), self.loop).result()
+
+    async def _build(self, api_key):
+        import httpx
+        from openai import AsyncOpenAI
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=5.0),
+        )
+        # 재시도는 resilience.call_with_retry 가 담당하므로 SDK 자체 재시도는 끈다
+        # 대역 서버는 키를 검사하지 않지만 SDK 는 키가 없으면 생성을 거부한다
+        api_key = api_key or os.getenv("OPENAI_API_KEY") or ("local" if LLM_BASE_URL else None)
+        self.client = AsyncOpenAI(api_key=api_key, base_url=LLM_BASE_URL, http_client=http, max_retries=0)
+        self.semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+    # ---- 코루틴 ----
+    async def _create(self, timeout, **kwargs):
+        """시도 1회: 세마포어 안에서 timeout 초 제한. 재시도 대기 중에는 슬롯을 잡지 않는다."""
+        async with self.semaphore:
+            return await asyncio.wait_for(self.client.chat.completions.create(**kwargs), timeout)
+
+    async def _complete(self, messages, timeout, tags, **kwargs):
+        started = time.perf_counter()
+        resp = await resilience.call_with_retry(lambda: self._create(timeout, messages=messages, **kwargs))
+        metrics.observe("llm_call_seconds", time.perf_counter() - started,
+                        model=kwargs.get("model"), mode="complete", **(tags or {}))
+        _report_usage(getattr(resp, "usage", None), kwargs.get("model"), tags)
+        return resp.choices[0].message.content
+
+    async def _stream(self, out: queue.Queue, messages, timeout, tags, **kwargs):
+        started = time.perf_counter()
+        try:
+            # 스트림 연결(첫 응답)까지만 재시도한다. 이미 출력한 조각은 되돌릴 수 없으므로.
+            stream = await resilience.call_with_retry(
+                lambda: self._create(timeout, messages=messages, stream=True,
+                                     stream_options={"include_usage": True}, **kwargs))
+            async with self.semaphore:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        out.put(chunk.choices[0].delta.content)
+                    if getattr(chunk, "usage", None) is not None:
+                        _report_usage(chunk.usage, kwargs.get("model"), tags)
+            metrics.observe("llm_call_seconds", time.perf_counter() - started,
+                            model=kwargs.get("model"), mode="stream", **(tags or {}))
+        except BaseException as e:
+            out.put(e)
+            raise
+        finally:
+            out.put(_DONE)
+
+    # ---- 진행 중 호출 추적 ----
+    def _track(self, owner, fut):
+        if owner is None:
+            return
+        with self._lock:
+            self._inflight[owner].add(fut)
+        fut.add_done_callback(lambda f: self._untrack(owner, f))
+
+    def _untrack(self, owner, fut):
+        with self._lock:
+            futs = self._inflight.get(owner)
+            if futs is not None:
+                futs.discard(fut)
+                if not futs:
+                    del self._inflight[owner]
+
+    def cancel_owner(self, owner) -> int:
+        """owner(세션)의 진행 중 호출을 모두 취소한다. 새 스크립트 실행(rerun) 시작 시 호출."""
+        with self._lock:
+            futs = list(self._inflight.pop(owner, ()))
+        for fut in futs:
+            fut.cancel()
+        return len(futs)
+
+    # ---- 스크립트 스레드용 API ----
+    def submit(self, messages, timeout=LLM_TIMEOUT, owner=None, tags=None, **kwargs):
+        """
+        완성 텍스트를 돌려줄 concurrent Future. cancel() 하면 HTTP 요청까지 취소된다.
+        timeout 은 시도 1회당 제한이며, 일시적 오류는 resilience 계층이 재시도한다.
+        tags 는 지표 라벨로 붙는다 (예: {"stage": ..., "sub": ...}).
+        """
+        fut = asyncio.run_coroutine_threadsafe(self._complete(messages, timeout, tags, **kwargs), self.loop)
+        self._track(owner, fut)
+        return fut
+
+    def complete(self, messages, timeout=LLM_TIMEOUT, owner=None, tags=None, **kwargs) -> str:
+        fut = self.submit(messages, timeout=timeout, owner=owner, tags=tags, **kwargs)
+        try:
+            return fut.result()
+        finally:
+            fut.cancel()  # 예외/중단으로 빠져나온 경우 요청을 남기지 않는다
+
+    def stream(self, messages, timeout=LLM_TIMEOUT, owner=None, tags=None, **kwargs):
+        """
+        텍스트 조각을 yield 하는 동기 제너레이터.
+        소비자가 중간에 멈추면(rerun 으로 GeneratorExit) finally 에서 요청을 취소한다.
+        timeout 은 연결 시도 1회, 그리고 조각 사이의 최대 대기 시간이다.
+        """
+        out = queue.Queue()
+        fut = asyncio.run_coroutine_threadsafe(self._stream(out, messages, timeout, tags, **kwargs), self.loop)
+        self._track(owner, fut)
+        try:
+            while True:
+                try:
+                    item = out.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"LLM stream idle for {timeout:.0f}s")
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            fut.cancel()
+
+
+_created = None
+
+
+@_cache_resource
+def get_runtime():
+    """프로세스 당 한 번만 만든다 (st.cache_resource)."""
+    global _created
+    if not _has_openai:
+        return None
+    _created = LLMRuntime()
+    return _created
+
+
+def cancel_owner(owner) -> int:
+    """런타임이 이미 만들어졌을 때만 owner 의 진행 중 호출을 취소한다 (런타임을 새로 만들지 않음)."""
+    return _created.cancel_owner(owner) if _created is not None else 0
+
+
+def available() -> bool:
+    return _has_openai
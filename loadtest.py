@@ -0,0 +1,317 @@
+# loadtest.py
+# 브라우저 없이 scene_graph 엔진으로 플레이를 대량 동시 실행해 전이별 지연 시간과 처리량을 잰다.
+# LLM 은 프로세스 내 가짜 구현(지연 분포 + 오류 주입, 내용은 fallbacks.py 의 미리 작성된 내레이션)을 쓰거나,
+# --base-url 로 실제 llm_client 계층(재시도/브레이커/커넥션 풀 포함)을 로컬 대역 서버에 물려 쓴다.
+#
+#   python loadtest.py --players 5000 --concurrency 1000 --policy random
+#   python loadtest.py --policy greedy --llm-ms 900 --error-rate 0.05 --json out.json
+#   python fake_openai_server.py --port 8765 &  python loadtest.py --base-url http://127.0.0.1:8765/v1
+import os
+import sys
+import json
+import time
+import math
+import random
+import asyncio
+import argparse
+from collections import defaultdict, Counter, namedtuple
+
+import fallbacks
+import narration_cache
+import scenes
+import scene_graph
+from scene_graph import Engine, initial_state, split_id, resolve
+
+
+# ==== 가짜 LLM ====
+class FakeLLM:
+    """
+    첫 토큰까지 로그정규 분포 지연 + 토큰 수 / token_rate 초. error_rate 확률로 실패한다.
+    동시 호출은 max_concurrency 로 제한한다 (llm_client 의 세마포어와 같은 역할).
+    """
+
+    def __init__(self, ttft_ms=600.0, sigma=0.5, token_rate=60.0, error_rate=0.0,
+                 max_concurrency=64, seed=None):
+        self.mu = math.log(max(ttft_ms, 1.0) / 1000.0)
+        self.sigma = sigma
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+        self.errors = 0
+
+    async def generate(self, pending, player_name) -> str:
+        template = pending["prompt"]
+        text = fallbacks.fallback_for(template, player_name, narration_cache.personalize(template, player_name))
+        async with self.semaphore:
+            self.calls += 1
+            delay = self.rng.lognormvariate(self.mu, self.sigma)
+            if self.token_rate > 0:
+                delay += len(text) / 2 / self.token_rate  # 한국어 약 2자 = 1토큰
+            await asyncio.sleep(delay)
+            if self.rng.random() < self.error_rate:
+                self.errors += 1
+                raise ConnectionError("injected LLM failure")
+        return text
+
+
+class RuntimeLLM:
+    """game.py 와 같은 경로: prompts.build_messages -> llm_client 런타임 (OpenAI 호환 서버 필요)."""
+
+    def __init__(self, model="gpt-4o-mini"):
+        import llm_client
+        import prompts
+        import telemetry  # noqa: F401  토큰/비용 usage 훅 등록
+        self.prompts = prompts
+        self.runtime = llm_client.get_runtime()
+        if self.runtime is None:
+            raise SystemExit("--base-url 모드에는 openai/httpx 패키지가 필요합니다")
+        self.model = model
+        self.calls = 0
+        self.errors = 0
+
+    async def generate(self, pending, player_name) -> str:
+        messages = self.prompts.build_messages(pending["prompt"], narration_cache.PLACEHOLDER, pending["stage"], pending["sub"],
+                                               keep_name_verbatim=True)
+        self.calls += 1
+        fut = self.runtime.submit(messages, model=self.model, max_tokens=800, temperature=0.7,
+                                  tags={"stage": pending["stage"], "sub": pending["sub"], "purpose": "narration"})
+        try:
+            out = await asyncio.wrap_future(fut)
+        except Exception:
+            self.errors += 1
+            raise
+        return narration_cache.personalize(out, player_name)
+
+
+# ==== 정책 ====
+# policy(rng, engine, state, scene) -> ("choose", Choice) | ("answer", text) | ("timing", text)
+def _answer_text(rng, scene, correct: bool):
+    if scene.kind == "timing":
+        return scene.timing.expected if correct else "빨간색"
+    keywords = scene.answer.keywords
+    if not keywords:
+        return rng.choice(["", "알겠다, 벤지.", "지금 갑니다."])
+    return rng.choice(keywords) if correct else "모르겠다"
+
+
+def _options(engine, state, scene):
+    return [c for c in scene.choices if engine.visible(state, c) and engine.enabled(state, c)]
+
+
+def random_policy(rng, engine, state, scene, accuracy=0.6):
+    if scene.kind in ("answer", "timing"):
+        return scene.kind, _answer_text(rng, scene, rng.random() < accuracy)
+    return "choose", rng.choice(_options(engine, state, scene))
+
+
+def greedy_policy(rng, engine, state, scene):
+    """실패 장면으로 가지 않는 선택 중 신뢰도 변화가 가장 큰 것. 정답은 항상 맞힌다."""
+    if scene.kind in ("answer", "timing"):
+        return scene.kind, _answer_text(rng, scene, True)
+
+    def score(choice):
+        outcome = resolve(choice.outcomes, state)
+        target = engine.graph.nodes[outcome.goto]
+        return (target.kind != "fail", outcome.trust or 0, rng.random())
+    return "choose", max(_options(engine, state, scene), key=score)
+
+
+POLICIES = {"random": random_policy, "greedy": greedy_policy}
+
+
+# ==== 헤드리스 플레이 ====
+# 전이 한 번. before = 전이 전 (stage, sub, trust), kind = game.py 의 기록 종류
+# ("choice" | "answer" | "timing" | "auto" | "retry"), action = choice 는 Choice, answer/timing 은 입력 텍스트,
+# auto/retry 는 None. ok = answer/timing 의 판정 (나머지는 None).
+Step = namedtuple("Step", "before kind action state ok")
+
+
+def start_state(player_name):
+    """시작 장면에 선 새 게임 상태."""
+    state = initial_state(player_name)
+    state["stage"], state["sub"] = split_id(scenes.START)
+    return state
+
+
+def playthrough(engine, state, policy, rng, retries=None, max_steps=None):
+    """
+    헤드리스 플레이 한 판. 전이를 하나 적용할 때마다 Step 을 yield 한다 (loadtest 와 저장/기록 벤치마크가 함께 쓴다).
+    실패 장면에서는 체크포인트가 있고 retries(None 이면 무제한)가 남았으면 재개하고, 아니면 끝낸다.
+    final 장면이나 max_steps 에서도 끝난다. 어디서 끝났는지는 engine.scene(state) 로 본다.
+    yield 사이에 호출자가 state 를 고쳐도 된다 (받아 온 내레이션 반영 등).
+    """
+    steps = 0
+    while max_steps is None or steps < max_steps:
+        scene = engine.scene(state)
+        before = (state["stage"], state["sub"], state["trust"])
+        action = ok = None
+        if scene.kind in scene_graph.TERMINAL_KINDS:
+            if scene.kind != "fail" or not state["checkpoint"] or retries == 0:
+                return
+            if retries is not None:
+                retries -= 1
+            engine.retry(state)
+            kind = "retry"
+        elif scene.auto and engine.run_auto(state, scene):
+            kind = "auto"
+        else:
+            kind, action = policy(rng, engine, state, scene)
+            if kind == "choose":
+                kind = "choice"
+                engine.choose(state, action)
+            elif kind == "answer":
+                ok = engine.submit_answer(state, scene, action)
+            else:
+                ok = engine.submit_timing(state, scene, action)
+        steps += 1
+        yield Step(before, kind, action, state, ok)
+
+
+# ==== 플레이 ====
+class Stats:
+    def __init__(self):
+        self.transitions = defaultdict(list)  # "a/b -> c/d" -> [초]
+        self.endings = Counter()
+        self.narrations = 0
+        self.fallbacks = 0
+        self.retries = 0
+
+    def percentiles(self, values):
+        values = sorted(values)
+        pick = lambda q: values[min(len(values) - 1, max(0, round(q * (len(values) - 1))))]
+        return {"count": len(values), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+
+async def play(idx, llm, policy, stats: Stats, rng, think_ms=0.0, retries=1, max_steps=300):
+    state = start_state(f"요원{idx:05d}")
+
+    def narrate(prompt, use_llm=True, fallback_text=None):
+        # game.py 의 스트리밍 모드처럼 요청만 예약해 두고, 다음 장면을 그리기 전에 받아 온다
+        # 프롬프트 슬라이스는 선택이 일어난 단계 기준이므로 이동 전 stage/sub 를 함께 기록한다
+        fallback = narration_cache.personalize(fallback_text or prompt, state["player_name"])
+        state["pending_narration"] = {"prompt": prompt, "use_llm": use_llm, "fallback": fallback,
+                                      "stage": state["stage"], "sub": state["sub"]}
+
+    engine = Engine(scenes.GRAPH, narrate=narrate, placeholder=narration_cache.PLACEHOLDER)
+    steps = playthrough(engine, state, policy, rng, retries=retries, max_steps=max_steps)
+    while True:
+        started = time.perf_counter()
+        step = next(steps, None)
+        if step is None:
+            break
+        if step.kind == "retry":
+            # 재개 화면의 내레이션(use_llm=False)은 다음 전이에서 함께 처리한다
+            stats.retries += 1
+            continue
+        pending = state["pending_narration"]
+        if pending is not None:
+            state["pending_narration"] = None
+            stats.narrations += 1
+            if pending["use_llm"]:
+                try:
+                    state["show_narrative"] = await llm.generate(pending, state["player_name"])
+                except Exception:
+                    stats.fallbacks += 1
+                    state["show_narrative"] = pending["fallback"]
+            else:
+                state["show_narrative"] = pending["fallback"]
+            scene_graph.attach_narration(state, state["show_narrative"])
+        stats.transitions[f"{step.before[0]}/{step.before[1]} -> {state['stage']}/{state['sub']}"].append(
+            time.perf_counter() - started)
+        if think_ms:
+            await asyncio.sleep(rng.expovariate(1000.0 / think_ms))
+    scene = engine.scene(state)
+    stats.endings[scene.id if scene.kind in scene_graph.TERMINAL_KINDS else "(max_steps)"] += 1
+
+
+async def run(args):
+    if args.base_url:
+        llm = RuntimeLLM()
+    else:
+        llm = FakeLLM(ttft_ms=args.llm_ms, sigma=args.llm_sigma, token_rate=args.token_rate,
+                      error_rate=args.error_rate, max_concurrency=args.llm_concurrency, seed=args.seed)
+    policy = POLICIES[args.policy]
+    stats = Stats()
+    gate = asyncio.Semaphore(args.concurrency)
+    seeds = random.Random(args.seed)
+
+    async def one(i):
+        async with gate:
+            await play(i, llm, policy, stats, random.Random(seeds.random()),
+                       think_ms=args.think_ms, retries=args.retries)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.players)))
+    wall = time.perf_counter() - started
+    return stats, llm, wall
+
+
+def report(stats: Stats, llm, wall: float, top: int):
+    rows = {k: stats.percentiles(v) for k, v in stats.transitions.items()}
+    total = sum(r["count"] for r in rows.values())
+    every = stats.percentiles([x for v in stats.transitions.values() for x in v]) if total else None
+    return {
+        "wall_seconds": wall,
+        "playthroughs": sum(stats.endings.values()),
+        "playthroughs_per_second": sum(stats.endings.values()) / wall if wall else 0.0,
+        "transitions": total,
+        "transitions_per_second": total / wall if wall else 0.0,
+        "narrations": stats.narrations,
+        "llm_calls": llm.calls,
+        "llm_errors": llm.errors,
+        "fallbacks": stats.fallbacks,
+        "retries": stats.retries,
+        "endings": dict(stats.endings.most_common()),
+        "all": every,
+        "slowest": dict(sorted(rows.items(), key=lambda kv: kv[1]["p95"], reverse=True)[:top]),
+    }
+
+
+def print_report(out):
+    ms = lambda s: f"{s * 1000:8.1f}"
+    print(f"플레이 {out['playthroughs']}회 / {out['wall_seconds']:.1f}s "
+          f"({out['playthroughs_per_second']:.1f}/s), 전이 {out['transitions']}회 ({out['transitions_per_second']:.1f}/s)")
+    print(f"LLM 호출 {out['llm_calls']} (오류 {out['llm_errors']}, 대체 내레이션 {out['fallbacks']}), "
+          f"체크포인트 재시도 {out['retries']}")
+    print("엔딩:", ", ".join(f"{k}={v}" for k, v in out["endings"].items()))
+    if out["all"]:
+        a = out["all"]
+        print(f"전체 전이 지연(ms): p50 {ms(a['p50'])}  p95 {ms(a['p95'])}  p99 {ms(a['p99'])}  max {ms(a['max'])}")
+    print(f"\n{'전이':<72}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, r in out["slowest"].items():
+        print(f"{name:<72}{r['count']:>7}{ms(r['p50'])}{ms(r['p95'])}{ms(r['p99'])}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="헤드리스 동시 플레이 부하 테스트")
+    ap.add_argument("--players", type=int, default=1000, help="총 플레이 수")
+    ap.add_argument("--concurrency", type=int, default=500, help="동시에 진행하는 플레이 수")
+    ap.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    ap.add_argument("--retries", type=int, default=1, help="실패 시 체크포인트 재시도 횟수")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="선택 사이 평균 고민 시간(지수 분포)")
+    ap.add_argument("--llm-ms", type=float, default=600.0, help="가짜 LLM 첫 토큰 지연 중앙값")
+    ap.add_argument("--llm-sigma", type=float, default=0.5, help="로그정규 분포 sigma")
+    ap.add_argument("--token-rate", type=float, default=60.0, help="초당 토큰 수 (0 이면 생성 시간 없음)")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--llm-concurrency", type=int, default=64)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--base-url", help="지정하면 가짜 LLM 대신 llm_client 로 이 OpenAI 호환 서버를 호출")
+    ap.add_argument("--top", type=int, default=15, help="p95 기준 느린 전이 몇 개를 보일지")
+    ap.add_argument("--json", help="결과를 JSON 파일로도 저장")
+    args = ap.parse_args(argv)
+    if args.base_url:
+        os.environ["LLM_BASE_URL"] = args.base_url  # llm_client 가 import 될 때 읽는다
+
+    stats, llm, wall = asyncio.run(run(args))
+    out = report(stats, llm, wall, args.top)
+    print_report(out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
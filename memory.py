@@ -0,0 +1,184 @@
+# memory.py
+# 내레이터의 대화 기억. state["history"] 의 (태그, 텍스트) 턴을 토큰 예산 안에서 유지하고,
+# 예산을 넘으면 오래된 턴을 LLM 으로 "지난 이야기" 요약에 접어 넣는다 (비동기, 화면 흐름을 막지 않음).
+# state["memory"] = {"summary": 요약, "decisions": 요약에 접힌 플레이어 턴들} 은 직렬화 가능한 일반 dict 이고,
+# 진행 중인 요약 작업만 state["memory_job"] 에 Future 로 둔다.
+import os
+import hashlib
+
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "1") != "0"
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "400"))        # 최근 턴 창의 토큰 상한
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "200"))    # 요약 길이 상한
+MEMORY_NARRATION_CHARS = int(os.getenv("MEMORY_NARRATION_CHARS", "200"))  # 내레이션 턴은 앞부분만 기억
+MEMORY_KEEP_RECENT = int(os.getenv("MEMORY_KEEP_RECENT", "4"))            # 요약하지 않고 남길 최근 턴 수
+
+# 기억이 반영된 내레이션의 캐시 키에 넣는 이야기 상태 (이야기가 갈라지는 플래그만).
+# 선택 경로 전체를 넣으면 키가 플레이어마다 쪼개져 캐시가 소용없어진다
+# (2000명 무작위 플레이 기준 지시문 38개에 키 1.7만 개, 적중률 상한 32%).
+STORY_FLAGS = ("reported_to_cia", "info_seen", "checkpoint")
+
+NARRATION = "narration"
+CHOICE = "choice"
+
+SUMMARY_PROMPT = (
+    "너는 인터랙티브 게임의 기록 담당이다. [이전 요약]과 [새 사건]을 합쳐 지금까지의 이야기를 "
+    "한국어 {limit}자 이내로 요약하라. 플레이어의 선택과 그 결과, 팀 신뢰에 영향을 준 사건만 남기고 "
+    "묘사는 버린다. 요원 이름 표기는 그대로 둔다."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """대략적인 토큰 수 (한국어 약 2자 = 1토큰)."""
+    return (len(text) + 1) // 2
+
+
+def initial_memory() -> dict:
+    return {"summary": "", "decisions": []}
+
+
+def _line(tag: str, text: str) -> str:
+    if tag == NARRATION:
+        return f"- 내레이션: {text}"
+    if tag == CHOICE or tag.startswith(CHOICE + ":"):
+        return f"- 선택: {text}"
+    if tag.endswith("_wrong"):
+        return f"- 오답 입력: {text}"
+    return f"- 입력: {text}"
+
+
+def _decisions(turns):
+    return [[tag, text] for tag, text in turns if tag != NARRATION]
+
+
+# ==== 기록 ====
+def record(state, tag: str, text: str):
+    state["history"].append((tag, text or ""))
+
+
+def record_choice(state, tag: str, label: str):
+    """tag 는 scene_graph.choice_history (선택지 key), label 은 화면에 보인 문구 (내레이터 기억용)."""
+    record(state, tag, label)
+
+
+def record_narration(state, text: str):
+    """내레이션은 길어서 앞부분만 남긴다. 이름은 호출자가 미리 PLACEHOLDER 로 바꿔서 넘긴다."""
+    text = (text or "").strip()
+    if len(text) > MEMORY_NARRATION_CHARS:
+        text = text[:MEMORY_NARRATION_CHARS].rstrip() + "…"
+    if text:
+        record(state, NARRATION, text)
+
+
+# ==== 조회 ====
+def window_tokens(state) -> int:
+    return sum(estimate_tokens(_line(t, x)) for t, x in state["history"])
+
+
+def signature(state, sets=()) -> str:
+    """
+    이야기 상태(STORY_FLAGS) 해시. 내레이션 캐시 키에 넣어, 이야기가 실제로 갈라지는 지점이 같은
+    플레이어끼리 (기억이 반영된) 내레이션을 공유하게 한다. 선택 경로 전체는 넣지 않는다.
+    sets 는 아직 적용하지 않은 (경로, 값) 플래그 (Outcome.sets) — 미리 생성할 때 그 선택 후의 서명을 계산하려고.
+    """
+    flags = {k: state.get(k) for k in STORY_FLAGS}
+    for path, value in sets:
+        key, _, sub = path.partition(".")
+        if key in flags:
+            flags[key] = {**(flags[key] or {}), sub: value} if sub else value
+    checkpoint = flags["checkpoint"]
+    flags["checkpoint"] = "/".join(checkpoint) if checkpoint else None
+    seen = flags["info_seen"] or {}
+    flags["info_seen"] = sorted(k for k, v in seen.items() if v)
+    return hashlib.sha256(repr(sorted(flags.items())).encode()).hexdigest()
+
+
+def context(state) -> str:
+    """session_tail 에 붙일 기억 블록. 기록이 없으면 빈 문자열."""
+    summary = state["memory"]["summary"]
+    lines = []
+    if summary:
+        lines += ["[지난 이야기]", summary]
+    if state["history"]:
+        lines += ["[최근 진행]"] + [_line(t, x) for t, x in state["history"]]
+    return "\n".join(lines)
+
+
+# ==== 요약(압축) ====
+def _fold_count(state) -> int:
+    """예산 안으로 들어오도록 앞에서부터 접을 턴 수 (최근 MEMORY_KEEP_RECENT 턴은 남김)."""
+    history = state["history"]
+    total = window_tokens(state)
+    n = 0
+    limit = max(0, len(history) - MEMORY_KEEP_RECENT)
+    while n < limit and total > MEMORY_TOKEN_BUDGET // 2:
+        total -= estimate_tokens(_line(*history[n]))
+        n += 1
+    return n
+
+
+def summary_messages(previous: str, turns):
+    limit = MEMORY_SUMMARY_TOKENS * 2
+    body = "\n".join(["[이전 요약]", previous or "(없음)", "[새 사건]"] + [_line(t, x) for t, x in turns])
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT.format(limit=limit)},
+        {"role": "user", "content": body},
+    ]
+
+
+def extractive_summary(previous: str, turns) -> str:
+    """LLM 없이 만드는 요약: 플레이어 턴만 이어 붙이고 뒤쪽 상한 길이만 남긴다."""
+    parts = [previous] if previous else []
+    parts += [_line(t, x)[2:] for t, x in turns if t != NARRATION]
+    text = " / ".join(parts)
+    limit = MEMORY_SUMMARY_TOKENS * 2
+    return text if len(text) <= limit else "…" + text[-limit:]
+
+
+def _fold(state, n: int, summary: str):
+    folded = state["history"][:n]
+    state["memory"] = {
+        "summary": summary.strip()[:MEMORY_SUMMARY_TOKENS * 2],
+        "decisions": state["memory"]["decisions"] + _decisions(folded),
+    }
+    del state["history"][:n]
+
+
+def maybe_compact(state, summarize=None):
+    """
+    창이 예산을 넘으면 앞쪽 턴을 요약에 접는다.
+    summarize(messages) 가 concurrent Future 를 돌려주면 비동기로 처리하고 collect() 에서 반영한다.
+    summarize 가 없으면 추출식 요약으로 즉시 접는다.
+    """
+    if state.get("memory_job") is not None or window_tokens(state) <= MEMORY_TOKEN_BUDGET:
+        return
+    n = _fold_count(state)
+    if n <= 0:
+        return
+    turns = list(state["history"][:n])
+    previous = state["memory"]["summary"]
+    if summarize is None:
+        _fold(state, n, extractive_summary(previous, turns))
+        return
+    try:
+        fut = summarize(summary_messages(previous, turns))
+    except Exception:
+        _fold(state, n, extractive_summary(previous, turns))
+        return
+    state["memory_job"] = {"future": fut, "count": n, "turns": turns, "previous": previous}
+
+
+def collect(state):
+    """끝난 요약 작업이 있으면 반영한다. 매 실행(rerun) 시작 시 호출. 실패하면 추출식 요약으로 접는다."""
+    job = state.get("memory_job")
+    if job is None or not job["future"].done():
+        return
+    state["memory_job"] = None
+    fut = job["future"]
+    summary = None
+    if not fut.cancelled() and fut.exception() is None:
+        summary = fut.result()
+    if not summary:
+        summary = extractive_summary(job["previous"], job["turns"])
+    # 요약이 끝나기 전에 체크포인트 복원 등으로 창이 바뀌었으면 접지 않는다
+    if state["history"][:job["count"]] == job["turns"]:
+        _fold(state, job["count"], summary)
@@ -0,0 +1,139 @@
+# metrics.py
+# 게임 내부 지표(지연 시간, 카운터)를 프로세스 단위로 모은다. 모든 세션이 공유한다.
+# 관측값은 최근 N개 윈도우(백분위 요약용)와 누적 히스토그램(Prometheus 노출용) 두 가지로 쌓는다.
+import re
+import math
+import threading
+from collections import defaultdict, deque
+
+# 초 단위 지연 시간에 맞춘 기본 버킷 (마지막은 +Inf)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, math.inf)
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _percentile(values, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, round(q * (len(values) - 1))))
+    return values[idx]
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)  # 구간별(누적 아님) 개수
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """라벨이 붙은 카운터 + 최근 N개 관측값 윈도우 + 누적 히스토그램."""
+
+    def __init__(self, window: int = 1000, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counters = defaultdict(int)
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.histograms = {}
+        self._bucket_overrides = {}
+
+    def set_buckets(self, name: str, buckets):
+        """이름별 버킷 지정 (토큰 수, 비용처럼 초 단위가 아닌 지표용). 첫 observe 전에 호출."""
+        bounds = tuple(buckets)
+        if bounds[-1] != math.inf:
+            bounds += (math.inf,)
+        self._bucket_overrides[name] = bounds
+
+    def inc(self, name: str, n=1, **labels):
+        with self._lock:
+            self.counters[_key(name, labels)] += n
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.samples[key].append(value)
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = _Histogram(self._bucket_overrides.get(name, self.buckets))
+            hist.add(value)
+
+    def summary(self) -> dict:
+        """{(이름, 라벨): {...}} 형태의 스냅샷."""
+        with self._lock:
+            out = {k: {"count": v} for k, v in self.counters.items()}
+            for k, vals in self.samples.items():
+                vals = list(vals)
+                out[k] = {"count": self.histograms[k].count,
+                          "sum": self.histograms[k].sum,
+                          "p50": _percentile(vals, 0.5),
+                          "p95": _percentile(vals, 0.95)}
+        return out
+
+    def render_prometheus(self, prefix: str = "") -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            hists = sorted((k, (h.bounds, list(h.counts), h.sum, h.count)) for k, h in self.histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = _metric_name(prefix + name)
+            if not metric.endswith("_total"):
+                metric += "_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+        for (name, labels), (bounds, counts, total, count) in hists:
+            metric = _metric_name(prefix + name)
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            running = 0
+            for bound, c in zip(bounds, counts):
+                running += c
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', le),))} {running}")
+            lines.append(f"{metric}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+_NAME_BAD = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _metric_name(name: str) -> str:
+    return _NAME_BAD.sub("_", name)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{_metric_name(k)}="{_escape(str(v))}"' for k, v in labels) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else ("+Inf" if value > 0 else "-Inf")
+    return str(value)
+
+
+metrics = Metrics()
@@ -0,0 +1,188 @@
+# narration_cache.py
+# 내레이션 2단 캐시: 프로세스 내 LRU + 워커 간 공유 캐시(shared_cache.py, SQLite WAL).
+# 지시문은 처음부터 이름 자리에 PLACEHOLDER 를 넣어 만들고(scene_graph.Engine(placeholder=...)),
+# 그 지시문으로 생성한 내레이션을 화면에 그릴 때 실제 이름으로 치환한다.
+import os
+import json
+import time
+import queue
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+
+import shared_cache
+from metrics import metrics
+
+PLACEHOLDER = "[[요원]]"
+
+NAMESPACE = "narration"
+CACHE_TTL = float(os.getenv("NARRATION_CACHE_TTL", str(7 * 24 * 3600)))  # 초
+CACHE_MEM_KEYS = int(os.getenv("NARRATION_CACHE_MEM_KEYS", "256"))
+VARIANTS = int(os.getenv("NARRATION_VARIANTS", "3"))  # 키 당 보관할 변형 수
+
+
+def make_key(template: str, scope: str, model: str, temperature: float) -> str:
+    """(이름 자리가 PLACEHOLDER 인 장면 지시문, 범위(단계/접두부 등), 모델, 온도) → 캐시 키."""
+    h = hashlib.sha256()
+    for part in (template, scope, model, f"{temperature:.2f}"):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def personalize(text: str, player_name) -> str:
+    return text.replace(PLACEHOLDER, player_name or "요원")
+
+
+def personalize_stream(chunks, player_name):
+    """
+    스트리밍 조각에서 PLACEHOLDER 를 치환한다.
+    PLACEHOLDER 가 두 조각에 걸쳐 올 수 있으므로 끝부분 len-1 글자는 다음 조각까지 보류한다.
+    """
+    hold = len(PLACEHOLDER) - 1
+    buf = ""
+    for chunk in chunks:
+        buf = personalize(buf + chunk, player_name)
+        if len(buf) > hold:
+            yield buf[:-hold]
+            buf = buf[-hold:]
+    if buf:
+        yield personalize(buf, player_name)
+
+
+class NarrationCache:
+    """
+    메모리 LRU(키 → 변형 목록) 앞에 워커 간 공유 캐시(shared_cache.py)를 둔 2단 캐시.
+    공유 계층에는 키마다 [[생성 시각, 텍스트], ...] JSON 한 덩어리를 두고, 변형 추가는 한 트랜잭션으로
+    읽고-고쳐-쓰므로 여러 워커가 같은 키에 동시에 추가해도 서로의 변형을 잃지 않는다.
+    """
+
+    def __init__(self, shared=None, ttl=CACHE_TTL, mem_keys=CACHE_MEM_KEYS, variants=VARIANTS):
+        self.ttl = ttl
+        self.mem_keys = mem_keys
+        self.variants = variants
+        self._mem = OrderedDict()  # key -> [(created, text), ...]
+        self._lock = threading.Lock()
+        self._shared = shared      # SharedCache, None(메모리만), 또는 처음 쓸 때 부를 함수
+        self._adds = 0
+        self._writes = queue.Queue()
+        self._writer = None        # add_later 용 쓰기 스레드 (처음 쓸 때 띄운다)
+
+    @property
+    def shared(self):
+        """공유 계층. 생성자에 함수를 받았으면 처음 쓸 때 열어 둔다 (첫 화면 전에는 파일을 열지 않도록)."""
+        if callable(self._shared):
+            self._shared = self._shared()
+        return self._shared
+
+    # ---- 내부 ----
+    def _fresh(self, rows):
+        cutoff = time.time() - self.ttl
+        return [r for r in rows if r[0] >= cutoff]
+
+    def _remember(self, key, rows):
+        self._mem[key] = rows
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_keys:
+            self._mem.popitem(last=False)
+
+    @staticmethod
+    def _decode(blob):
+        return [tuple(r) for r in json.loads(blob)] if blob else []
+
+    def _load(self, key):
+        """메모리 → 공유 계층 순으로 찾는다. (rows, tier). 메모리에 변형이 덜 쌓였으면 다른 워커 것을 확인한다."""
+        rows = self._mem.get(key)
+        if rows is not None:
+            rows = self._fresh(rows)
+            if len(rows) >= self.variants:
+                self._mem.move_to_end(key)
+                return rows, "memory"
+            if not rows:
+                del self._mem[key]
+        if self.shared is None:
+            return (rows, "memory") if rows else ([], None)
+        shared = self._fresh(self._decode(self.shared.get(NAMESPACE, key)))
+        if shared:
+            self._remember(key, shared)
+            return shared, "disk"
+        return (rows, "memory") if rows else ([], None)
+
+    # ---- 공개 API ----
+    def get(self, key):
+        """
+        변형이 variants 개 모두 쌓였으면 그중 하나를 무작위로 돌려준다.
+        아직 덜 쌓였으면 None(= 새 변형을 생성해 add 할 것).
+        """
+        return self.lookup(key)[0]
+
+    def lookup(self, key):
+        """get 과 같되 (텍스트, 적중 계층 "memory" | "disk" | None) 을 돌려준다."""
+        with self._lock:
+            rows, tier = self._load(key)
+        if tier is not None and len(rows) >= self.variants:
+            metrics.inc("narration_cache", result=f"hit_{tier}")
+            return random.choice(rows)[1], tier
+        metrics.inc("narration_cache", result="miss")
+        return None, None
+
+    def has(self, key) -> bool:
+        """get 이 적중할지 여부만 확인한다 (카운터에 반영하지 않음)."""
+        with self._lock:
+            rows, tier = self._load(key)
+        return tier is not None and len(rows) >= self.variants
+
+    def add(self, key, text: str):
+        if not text:
+            return
+        now = time.time()
+        if self.shared is None:
+            with self._lock:
+                rows, _ = self._load(key)
+                self._remember(key, (rows + [(now, text)])[-self.variants:])
+            return
+
+        def merge(blob):
+            rows = self._fresh(self._decode(blob)) + [(now, text)]
+            return json.dumps(rows[-self.variants:], ensure_ascii=False).encode()
+
+        blob = self.shared.update(NAMESPACE, key, merge)
+        with self._lock:
+            self._remember(key, self._decode(blob))
+            self._adds += 1
+            cleanup = self._adds % 200 == 0
+        if cleanup:
+            # 오래 쓰이지 않은 키 정리 (크기 상한에 따른 정리는 shared_cache 가 한다)
+            self.shared.delete_where(NAMESPACE, now - self.ttl)
+
+    def add_later(self, key, text: str):
+        """
+        add 를 전용 쓰기 스레드에서 한다. 공유 계층 쓰기는 SQLite 트랜잭션이라 수 ms~수 초 막힐 수 있으므로,
+        llm-loop 의 완료 콜백처럼 막히면 다른 세션까지 멈추는 곳에서는 이것을 부른다.
+        """
+        if not text:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="narration-cache-writer", daemon=True)
+                self._writer.start()
+        self._writes.put((key, text))
+
+    def _write_loop(self):
+        while True:
+            key, text = self._writes.get()
+            try:
+                self.add(key, text)
+            except Exception:
+                metrics.inc("narration_cache_write_error")
+
+    def stats(self) -> dict:
+        out = {}
+        for (name, labels), v in metrics.summary().items():
+            if name == "narration_cache":
+                out[dict(labels)["result"]] = v["count"]
+        return out
+
+
+cache = NarrationCache(shared_cache.get_shared)
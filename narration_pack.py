@@ -0,0 +1,283 @@
+# narration_pack.py
+# 오프라인 내레이션 팩: 모든 장면 지시문의 내레이션을 미리 N개씩 생성해 바이너리 파일 하나에 담고,
+# 게임은 그 파일을 mmap 으로 열어 LLM 호출 없이 바로 꺼내 쓴다. 팩에 없는 장면만 실시간 생성한다.
+#
+#   python narration_pack.py build --variants 3 --concurrency 8      # 중단돼도 다시 실행하면 이어서 생성
+#   python narration_pack.py build --source fallback                 # LLM 없이 fallbacks.py 로 (형식 확인/비상용)
+#   python narration_pack.py info narration.pack
+#
+# 파일 형식 (리틀 엔디언)
+#   헤더  : magic "MIPK", version u16, 예약 u16, 항목 수 u32, 색인 위치 u64, 메타 위치 u64, 메타 길이 u64
+#   본문  : UTF-8 텍스트를 이어 붙인 것
+#   색인  : (키 32바이트, 본문 위치 u64, 길이 u32) 를 키 순서로 정렬. 같은 키(변형)는 연속으로 놓인다.
+#   메타  : JSON (모델, 온도, 생성 시각, 변형 수, 단계별 접두부 해시)
+import os
+import sys
+import json
+import mmap
+import time
+import random
+import struct
+import hashlib
+import argparse
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import prompts
+from narration_cache import PLACEHOLDER, personalize
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NARRATION_PACK = os.getenv("NARRATION_PACK", os.path.join(BASE_DIR, "narration.pack"))
+
+MAGIC = b"MIPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQQQ")
+ENTRY = struct.Struct("<32sQI")
+
+
+def pack_key(template: str, stage: str) -> bytes:
+    """(단계, 그 단계의 접두부 해시, 이름을 뺀 지시문) → 32바이트 키. 스토리가 바뀌면 자연히 빗나간다."""
+    h = hashlib.sha256()
+    for part in (stage, prompts.prefix_sha(stage), template):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.digest()
+
+
+# ==== 읽기 ====
+class NarrationPack:
+    """mmap 으로 연 팩. 색인은 이진 탐색하므로 열 때 전체를 읽지 않는다."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self._index, meta_off, meta_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a narration pack (v{VERSION}): {path}")
+        self.meta = json.loads(self._mm[meta_off:meta_off + meta_len])
+
+    def _key_at(self, i: int) -> bytes:
+        off = self._index + i * ENTRY.size
+        return self._mm[off:off + 32]
+
+    def variants(self, key: bytes):
+        """키의 모든 변형 텍스트 (없으면 빈 목록)."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        out = []
+        while lo < self.count:
+            k, off, length = ENTRY.unpack_from(self._mm, self._index + lo * ENTRY.size)
+            if k != key:
+                break
+            out.append(self._mm[off:off + length].decode())
+            lo += 1
+        return out
+
+    def get(self, template: str, stage: str):
+        """무작위 변형 하나 (PLACEHOLDER 포함). 없으면 None."""
+        texts = self.variants(pack_key(template, stage))
+        return random.choice(texts) if texts else None
+
+    def has(self, template: str, stage: str) -> bool:
+        return bool(self.variants(pack_key(template, stage)))
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def load(path=None):
+    """팩이 없거나 깨졌으면 None (실시간 생성만 쓴다)."""
+    path = path or NARRATION_PACK
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return NarrationPack(path)
+    except (OSError, ValueError):
+        return None
+
+
+_pack = None
+_loaded = False
+
+
+def get_pack():
+    """프로세스 당 한 번, 처음 찾을 때 연다 (첫 화면을 그리기 전에는 파일을 열지 않도록)."""
+    global _pack, _loaded
+    if not _loaded:
+        _pack, _loaded = load(), True
+    return _pack
+
+
+def lookup(template: str, stage: str):
+    """게임용: 팩에 있는 내레이션(PLACEHOLDER 포함) 또는 None."""
+    pack = get_pack()
+    return pack.get(template, stage) if pack is not None else None
+
+
+def has(template: str, stage: str) -> bool:
+    pack = get_pack()
+    return pack is not None and pack.has(template, stage)
+
+
+# ==== 쓰기 ====
+def write_pack(path: str, records, meta: dict):
+    """records: [(key bytes, text), ...] → 팩 파일. 임시 파일에 쓴 뒤 교체한다."""
+    records = sorted(records, key=lambda r: r[0])
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode()
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        entries = []
+        for key, text in records:
+            data = text.encode()
+            entries.append((key, f.tell(), len(data)))
+            f.write(data)
+        index = f.tell()
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+        meta_off = f.tell()
+        f.write(meta_bytes)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(entries), index, meta_off, len(meta_bytes)))
+    os.replace(tmp, path)
+
+
+def scene_jobs(graph=None):
+    """그래프의 모든 LLM 내레이션 지시문. 선택이 일어나는 장면의 단계 기준으로 (stage, sub, template)."""
+    if graph is None:
+        import scenes
+        graph = scenes.GRAPH
+    jobs, seen = [], set()
+    for scene in graph.nodes.values():
+        for outcome in scene.outcomes():
+            if not (outcome.narrate and outcome.use_llm):
+                continue
+            template = outcome.narrate.format(player_name=PLACEHOLDER)
+            key = pack_key(template, scene.stage)
+            if key not in seen:
+                seen.add(key)
+                jobs.append({"key": key.hex(), "stage": scene.stage, "sub": scene.sub, "template": template})
+    return jobs
+
+
+def _read_journal(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # 중단되며 반쯤 쓰인 마지막 줄
+                done[(row["key"], row["variant"])] = row["text"]
+    return done
+
+
+def build(args) -> int:
+    jobs = scene_jobs()
+    journal = f"{args.out}.journal.jsonl"
+    done = _read_journal(journal)
+    todo = [(job, i) for job in jobs for i in range(args.variants) if (job["key"], i) not in done]
+    print(f"{len(jobs)} 장면 지시문 × {args.variants} 변형: 완료 {len(done)}, 남은 생성 {len(todo)}", flush=True)
+
+    if todo and args.source == "fallback":
+        # 미리 작성된 대체 내레이션은 장면 당 하나뿐이고, 없는 장면은 팩에서 빠진다(실시간 생성)
+        from fallbacks import FALLBACK_NARRATION
+        for job in jobs:
+            text = FALLBACK_NARRATION.get(job["template"])
+            if text is not None:
+                done[(job["key"], 0)] = text
+        todo = []
+    failed = 0
+    if todo:
+        if args.base_url:
+            os.environ["LLM_BASE_URL"] = args.base_url
+        import llm_client
+        import telemetry  # noqa: F401  토큰/비용 usage 훅 등록
+        runtime = llm_client.get_runtime()
+        if runtime is None:
+            print("openai/httpx 패키지와 OPENAI_API_KEY(또는 --base-url)가 필요합니다", file=sys.stderr)
+            return 2
+        started = time.perf_counter()
+        with open(journal, "a", encoding="utf-8") as out:
+            pending, queue = {}, list(todo)
+            while queue or pending:
+                while queue and len(pending) < args.concurrency:
+                    job, i = queue.pop()
+                    messages = prompts.build_messages(job["template"], PLACEHOLDER, job["stage"], job["sub"],
+                                                      keep_name_verbatim=True)
+                    fut = runtime.submit(messages, model=args.model, max_tokens=800, temperature=args.temperature,
+                                         tags={"stage": job["stage"], "sub": job["sub"], "purpose": "pack"})
+                    pending[fut] = (job, i)
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    job, i = pending.pop(fut)
+                    try:
+                        text = fut.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"  실패 {job['stage']}/{job['sub']} #{i}: {e}", file=sys.stderr)
+                        continue
+                    done[(job["key"], i)] = text
+                    # 한 줄씩 바로 기록해 두면 중단돼도 다음 실행이 이어서 한다
+                    out.write(json.dumps({"key": job["key"], "variant": i, "text": text,
+                                          "stage": job["stage"], "sub": job["sub"]}, ensure_ascii=False) + "\n")
+                    out.flush()
+                    n = len(todo) - len(queue) - len(pending)
+                    if n % 10 == 0:
+                        print(f"  {n}/{len(todo)} ({time.perf_counter() - started:.0f}s)", flush=True)
+
+    wanted = {job["key"] for job in jobs}
+    records = [(bytes.fromhex(k), text) for (k, _i), text in done.items() if k in wanted and text]
+    meta = {"model": args.model if args.source == "llm" else "fallback", "temperature": args.temperature,
+            "variants": args.variants, "created": time.time(), "scenes": len(jobs),
+            "prefix_sha": prompts.PREFIX_SHA}
+    write_pack(args.out, records, meta)
+    print(f"{args.out}: {len(records)} 항목 ({os.path.getsize(args.out) / 1024:.0f} KB), 실패 {failed}")
+    if failed:
+        print("실패한 항목은 다시 실행하면 이어서 생성합니다.")
+    return 1 if failed else 0
+
+
+def info(args) -> int:
+    p = NarrationPack(args.path)
+    jobs = scene_jobs()
+    covered = sum(1 for job in jobs if p.variants(bytes.fromhex(job["key"])))
+    meta = {k: v for k, v in p.meta.items() if k != "prefix_sha"}
+    print(json.dumps(meta, ensure_ascii=False))
+    print(f"항목 {p.count}, 현재 장면 지시문 {covered}/{len(jobs)} 포함")
+    stale = [s for s, sha in prompts.PREFIX_SHA.items() if p.meta.get("prefix_sha", {}).get(s) != sha]
+    if stale:
+        print(f"스토리가 바뀐 단계(팩 항목이 빗나감): {', '.join(stale)}")
+    if args.sample:
+        job = random.choice(jobs)
+        print(f"\n[{job['stage']}/{job['sub']}] {job['template']}\n→ {personalize(p.get(job['template'], job['stage']) or '(없음)', '요원')}")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="오프라인 내레이션 팩 빌더")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="모든 장면의 내레이션을 생성해 팩 파일로 쓴다 (이어하기 지원)")
+    b.add_argument("--out", default=NARRATION_PACK)
+    b.add_argument("--variants", type=int, default=3, help="장면 당 변형 수")
+    b.add_argument("--concurrency", type=int, default=8, help="동시에 보낼 요청 수")
+    b.add_argument("--model", default=os.getenv("NARRATION_MODEL", "gpt-4o-mini"))
+    b.add_argument("--temperature", type=float, default=0.9)
+    b.add_argument("--source", choices=("llm", "fallback"), default="llm")
+    b.add_argument("--base-url", default=None, help="OpenAI 호환 서버 주소 (예: fake_openai_server.py)")
+    i = sub.add_parser("info", help="팩 내용 요약")
+    i.add_argument("path", nargs="?", default=NARRATION_PACK)
+    i.add_argument("--sample", action="store_true", help="무작위 항목 하나 출력")
+    args = ap.parse_args(argv)
+    return build(args) if args.cmd == "build" else info(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# prefetch.py
+# 선택지 화면에서 각 선택지의 내레이션을 미리(투기적으로) 생성해 둔다.
+# 플레이어가 고르면 해당 결과만 가져다 쓰고, 나머지는 취소한다.
+import os
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from metrics import metrics
+
+PREFETCH_BUDGET = int(os.getenv("PREFETCH_BUDGET", "24"))   # 세션 당 투기적 호출 상한
+# 고른 선택지의 생성이 아직 진행 중일 때 기다리는 최대 시간(초). 넘으면 버리고 새로 스트리밍한다
+# (클릭 처리 중에 기다리는 동안은 화면에 아무것도 나오지 않으므로, 첫 토큰이 나오는 스트리밍보다 길면 손해).
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", "0.3"))
+
+
+class Prefetcher:
+    """세션 하나의 투기적 생성 작업들. st.session_state 에 보관한다."""
+
+    def __init__(self, budget: int = PREFETCH_BUDGET):
+        self.budget = budget
+        self.futures = {}  # cache key -> Future
+
+    def submit(self, key: str, start):
+        """
+        key 에 대한 작업이 없고 예산이 남아 있으면 start() 로 작업을 시작한다.
+        start 는 concurrent Future 를 돌려주는 함수(llm_client 런타임에 요청을 올림).
+        """
+        if key in self.futures:
+            return
+        if self.budget <= 0:
+            metrics.inc("prefetch", result="over_budget")
+            return
+        self.budget -= 1
+        self.futures[key] = start()
+        metrics.inc("prefetch", result="submitted")
+
+    def take(self, key: str):
+        """
+        고른 선택지의 결과를 돌려주고 나머지는 취소한다.
+        고른 작업이 아직 진행 중이면 PREFETCH_WAIT 만큼만 기다리고, 그래도 안 끝나면 취소하고 None.
+        없거나 실패해도 None(호출자가 직접 생성 — 스트리밍 모드면 첫 토큰부터 바로 보여준다).
+        """
+        fut = self.futures.pop(key, None)
+        self.discard()
+        if fut is None:
+            return None
+        try:
+            out = fut.result(timeout=PREFETCH_WAIT)
+        except FutureTimeout:
+            fut.cancel()
+            metrics.inc("prefetch", result="timeout")
+            return None
+        except Exception:
+            metrics.inc("prefetch", result="failed")
+            return None
+        metrics.inc("prefetch", result="used")
+        return out
+
+    def discard(self):
+        """남은 작업을 버린다. 진행 중이면 HTTP 요청까지 취소되고, 이미 끝났으면 결과는 캐시에만 남는다."""
+        for fut in self.futures.values():
+            if fut.cancel():
+                metrics.inc("prefetch", result="cancelled")
+            else:
+                metrics.inc("prefetch", result="discarded")
+        self.futures.clear()
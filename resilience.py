@@ -0,0 +1,156 @@
+# resilience.py
+# LLM 호출 복원력: 일시적 오류 재시도(지수 백오프 + 지터), 세션 공유 서킷 브레이커, half-open 탐침.
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+from metrics import metrics
+
+RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))        # 최초 호출 포함 최대 시도 횟수
+RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))            # 초
+RETRY_CAP = float(os.getenv("LLM_RETRY_CAP", "8"))                # 초
+BREAKER_WINDOW = float(os.getenv("LLM_BREAKER_WINDOW", "60"))     # 오류율 계산 구간(초)
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+BREAKER_THRESHOLD = float(os.getenv("LLM_BREAKER_THRESHOLD", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # open 유지 시간(초)
+
+
+class CircuitOpenError(RuntimeError):
+    """서킷 브레이커가 열려 있어 호출하지 않았음."""
+
+
+def _openai_errors():
+    """
+    (일시적 오류 타입들, APIStatusError). openai 예외는 openai 를 불러온 뒤에만 생기므로
+    여기서 import 하지 않고 이미 로드된 모듈만 본다 (시작 시간에 openai import 를 넣지 않도록).
+    """
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return (), None
+    return (openai.RateLimitError, openai.APITimeoutError,
+            openai.APIConnectionError, openai.InternalServerError), openai.APIStatusError
+
+
+def is_transient(exc: BaseException) -> bool:
+    """재시도할 가치가 있는 오류인가 (429 / 5xx / 타임아웃 / 연결 오류)."""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    transient, status_error = _openai_errors()
+    if transient and isinstance(exc, transient):
+        return True
+    if status_error is not None and isinstance(exc, status_error):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def backoff(attempt: int) -> float:
+    """attempt(0부터) 번째 재시도 전 대기 시간. full jitter."""
+    return random.uniform(0, min(RETRY_CAP, RETRY_BASE * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    최근 BREAKER_WINDOW 초 동안의 오류율이 임계치를 넘으면 open.
+    BREAKER_COOLDOWN 이 지나면 half-open 으로 한 번에 하나의 탐침 호출만 통과시키고,
+    탐침이 성공하면 closed, 실패하면 다시 open.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probing = False
+        self._outcomes = deque()  # (시각, 성공 여부)
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def is_open(self) -> bool:
+        """쿨다운 중인 open 상태인가 (상태를 바꾸지 않는 조회)."""
+        with self._lock:
+            return self.state == self.OPEN and self.clock() - self.opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        """호출해도 되는가. half-open 에서는 탐침 한 건만 True."""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self):
+        """결과 없이 끝난 호출(취소 등). half-open 탐침 슬롯만 반납한다."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok: bool):
+        with self._lock:
+            now = self.clock()
+            if self.state == self.HALF_OPEN and self._probing:
+                self._probing = False
+                metrics.inc("llm_path", path="probe_ok" if ok else "probe_fail")
+                if ok:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+            self._outcomes.append((now, ok))
+            self._trim(now)
+            if self.state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+                errors = sum(1 for _, good in self._outcomes if not good)
+                if errors / len(self._outcomes) >= self.threshold:
+                    self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        metrics.inc("llm_breaker_opened")
+
+
+breaker = CircuitBreaker()
+
+
+async def call_with_retry(make_call, attempts=RETRY_ATTEMPTS, breaker=breaker):
+    """
+    make_call() 코루틴을 일시적 오류에 한해 재시도한다. 결과는 브레이커에 한 번만 기록한다.
+    브레이커가 열려 있으면 곧바로 CircuitOpenError.
+    """
+    if not breaker.allow():
+        metrics.inc("llm_path", path="breaker_open")
+        raise CircuitOpenError("LLM circuit breaker is open")
+    for attempt in range(attempts):
+        try:
+            result = await make_call()
+        except asyncio.CancelledError:
+            breaker.release()  # 취소는 장애가 아니다
+            raise
+        except Exception as e:
+            if is_transient(e) and attempt + 1 < attempts:
+                metrics.inc("llm_retry", error=type(e).__name__)
+                await asyncio.sleep(backoff(attempt))
+                continue
+            breaker.record(False)
+            metrics.inc("llm_path", path="error")
+            raise
+        breaker.record(True)
+        metrics.inc("llm_path", path="retry_ok" if attempt else "ok")
+        return result
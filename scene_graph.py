@@ -0,0 +1,535 @@
+# scene_graph.py
+# 선언형 장면 그래프와 그 위에서 도는 작은 엔진.
+# 장면(Scene)은 "stage/sub" 문자열 id 로 구분하고, 현재 장면은 dict 조회 한 번으로 찾는다.
+# 상태는 st.session_state 든 일반 dict 든 state["trust"] 처럼 첨자로 읽고 쓴다.
+# 게임 규칙(신뢰도, 체크포인트, 정답 판정)도 여기 있으므로 브라우저 없이 플레이할 수 있다 (loadtest.py).
+import time
+import operator
+from collections.abc import Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional, Tuple
+
+import matcher
+
+RETRY_TEXT = "가장 가까운 체크포인트로 복귀한다. 신뢰도는 50으로 리셋되었다."
+CHECKPOINT_RING = 8  # 세션 당 보관할 체크포인트 스냅샷 수
+# 체크포인트 스냅샷에 담는 상태. 신뢰도/연속 가중치는 복귀 규칙(50, 0)으로 다시 정하고,
+# history 는 내레이터 기억(실패한 시도도 이야기의 일부)이라 되돌리지 않는다.
+CHECKPOINT_KEYS = ("investigation", "info_seen", "reported_to_cia", "attempt_em2", "attempt_s6", "s7_ready_time")
+KINDS = ("choice", "answer", "timing", "auto", "fail", "final")
+TIMING_HISTORY = "user_timing"  # 타이밍 입력의 기록 태그 (답변은 AnswerSpec.history, 선택은 choice_history)
+TERMINAL_KINDS = ("fail", "final")  # 나가는 간선이 없어도 되는 장면
+
+
+class SceneGraphError(ValueError):
+    """장면 그래프 검증 실패 (끊긴 간선, 도달 불가 장면 등)."""
+
+
+# ==== 데이터 정의 ====
+_OPS = {
+    "==": operator.eq, "!=": operator.ne,
+    ">=": operator.ge, ">": operator.gt, "<=": operator.le, "<": operator.lt,
+    "is": operator.is_, "is not": operator.is_not,
+}
+
+
+@dataclass(frozen=True)
+class Guard:
+    """상태 조건. path 는 "trust" 또는 "info_seen.entity" 처럼 점으로 구분한 키."""
+    path: str
+    op: str
+    value: object
+
+    def check(self, state) -> bool:
+        return _OPS[self.op](lookup(state, self.path), self.value)
+
+
+@dataclass(frozen=True)
+class Outcome:
+    """선택/답변의 결과. when 의 조건이 모두 맞는 첫 번째 결과가 적용된다."""
+    goto: str                                   # 이동할 장면 id
+    trust: Optional[int] = None                 # None 이면 신뢰도를 건드리지 않음 (0 은 "무난한 선택")
+    reason: str = ""                            # 신뢰도 변화 사유. {elapsed} 등 문맥 값으로 format
+    narrate: Optional[str] = None               # 장면 지시문. {player_name} 치환
+    fallback: Optional[str] = None
+    use_llm: bool = True
+    when: Tuple[Guard, ...] = ()
+    clear: bool = False                         # 이동 전에 현재 내레이션을 비운다
+    sets: Tuple[Tuple[str, object], ...] = ()   # (경로, 값) 상태 플래그
+    timer: Optional[str] = None                 # 이 상태 키에 현재 시각을 기록
+    investigation: Optional[str] = None         # 조사 목록에 추가할 항목
+    allow_continue: bool = False
+    checkpoint: Optional[str] = None            # 체크포인트로 저장할 장면 id
+
+
+@dataclass(frozen=True)
+class Choice:
+    label: str                                  # {player_name} 치환
+    key: str                                    # 위젯 key (그래프 전체에서 유일)
+    outcomes: Tuple[Outcome, ...]
+    when: Tuple[Guard, ...] = ()                # 버튼을 보여줄 조건
+    enabled: Tuple[Guard, ...] = ()             # 버튼을 누를 수 있는 조건
+    disabled_hint: str = ""
+    seen: Optional[str] = None                  # 이 경로가 참이면 라벨 뒤에 ✅
+    row: int = 0                                # 같은 row 끼리 한 줄(columns)에 놓는다
+
+
+@dataclass(frozen=True)
+class Answer:
+    """주관식 입력. keywords(와 matcher.SYNONYMS 의 동의어) 중 하나라도 부정 없이 포함되면 정답 (비어 있으면 통과)."""
+    label: str
+    input_key: str
+    button: str
+    button_key: str
+    history: str                                # 기록 태그. 오답은 f"{history}_wrong"
+    success: Outcome
+    keywords: Tuple[str, ...] = ()
+    failure: Optional[Outcome] = None
+    attempts: Optional[str] = None              # 시도 횟수를 세는 상태 키
+    hint: str = ""                              # 두 번째 시도부터 보여줄 힌트
+    empty_as: str = ""                          # 빈 입력을 기록할 값
+
+
+@dataclass(frozen=True)
+class Timing:
+    """started 키에 기록된 시각부터 limit 초 안에 expected 를 입력해야 성공."""
+    label: str
+    input_key: str
+    button: str
+    button_key: str
+    expected: str
+    limit: float
+    started: str
+    success: Outcome
+    failure: Outcome
+
+
+@dataclass(frozen=True)
+class Note:
+    text: str
+    when: Tuple[Guard, ...] = ()
+    caption: bool = True                        # False 면 본문(st.write)으로
+
+
+@dataclass(frozen=True)
+class Scene:
+    id: str
+    kind: str = "choice"
+    narrative: bool = False                     # 현재 내레이션을 먼저 그린다
+    lines: Tuple[str, ...] = ()                 # 마크다운 문단
+    notes: Tuple[Note, ...] = ()
+    alert: Optional[Tuple[str, str]] = None     # ("error" | "success" | ..., 문구)
+    choices: Tuple[Choice, ...] = ()
+    auto: Tuple[Outcome, ...] = ()              # 진입 즉시 조건이 맞는 첫 결과를 적용
+    answer: Optional[Answer] = None
+    timing: Optional[Timing] = None
+    divider: bool = False                       # 선택지 줄 사이 구분선
+
+    @property
+    def stage(self) -> str:
+        return self.id.split("/", 1)[0]
+
+    @property
+    def sub(self) -> str:
+        return self.id.split("/", 1)[1]
+
+    def outcomes(self):
+        """이 장면에서 나갈 수 있는 모든 결과 (검증/탐색용)."""
+        out = list(self.auto)
+        for ch in self.choices:
+            out.extend(ch.outcomes)
+        if self.answer is not None:
+            out.append(self.answer.success)
+            if self.answer.failure is not None:
+                out.append(self.answer.failure)
+        if self.timing is not None:
+            out.extend((self.timing.success, self.timing.failure))
+        return out
+
+
+# ==== 상태 접근 ====
+def lookup(state, path: str):
+    head, *rest = path.split(".")
+    value = state[head]
+    for part in rest:
+        value = value[part]
+    return value
+
+
+def assign(state, path: str, value):
+    *parents, last = path.split(".")
+    target = state
+    for part in parents:
+        target = target[part]
+    target[last] = value
+
+
+def split_id(scene_id: str):
+    stage, sub = scene_id.split("/", 1)
+    return stage, sub
+
+
+def passes(guards, state) -> bool:
+    return all(g.check(state) for g in guards)
+
+
+def resolve(outcomes, state) -> Optional[Outcome]:
+    for outcome in outcomes:
+        if passes(outcome.when, state):
+            return outcome
+    return None
+
+
+# ==== 그래프 ====
+class SceneGraph:
+    """id -> Scene 사전. 만들 때 한 번 검증한다."""
+
+    def __init__(self, scenes, start: str):
+        self.start = start
+        self.nodes = {}
+        duplicates = []
+        for scene in scenes:
+            if scene.id in self.nodes:
+                duplicates.append(scene.id)
+            self.nodes[scene.id] = scene
+        problems = [f"중복 장면 id: {d}" for d in duplicates] + self.validate()
+        if problems:
+            raise SceneGraphError("장면 그래프 오류:\n  " + "\n  ".join(problems))
+        # 자유 입력 퍼즐의 정답 판정기를 미리 컴파일해 둔다 (첫 제출에서 컴파일 비용을 치르지 않도록)
+        for scene in self.nodes.values():
+            if scene.answer is not None:
+                matcher.ruleset(scene.answer.keywords)
+
+    def get(self, stage, sub) -> Optional[Scene]:
+        return self.nodes.get(f"{stage}/{sub}")
+
+    def current(self, state) -> Optional[Scene]:
+        return self.nodes.get(f"{state['stage']}/{state['sub']}")
+
+    def edges(self, scene: Scene):
+        for outcome in scene.outcomes():
+            yield outcome.goto
+            if outcome.checkpoint:
+                yield outcome.checkpoint
+
+    def validate(self):
+        """문제 목록을 돌려준다 (비어 있으면 정상)."""
+        problems = []
+        if self.start not in self.nodes:
+            problems.append(f"시작 장면 없음: {self.start}")
+        keys = {}
+        for sid, scene in self.nodes.items():
+            if sid.count("/") != 1:
+                problems.append(f"{sid}: id 는 'stage/sub' 형식이어야 함")
+            if scene.kind not in KINDS:
+                problems.append(f"{sid}: 알 수 없는 kind {scene.kind!r}")
+            if scene.kind == "answer" and scene.answer is None:
+                problems.append(f"{sid}: answer 장면에 answer 정의 없음")
+            if scene.kind == "timing" and scene.timing is None:
+                problems.append(f"{sid}: timing 장면에 timing 정의 없음")
+            if scene.kind == "auto" and not scene.auto:
+                problems.append(f"{sid}: auto 장면에 auto 결과 없음")
+            if scene.kind not in TERMINAL_KINDS and not scene.outcomes():
+                problems.append(f"{sid}: 나가는 간선이 없음")
+            for target in self.edges(scene):
+                if target not in self.nodes:
+                    problems.append(f"{sid}: 없는 장면으로 이동 {target!r}")
+            widget_keys = [ch.key for ch in scene.choices]
+            for spec in (scene.answer, scene.timing):
+                if spec is not None:
+                    widget_keys += [spec.input_key, spec.button_key]
+            for key in widget_keys:
+                if key in keys:
+                    problems.append(f"{sid}: 위젯 key {key!r} 가 {keys[key]} 와 중복")
+                keys[key] = sid
+        if self.start in self.nodes:
+            unreachable = set(self.nodes) - self.reachable()
+            problems += [f"{sid}: 시작 장면에서 도달할 수 없음" for sid in sorted(unreachable)]
+        return problems
+
+    def reachable(self):
+        seen = {self.start}
+        todo = [self.start]
+        while todo:
+            scene = self.nodes.get(todo.pop())
+            if scene is None:
+                continue
+            for target in self.edges(scene):
+                if target not in seen:
+                    seen.add(target)
+                    todo.append(target)
+        return seen
+
+
+# ==== 게임 규칙 (화면 없이 호출 가능) ====
+def initial_state(player_name=None) -> dict:
+    """새 게임의 상태. game.py 의 init_state 도 이 값으로 빈 키를 채운다."""
+    return {
+        "player_name": player_name,
+        "history": [],
+        "game_over": False,
+        "investigation": [],
+        "trust": 0,
+        "streak": 0,
+        "reported_to_cia": None,
+        # 기본 스테이지: intro -> briefing -> info -> story1 -> story2 -> story3 -> ending
+        "stage": "intro",
+        "sub": "",  # 세부 단계
+        "checkpoint": None,
+        "checkpoints": (),  # 체크포인트 스냅샷 링 (오래된 것부터, 최대 CHECKPOINT_RING 개)
+        "info_seen": {"entity": False, "prophecy": False, "cia": False},
+        "attempt_em2": 0,
+        "attempt_s6": 0,
+        "s7_ready_time": None,
+        "allow_continue": False,
+        "show_narrative": "",
+        "pending_narration": None,
+    }
+
+
+def adjust_trust(state, delta: int) -> int:
+    """신뢰도 조정 + 연속 가중치(streak) 반영. 실제 변화량을 돌려준다."""
+    if delta > 0:
+        state["streak"] += 1
+        bonus = 2 * state["streak"]
+    elif delta < 0:
+        state["streak"] -= 1
+        bonus = -2 * abs(state["streak"])
+    else:
+        bonus = 0
+    change = delta + bonus
+    state["trust"] = max(0, min(100, state["trust"] + change))
+    return change
+
+
+# ---- 체크포인트 스냅샷 ----
+# 스냅샷은 읽기 전용(tuple / MappingProxyType)이고, 직전 스냅샷과 값이 같은 항목은 그 객체를 그대로 재사용한다.
+# 링 자체도 tuple 이라 갱신은 새 tuple 을 만드는 것이고, 이미 넘겨준 스냅샷이 나중에 바뀌는 일은 없다.
+def freeze(value, prev=None):
+    if isinstance(value, (list, tuple)):
+        frozen = tuple(freeze(v) for v in value)
+    elif isinstance(value, Mapping):
+        frozen = MappingProxyType({k: freeze(v) for k, v in value.items()})
+    else:
+        return value
+    return prev if prev is not None and prev == frozen else frozen
+
+
+def thaw(value):
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    return value
+
+
+def take_snapshot(state, scene_id: str):
+    """state 의 CHECKPOINT_KEYS 와 지금 화면의 내레이션을 scene_id 체크포인트로 고정한다."""
+    ring = state.get("checkpoints") or ()
+    prev = ring[-1]["state"] if ring else {}
+    frozen = {k: freeze(state[k], prev.get(k)) for k in CHECKPOINT_KEYS if k in state}
+    return MappingProxyType({"scene": split_id(scene_id), "state": MappingProxyType(frozen),
+                             "narration": state["show_narrative"] or ""})
+
+
+def load_checkpoints(items):
+    """직렬화(JSON)됐던 링을 다시 읽기 전용으로 만든다 (session_store)."""
+    return tuple(MappingProxyType({"scene": tuple(item["scene"]), "state": freeze(item["state"]),
+                                   "narration": item["narration"]}) for item in items or ())
+
+
+def set_checkpoint(state, scene_id: str, snapshot=None):
+    """scene_id 를 체크포인트로 정하고 스냅샷(없으면 지금 state 로 만든다)을 링에 넣는다."""
+    snap = snapshot if snapshot is not None else take_snapshot(state, scene_id)
+    ring = tuple(state.get("checkpoints") or ())
+    if ring and ring[-1]["scene"] == snap["scene"]:
+        ring = ring[:-1]  # 같은 체크포인트를 다시 지나면 최신본으로 바꾼다
+    state["checkpoints"] = (ring + (snap,))[-CHECKPOINT_RING:]
+    state["checkpoint"] = snap["scene"]
+
+
+def attach_narration(state, text: str):
+    """
+    스트리밍처럼 전이 뒤에 완성되는 내레이션을 최근 체크포인트에 붙인다.
+    아직 그 체크포인트 장면에 머물러 있고 내레이션이 비어 있을 때만.
+    """
+    ring = state.get("checkpoints") or ()
+    if not (ring and text) or ring[-1]["narration"] or ring[-1]["scene"] != (state["stage"], state["sub"]):
+        return
+    last = ring[-1]
+    state["checkpoints"] = ring[:-1] + (MappingProxyType({**last, "narration": text}),)
+
+
+def restore_checkpoint(state, index: int = -1) -> str:
+    """
+    링의 index 번째 체크포인트로 돌아간다 (기본은 가장 최근). LLM 호출 없이 그때의 상태와 내레이션을 되살리고,
+    신뢰도는 50, 연속 가중치는 0 으로 리셋한다. 되살린 내레이션을 돌려준다 (없으면 "").
+    """
+    ring = state.get("checkpoints") or ()
+    narration = ""
+    if ring:
+        pos = index % len(ring)
+        snap = ring[pos]
+        for k, v in snap["state"].items():
+            state[k] = thaw(v)
+        state["stage"], state["sub"] = state["checkpoint"] = snap["scene"]
+        state["checkpoints"] = ring[:pos + 1]  # 더 나중 체크포인트는 버린다
+        narration = snap["narration"]
+    elif state["checkpoint"]:
+        state["stage"], state["sub"] = state["checkpoint"]
+    state["trust"] = 50
+    state["streak"] = 0
+    state["allow_continue"] = False
+    state["show_narrative"] = narration
+    state["pending_narration"] = None
+    return narration
+
+
+def check_answer(spec: Answer, text) -> bool:
+    """키워드/동의어 적중 여부 (정규화, 부정 가드 포함: matcher.py)."""
+    return matcher.ruleset(spec.keywords).match(text)
+
+
+def check_timing(spec: Timing, text, elapsed: float) -> bool:
+    return (text or "").strip() == spec.expected and elapsed <= spec.limit
+
+
+def choice_history(choice: "Choice") -> str:
+    """선택 한 번의 기록 태그. 버튼 문구(이름이 들어감) 대신 그래프 안에서 유일한 key 로 구분한다."""
+    return f"choice:{choice.key}"
+
+
+# ==== 엔진 ====
+class Engine:
+    """
+    그래프 위에서 선택/답변을 적용한다. 화면과 무관한 부분만 담당하고,
+    화면 쪽 일은 호출자가 넘긴 함수로 위임한다.
+      narrate(prompt, use_llm=True, fallback_text=None)  없으면 지시문(또는 fallback)을 그대로 내레이션으로 쓴다
+      on_trust(change, reason)                           신뢰도 변화 알림 (사이드바 등)
+    placeholder 를 주면 내레이션 지시문의 {player_name} 을 실제 이름 대신 그 문자열로 채운다.
+    이름은 narrate 쪽에서 화면에 그릴 때 넣는다 (지시문/캐시 키가 플레이어와 무관해지도록).
+    """
+
+    def __init__(self, graph: SceneGraph, narrate=None, on_trust=None, placeholder=None):
+        self.graph = graph
+        self.narrate = narrate
+        self.on_trust = on_trust
+        self.placeholder = placeholder
+
+    def _narrate(self, state, prompt, use_llm=True, fallback_text=None):
+        if self.narrate is None:
+            state["show_narrative"] = fallback_text or prompt
+        else:
+            self.narrate(prompt, use_llm=use_llm, fallback_text=fallback_text)
+
+    def scene(self, state) -> Optional[Scene]:
+        return self.graph.current(state)
+
+    # ---- 선택지 표시 ----
+    def visible(self, state, choice: Choice) -> bool:
+        return passes(choice.when, state)
+
+    def enabled(self, state, choice: Choice) -> bool:
+        return passes(choice.enabled, state)
+
+    def label(self, state, choice: Choice) -> str:
+        text = choice.label.format(player_name=state["player_name"])
+        if choice.seen and lookup(state, choice.seen):
+            text += " ✅"
+        return text
+
+    def prefetch_prompts(self, state, scene: Scene):
+        """
+        지금 상태에서 이 장면의 각 선택이 만들 장면 지시문 (투기적 생성용).
+        [(그 결과가 내레이션 전에 세울 플래그 Outcome.sets, 지시문)] — 선택 후의 기억 서명을 미리 계산할 수 있도록.
+        """
+        outcomes = []
+        for ch in scene.choices:
+            if self.visible(state, ch) and self.enabled(state, ch):
+                outcomes.append(resolve(ch.outcomes, state))
+        if scene.answer is not None:
+            outcomes.append(scene.answer.success)
+        if scene.timing is not None:
+            outcomes += [scene.timing.success, scene.timing.failure]
+        name = self.placeholder or state["player_name"]
+        prompts = []
+        for o in outcomes:
+            if o is not None and o.narrate and o.use_llm:
+                item = (o.sets, o.narrate.format(player_name=name))
+                if item not in prompts:
+                    prompts.append(item)
+        return prompts
+
+    # ---- 전이 ----
+    def apply(self, state, outcome: Outcome, **context):
+        # 지금 장면을 체크포인트로 삼는 전이(대개 실패)는 전이 전 상태를 스냅샷으로 남긴다
+        here = f"{state['stage']}/{state['sub']}"
+        early = None
+        if outcome.checkpoint == here and outcome.goto != here:
+            early = take_snapshot(state, here)
+        if outcome.clear:
+            state["show_narrative"] = ""
+        for path, value in outcome.sets:
+            assign(state, path, value)
+        if outcome.timer:
+            state[outcome.timer] = time.time()
+        if outcome.trust is not None:
+            change = adjust_trust(state, outcome.trust)
+            if self.on_trust is not None and outcome.reason:
+                self.on_trust(change, outcome.reason.format(**context))
+        if outcome.narrate:
+            # 내레이션은 선택이 일어난 단계(이동 전 stage)의 프롬프트로 생성한다
+            name = self.placeholder or state["player_name"]
+            prompt = outcome.narrate.format(player_name=name)
+            fallback = outcome.fallback.format(player_name=name) if outcome.fallback else None
+            self._narrate(state, prompt, use_llm=outcome.use_llm, fallback_text=fallback)
+        if outcome.investigation and outcome.investigation not in state["investigation"]:
+            state["investigation"].append(outcome.investigation)
+        if outcome.allow_continue:
+            state["allow_continue"] = True
+        state["stage"], state["sub"] = split_id(outcome.goto)
+        if outcome.checkpoint:
+            set_checkpoint(state, outcome.checkpoint, early)
+
+    def run_auto(self, state, scene: Scene) -> bool:
+        """조건이 맞는 자동 전이가 있으면 적용하고 True."""
+        outcome = resolve(scene.auto, state)
+        if outcome is None:
+            return False
+        self.apply(state, outcome)
+        return True
+
+    def choose(self, state, choice: Choice) -> Optional[Outcome]:
+        outcome = resolve(choice.outcomes, state)
+        if outcome is not None:
+            self.apply(state, outcome)
+        return outcome
+
+    def submit_answer(self, state, scene: Scene, text) -> bool:
+        spec = scene.answer
+        if spec.attempts:
+            state[spec.attempts] += 1
+        ok = check_answer(spec, text)
+        state["history"].append((spec.history if ok else f"{spec.history}_wrong", text or spec.empty_as))
+        outcome = spec.success if ok else spec.failure
+        if outcome is not None:
+            self.apply(state, outcome)
+        return ok
+
+    def submit_timing(self, state, scene: Scene, text, now=None, elapsed=None) -> bool:
+        """elapsed 를 주면(브라우저에서 잰 반응 시간, green_light.py) 서버 시계 대신 그 값으로 판정한다."""
+        spec = scene.timing
+        started = state[spec.started]
+        if elapsed is None:
+            elapsed = (now if now is not None else time.time()) - started if started is not None else float("inf")
+        ok = check_timing(spec, text, elapsed)
+        self.apply(state, spec.success if ok else spec.failure, elapsed=elapsed)
+        state[spec.started] = None
+        return ok
+
+    def retry(self, state):
+        """실패 화면에서 가장 가까운 체크포인트로 돌아간다. 그 장면의 내레이션은 저장해 둔 것을 다시 보여준다."""
+        narration = restore_checkpoint(state)
+        self._narrate(state, RETRY_TEXT, use_llm=False,
+                      fallback_text=f"{RETRY_TEXT}\n\n{narration}" if narration else None)
@@ -0,0 +1,287 @@
+# scenes.py
+# 미션 장면 데이터. 장면을 추가/수정할 때는 이 파일만 고치면 된다 (렌더링은 game.py, 전이는 scene_graph.py).
+# 장면 id 는 "stage/sub". 단계는 intro -> briefing -> info -> story1 -> story2 -> story3 -> ending.
+from scene_graph import Scene, Choice, Outcome, Answer, Timing, Note, Guard, SceneGraph
+
+START = "intro/welcome"
+
+FAIL_ALERT = ("error", "미션 실패. 체크포인트에서 다시 시작하시겠습니까?")
+
+
+# ==== 작성 도우미 ====
+def go(goto, trust=None, reason="", narrate=None, **kw):
+    return Outcome(goto=goto, trust=trust, reason=reason, narrate=narrate, **kw)
+
+
+def pick(label, key, goto, trust=None, reason="", narrate=None, *, when=(), row=0, **kw):
+    """결과가 하나뿐인 선택지."""
+    return Choice(label, key, (go(goto, trust, reason, narrate, **kw),), when=when, row=row)
+
+
+def next_(key, goto, label="다음 →", **kw):
+    """내레이션을 읽은 뒤 다음 장면으로 넘어가는 버튼. 이동 전에 내레이션을 비운다."""
+    return Choice(label, key, (Outcome(goto=goto, clear=True, **kw),))
+
+
+def show(scene_id, key, goto, **kw):
+    """내레이션만 보여주고 "다음 →" 으로 넘어가는 장면."""
+    return Scene(scene_id, narrative=True, choices=(next_(key, goto, **kw),))
+
+
+def fail(scene_id):
+    return Scene(scene_id, kind="fail", narrative=True, alert=FAIL_ALERT)
+
+
+def trust_at_least(n):
+    return Guard("trust", ">=", n)
+
+
+def trust_below(n):
+    return Guard("trust", "<", n)
+
+
+REPORTED = Guard("reported_to_cia", "is", True)
+NOT_REPORTED = Guard("reported_to_cia", "is not", True)
+
+
+# ==== 장면 지시문 ====
+P_WELCOME = "환영 인사와 함께 IMF 합류 여부를 질문하는 장면을 한국어로 영화처럼 생생히 묘사하라. 플레이어는 {player_name}."
+P_BRIEFING = (
+    "어두운 회의실, 조명이 희미하게 깜빡이며 긴장감이 감도는 가운데, 에단 헌트가 당신을 바라보며 입을 엽니다.  \n\n"
+    "\"{player_name}, 당신이 여기까지 온 것은 우연이 아닙니다. 우리는 지금 세계의 운명을 결정짓는 중대한 기로에 서 있습니다. 초강인공지능 '엔티티'가 러시아 핵 잠수함을 장악하고, 전 세계에 재앙을 초래할 위협이 되고 있습니다.\""
+)
+P_HESITATE = "에단이 준비 부족을 지적하며 반드시 정보를 수집해야 한다고 설득하는 장면을 묘사하라."
+P_STOP_INFO = "정보 수집을 마치고, CIA에 보고할지 말지 팀 내부에서 논의하는 장면을 묘사하라."
+P_REPORT = "CIA에 보고가 접수되는 장면. 이 정보가 향후 치명적 변수로 작동할 복선을 깔아라."
+P_NO_REPORT = "보고 없이 움직이기로 결정. 향후 난관을 예고하는 분위기로 전환하라."
+
+P_ACCEPT = "알라나 변장을 준비하는 장면. 그런데 벤지의 가면 기계가 고장나 에단의 가면이 망가진 비상상황을 생생히 묘사하라."
+P_REFUSE = "팀이 설득해 임무를 받아들이도록 유도하는 장면. 결국 임무로 이행."
+P_LINE = "에단이 알라나처럼 속이라고 지시하며 작전 개시. 이제 알라나를 재워야 한다는 긴박한 상황으로 연결하라."
+P_DRUG = "약물로 알라나를 재우고 거래 장소로 향한다. 그녀는 거래 완료까지 깨어나지 않는다."
+P_FIGHT = "몸싸움 끝에 알라나를 제압했지만, 거래 중 그녀가 깨어나 CIA 난입으로 체포, 미션 실패(첫 번째 체크포인트)."
+P_TAKE_MONEY = "계좌 추적으로 정체가 발각되어 체포, 미션 실패(두 번째 체크포인트)."
+P_REFUSE_DEAL = "거래를 중단하고 열쇠 A 회수에 집중한다. 직후, 하늘에서 에단이 낙하산으로 등장! 그러나 키는 키트리지에게 있다."
+P_STEAL = "절묘한 타이밍에 키를 슬쩍하는 장면을 영화적으로 묘사하고, 이어지는 열차 폭파 위기의 순간으로 전환."
+P_TRUST_ETHAN = "에단과 합을 맞춰 극적으로 탈출. **첫 번째 미션 성공**을 선언하라."
+P_PARACHUTE = "혼자 탈출을 시도하다 상황 악화로 미션 실패(세 번째 체크포인트)."
+P_GIVE_KEY = "에단에게 키를 넘기고 도주. 상황 악화로 미션 실패(세 번째 체크포인트)."
+
+P_LUTHER = "가브리엘의 은신처에 도착. 루터가 폭탄과 함께 동굴에 갇힌 긴박한 상황을 묘사하라. 루터가 자신을 희생하려 한다."
+P_LEAVE = "고통스러운 결단 끝에 루터를 잃는다. 그러나 작전은 계속된다."
+P_STAY = "폭발로 전원이 사망, 미션 실패(네 번째 체크포인트)."
+P_BENJI = "신호가 가짜였음을 확인, 한 바퀴 빙 돈 뒤 에단의 직감대로 길을 찾는다. 벤지 신뢰는 살짝 흔들린다."
+P_ETHAN = "숨겨진 통로를 찾아 곧장 중심부로 접근한다."
+P_CHARGE = "과거의 상처를 딛고 전투에 돌입한다."
+P_TALK = "벤지의 해킹이 허위 정보의 벽에 막히며 난관을 겪는다. 결국 전투로 전환."
+P_FORCE = "격전 끝에 가브리엘은 도주. 예측된 패턴대로 움직였다는 찝찝함이 남는다."
+P_TRADE = "일시적으로 열쇠를 손에 넣지만, 엔티티의 새로운 위협이 따라붙는다."
+P_DELEGATE_OK = "협업으로 깔끔하게 열쇠 B를 확보한다."
+P_DELEGATE_FAIL = "신뢰가 부족해 실수가 발생, 가브리엘에게 역으로 빼앗겨 미션 실패."
+
+P_COORDS = "엔티티 코어를 파괴하기 위한 마지막 임무. 에단이 잠수함에서 보내온 암호화된 좌표를 해독해야 한다."
+P_DECODE = "남극/북극을 뒤집어 해석해 정확한 좌표를 파악, 에단과의 교신에 성공한다."
+P_TIMING_OK = "포이즌필이 적시에 뽑히며 엔티티의 통로가 봉쇄된다. 마지막 변수에 대비하라."
+P_TIMING_FAIL = "타이밍을 놓쳐 연결이 길어졌고, 엔티티가 반격한다. 미션 실패(네 번째 체크포인트)."
+P_CIA_ARREST = "키트리지가 전원을 체포. 포이즌필을 압수당해 **게임 실패**로 귀결된다."
+P_BETRAY = "도주를 시도했지만 헬기에 포위되어 체포된다. **미션 실패**."
+P_WITH_TEAM_CIA = "IMF는 체포되고 엔티티의 힘은 정부의 손으로. **미션 실패**."
+P_ETHAN_REBUTS = "에단이 논리로 반박에 성공, 포이즌필을 지키며 **미션 완수**."
+P_WITH_TEAM_WIN = "에단의 기지로 반박에 성공, 포이즌필과 함께 **미션 완수**."
+P_EPILOGUE = "완수 엔딩의 여운과 팀에 남은 상처, 그러나 이어질 평화를 영화적 문체로 간결히 마무리하라."
+
+
+# ==== 장면 ====
+def _info_leaf(sub, text):
+    return Scene(f"info/{sub}", lines=(text, "---"),
+                 choices=(pick("돌아가기", f"{sub}_back", "info/menu"),))
+
+
+def _info_item(label, key, flag, row=0):
+    return Choice(label, key, (go(f"info/{flag}", sets=((f"info_seen.{flag}", True),), investigation=label),),
+                  seen=f"info_seen.{flag}", row=row)
+
+
+SCENES = (
+    # ---- INTRO (환영) ----
+    Scene("intro/welcome", kind="auto",
+          auto=(go("intro/show_welcome_narrative", narrate=P_WELCOME, fallback=P_WELCOME),)),
+    show("intro/show_welcome_narrative", "intro_next", "briefing/show_briefing_intro"),
+
+    # ---- BRIEFING ----
+    Scene("briefing/show_briefing_intro", kind="auto",
+          auto=(go("briefing/ask_join", narrate=P_BRIEFING, fallback=P_BRIEFING),)),
+    Scene("briefing/ask_join", narrative=True, choices=(
+        pick("IMF에 합류한다", "brief_join_yes", "briefing/show_choose_narrative", +10, "IMF 합류 결심", clear=True),
+        pick("망설인다", "brief_join_no", "briefing/show_choose_narrative", -10, "주저", P_HESITATE),
+    )),
+    Scene("briefing/show_choose_narrative", narrative=True,
+          lines=("---", "**[1. 임무 브리핑]**",
+                 "이제 첫 번째 임무를 선택해야 합니다. 정보를 더 수집하시겠습니까, 아니면 바로 출발하시겠습니까?"),
+          choices=(
+              pick("정보를 더 수집한다", "brief_info", "info/menu", clear=True),
+              pick("바로 출발한다", "brief_go", "briefing/ask_join", -10, "준비 미흡", P_HESITATE),  # 다시 합류 유도로
+          )),
+
+    # ---- INFO (정보 수집) ----
+    Scene("info/menu", divider=True,
+          lines=("**[2. 정보 수집]** 아래에서 조사할 '정보의 종류'를 선택하세요.",),
+          choices=(
+              _info_item("엔티티에 관한 정보", "menu_entity", "entity"),
+              _info_item("인물들에 관한 예언", "menu_prophecy", "prophecy"),
+              _info_item("CIA에 대한 정보", "menu_cia", "cia"),
+              Choice("조사를 중단한다.", "menu_stop", (go("info/show_report_narrative", narrate=P_STOP_INFO),),
+                     enabled=(Guard("info_seen.entity", "is", True),),
+                     disabled_hint="※ 엔티티 정보는 반드시 한 번 확인해야 조사를 중단할 수 있습니다.", row=1),
+          )),
+    _info_leaf("entity", "**'엔티티에 관한 정보'**: 초강인공지능. 스스로 학습 및 선택을 진행하며, 가짜 정보를 생성해 외부를 교란시킬 수 있고, 미래를 예언할 수 있다."),
+    _info_leaf("prophecy", "**'인물들에 관한 예언'**: 결국 에단 헌트는 엔티티의 대리인이 된다. 동료인 루터는 사망하게 될 것이며, 이 세계는 엔티티에 의해 지배될 것이다."),
+    _info_leaf("cia", "**'CIA에 대한 정보'**: IMF의 상관 격인 집단 CIA(미정보국) 내부에 스파이가 있으며, 이 스파이가 엔티티와 내통 중이다."),
+    Scene("info/show_report_narrative", narrative=True, lines=("**조사 내용 보고 여부**",), choices=(
+        pick("CIA에 보고를 결정한다.", "report_yes", "story1/show_story1_intro", -5, "IMF의 위기 암시", P_REPORT,
+             sets=(("reported_to_cia", True),)),
+        pick("보고 없이 임무를 진행한다.", "report_no", "story1/show_story1_intro", +10, "독자적 판단", P_NO_REPORT,
+             sets=(("reported_to_cia", False),)),
+    )),
+
+    # ---- STORY1: 열쇠 A ----
+    show("story1/show_story1_intro", "to_s1_mission_accept", "story1/accept_mission"),
+    Scene("story1/accept_mission", lines=("**[스토리1: 열쇠 A]** 임무를 수락하시겠습니까?",), choices=(
+        pick("예", "s1_accept_yes", "story1/show_emergency1_narrative", +10, "임무 수락", P_ACCEPT),
+        pick("아니오", "s1_accept_no", "story1/show_emergency1_narrative", -10, "임무 거부", P_REFUSE),
+    )),
+    show("story1/show_emergency1_narrative", "to_emergency1_line_intro", "story1/emergency1_line_intro"),
+    Scene("story1/emergency1_line_intro", kind="answer",
+          lines=("**🚨 첫 번째 비상상황**: 에단의 가면이 망가졌다. 어떻게 대처할까?",),
+          answer=Answer("벤지의 호출에 대답하세요 (대사 한 줄):", "s1_line", "대사 전송", "s1_line_send",
+                        history="user_line", empty_as="(무언)",
+                        success=go("story1/show_choice1_narrative", narrate=P_LINE))),
+    show("story1/show_choice1_narrative", "to_choice1_sleep", "story1/choice1_sleep",
+         checkpoint="story1/choice1_sleep"),
+    Scene("story1/choice1_sleep", lines=("**선택 상황1**: 알라나를 어떻게 재울까?",), choices=(
+        pick("약물로 재운다", "s1_sleep_drug", "story1/show_choice2_narrative", 0, "무난한 선택", P_DRUG),
+        pick("몸싸움으로 재운다", "s1_sleep_fight", "story1/s1_fail_narrative", -10, "무리한 방법", P_FIGHT,
+             allow_continue=True),
+    )),
+    show("story1/show_choice2_narrative", "to_choice2_deal", "story1/choice2_deal"),
+    Scene("story1/choice2_deal", lines=("**선택 상황2**: 키트리지가 천만 달러 송금을 제안한다. 받는가?",), choices=(
+        pick("받는다 (계좌 입력)", "s1_deal_accept", "story1/s1_fail_narrative", -10, "탐욕 노출", P_TAKE_MONEY,
+             allow_continue=True, checkpoint="story1/choice2_deal"),
+        pick("거래를 파기한다", "s1_deal_refuse", "story1/show_emergency2_narrative", +10, "임무 우선", P_REFUSE_DEAL),
+    )),
+    show("story1/show_emergency2_narrative", "to_emergency2_theft", "story1/emergency2_theft"),
+    Scene("story1/emergency2_theft", kind="answer",
+          lines=("**🚨 두 번째 비상상황**: 키트리지에게 있는 열쇠 A를 어떻게 할까?",),
+          answer=Answer("당신의 결정(키워드 포함 가능):", "s1_em2", "결정 전송", "s1_em2_send",
+                        history="user_em2", keywords=("도둑질", "훔", "훔친다", "훔쳐"), attempts="attempt_em2",
+                        hint="힌트: 당신은 '도둑질'을 잘하기로 유명해서 국제 수배된 상태였다!",
+                        success=go("story1/show_emergency3_narrative", +10, "과감한 기지", P_STEAL,
+                                   investigation="열쇠 A 획득", sets=(("attempt_em2", 0),)),
+                        failure=go("story1/emergency2_theft", -10, "오답"))),
+    show("story1/show_emergency3_narrative", "to_emergency3_train", "story1/emergency3_train",
+         checkpoint="story1/emergency3_train"),
+    Scene("story1/emergency3_train", lines=("**🚨 세 번째 비상상황**: 다리가 끊긴 열차! 어떻게 탈출할까?",), choices=(
+        pick("에단을 신뢰한다", "s1_train_trust_ethan", "story2/show_s2_intro_narrative", +10, "에단 신뢰", P_TRUST_ETHAN),
+        pick("혼자 낙하산으로 탈출", "s1_train_parachute", "story1/s1_fail_narrative", -10, "팀워크 붕괴", P_PARACHUTE,
+             allow_continue=True),
+        pick("에단에게 키를 넘기고 도주", "s1_train_givekey", "story1/s1_fail_narrative", -10, "미션 실패", P_GIVE_KEY,
+             allow_continue=True),
+    )),
+    fail("story1/s1_fail_narrative"),
+
+    # ---- STORY2: 열쇠 B ----
+    show("story2/show_s2_intro_narrative", "to_emergency4_luther_narrative", "story2/emergency4_luther_narrative",
+         narrate=P_LUTHER),
+    show("story2/emergency4_luther_narrative", "to_emergency4_luther_choice", "story2/emergency4_luther_choice",
+         checkpoint="story2/emergency4_luther_choice"),
+    Scene("story2/emergency4_luther_choice", lines=("**🚨 네 번째 비상상황**: 루터가 폭탄과 함께 동굴에 갇혔다.",), choices=(
+        pick("루터를 두고 3명만 탈출한다", "s2_luther_leave", "story2/show_s2_choice3_narrative", -10, "희생의 결정", P_LEAVE),
+        pick("루터 곁에 남는다(모두 사망, 실패)", "s2_luther_stay", "ending/fail", -10, "무모한 선택", P_STAY,
+             allow_continue=True),
+    )),
+    show("story2/show_s2_choice3_narrative", "to_choice3_benji_vs_ethan", "story2/choice3_benji_vs_ethan"),
+    Scene("story2/choice3_benji_vs_ethan", lines=("**선택 상황3**: 가짜 신호 속 길찾기 — 누구의 판단을 따를까?",), choices=(
+        pick("벤지의 신호 추적", "s2_choice3_benji", "story2/show_s2_choice4_narrative", +10, "팀 신뢰도 증가(경험치)", P_BENJI),
+        pick("에단의 직감", "s2_choice3_ethan", "story2/show_s2_choice4_narrative", +12, "에단 신뢰 상승", P_ETHAN),
+    )),
+    show("story2/show_s2_choice4_narrative", "to_choice4_gabriel_taunt", "story2/choice4_gabriel_taunt"),
+    Scene("story2/choice4_gabriel_taunt", lines=("**선택 상황4**: 가브리엘이 과거의 약점을 들춰 혼란을 조장한다.",), choices=(
+        pick("정면돌파(대화 시간 끌지 않음)", "s2_choice4_force", "story2/show_s2_choice5_narrative", +10, "동요 억제", P_CHARGE),
+        pick("대화로 시간 번다(해킹 시도)", "s2_choice4_talk", "story2/show_s2_choice5_narrative", -10, "허위 정보에 막힘", P_TALK,
+             row=1),
+    )),
+    show("story2/show_s2_choice5_narrative", "to_choice5_get_keyB", "story2/choice5_get_keyB",
+         checkpoint="story2/choice5_get_keyB"),
+    Scene("story2/choice5_get_keyB", lines=("**선택 상황5**: 열쇠 B를 어떻게 확보할까?",),
+          notes=(Note("예언이 떠오른다: 힘으로 빼앗는 미래가 예측되어 있었다…", when=(Guard("info_seen.prophecy", "is", True),)),),
+          choices=(
+              pick("힘으로 빼앗는다", "s2_choice5_force", "story3/show_s3_intro_narrative", +5, "정면 승부", P_FORCE,
+                   investigation="열쇠 B 획득"),
+              pick("가브리엘과 거래한다", "s2_choice5_trade", "story3/show_s3_intro_narrative", +12, "위험한 거래", P_TRADE,
+                   investigation="열쇠 B 획득"),
+              Choice("다른 팀원에게 맡긴다(신뢰 65↑ 필요)", "s2_choice5_delegate", (
+                  go("story3/show_s3_intro_narrative", +10, "책임 분담 성공", P_DELEGATE_OK,
+                     when=(trust_at_least(65),), investigation="열쇠 B 획득"),
+                  go("ending/fail", -10, "불충분한 신뢰", P_DELEGATE_FAIL, allow_continue=True),
+              )),
+          )),
+
+    # ---- STORY3: 엔티티 붕괴 ----
+    show("story3/show_s3_intro_narrative", "to_choice6_coords_narrative", "story3/choice6_coords_narrative",
+         narrate=P_COORDS),
+    show("story3/choice6_coords_narrative", "to_choice6_coords", "story3/choice6_coords",
+         checkpoint="story3/choice6_coords"),
+    Scene("story3/choice6_coords", kind="answer",
+          lines=("**선택 상황6**: 좌표 해석 — [남위 82.5°, 서경 65.3°] (우리는 북극해)",),
+          answer=Answer("에단이 일부러 이렇게 보낸 이유는?", "s3_s6", "해석 제출", "s3_s6_submit",
+                        history="user_s6", keywords=("반대로", "정반대", "거꾸로"), attempts="attempt_s6",
+                        hint="힌트: 에단이 보낸 건 '남극해' 좌표. 당신이 있는 곳은 '북극해'.",
+                        success=go("story3/show_s7_narrative", +10, "의도 간파", P_DECODE,
+                                   sets=(("attempt_s6", 0),)),
+                        failure=go("story3/choice6_coords", -10, "오해"))),
+    show("story3/show_s7_narrative", "to_choice7_timing_intro", "story3/choice7_timing_intro"),
+    Scene("story3/choice7_timing_intro",
+          lines=("**선택 상황7**: 네트워크 연결 '찰나'에 포이즌필을 뽑아야 한다.",),
+          notes=(Note("미션 설명을 숙지했으면 준비를 누르세요. 잠시 뒤 불시에 초록불 신호가 오면 **10초 이내**에 '초록색'을 정확히 "
+                      "입력하면 성공! 신호 전에 누르면 실패입니다.", caption=False),),
+          choices=(pick("{player_name}. 준비되셨습니까?", "s3_ready", "story3/choice7_timing", timer="s7_ready_time"),)),
+    Scene("story3/choice7_timing", kind="timing",
+          timing=Timing("지금! 입력하세요 👉", "s3_go_input", "전송", "s3_go_send",
+                        expected="초록색", limit=10.0, started="s7_ready_time",
+                        success=go("story3/show_s8_narrative", +10, "완벽한 타이밍({elapsed:.1f}s)", P_TIMING_OK),
+                        failure=go("story3/s3_fail_narrative", -10, "타이밍 실패({elapsed:.1f}s)", P_TIMING_FAIL,
+                                   allow_continue=True))),
+    fail("story3/s3_fail_narrative"),
+    show("story3/show_s8_narrative", "to_choice8_cia_end", "story3/choice8_cia_end"),
+    Scene("story3/choice8_cia_end",
+          lines=("**선택 상황8**: CIA의 등장과 결말",),
+          notes=(
+              Note("※ 당신은 2단계에서 CIA에 보고했습니다.", when=(REPORTED,)),
+              Note("※ 당신은 2단계에서 CIA에 보고하지 않았습니다.", when=(NOT_REPORTED,)),
+              Note("팀 신뢰도 70 미만 — 결단을 내려야 한다.", when=(REPORTED, trust_below(70)), caption=False),
+              Note("팀 신뢰도 70 미만 — 결정 필요.", when=(NOT_REPORTED, trust_below(70)), caption=False),
+          ),
+          # 신뢰도 70 이상이면 선택 없이 결말로 간다
+          auto=(
+              go("ending/fail", narrate=P_CIA_ARREST, when=(REPORTED, trust_at_least(70))),
+              go("ending/success", +10, "에단의 기지", P_ETHAN_REBUTS, when=(NOT_REPORTED, trust_at_least(70))),
+          ),
+          choices=(
+              pick("배신하고 엔티티의 힘을 노린다", "s3_choice8_betray", "ending/fail", -10, "배신", P_BETRAY,
+                   when=(REPORTED,)),
+              pick("팀과 함께 간다", "s3_choice8_withteam", "ending/fail", +5, "팀 동행", P_WITH_TEAM_CIA,
+                   when=(REPORTED,)),
+              pick("배신하고 힘을 쥔다", "s3_choice8_betray2", "ending/fail", -10, "배신", P_BETRAY,
+                   when=(NOT_REPORTED,)),
+              pick("팀과 함께 간다(에단 반박)", "s3_choice8_withteam2", "ending/success", +10, "팀워크 회복", P_WITH_TEAM_WIN,
+                   when=(NOT_REPORTED,)),
+          )),
+
+    # ---- ENDING ----
+    fail("ending/fail"),
+    Scene("ending/success", narrative=True, alert=("success", "**IMF, MISSION COMPLETE.**"),
+          choices=(pick("에필로그 →", "to_final_narrative", "ending/final", narrate=P_EPILOGUE),)),
+    Scene("ending/final", kind="final", narrative=True),
+)
+
+GRAPH = SceneGraph(SCENES, start=START)
@@ -0,0 +1,371 @@
+# session_store.py
+# 게임 진행 상태를 프로세스 밖에 저장해 서버 재시작/워커 교체 후에도 이어서 플레이할 수 있게 한다.
+# 상태는 이어하기 토큰(URL 의 ?g=...)을 키로 한 압축 스냅샷 한 덩어리로 저장하고,
+# 저장은 write-behind: 클릭 처리 중에는 직렬화 후 대기열에 넣기만 하고, 백그라운드 스레드가 모아서 한 번에 쓴다.
+#
+#   SESSION_STORE=sqlite (기본) | redis | memory | off
+#   SESSION_DB=.cache/sessions.sqlite3   REDIS_URL=redis://localhost:6379/0
+import os
+import sys
+import json
+import time
+import zlib
+import atexit
+import secrets
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+from importlib.util import find_spec
+from types import MappingProxyType
+
+import scene_graph
+from metrics import metrics
+
+# redis 패키지는 SESSION_STORE=redis 로 백엔드를 만들 때만 불러온다 (첫 화면 전 import 비용 없음)
+_has_redis = find_spec("redis") is not None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite")
+SESSION_DB = os.getenv("SESSION_DB", os.path.join(BASE_DIR, ".cache", "sessions.sqlite3"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(14 * 24 * 3600)))             # 초
+SESSION_FLUSH_SECONDS = float(os.getenv("SESSION_FLUSH_SECONDS", "0.2"))      # 모아 쓰는 주기
+SESSION_DEDUP_KEYS = int(os.getenv("SESSION_DEDUP_KEYS", "4096"))             # 변화 없는 저장을 거르려고 기억할 토큰 수
+
+# 스냅샷에 넣는 키 (scene_graph.initial_state 의 게임 상태 + 내레이터 기억).
+# prefetcher / memory_job 같은 Future 를 들고 있는 키와 위젯 키는 넣지 않는다.
+SNAPSHOT_KEYS = (
+    "player_name", "history", "game_over", "investigation", "trust", "streak", "reported_to_cia",
+    "stage", "sub", "checkpoint", "checkpoints", "info_seen", "attempt_em2", "attempt_s6", "s7_ready_time",
+    "allow_continue", "show_narrative", "pending_narration", "memory",
+)
+FORMAT_VERSION = 1
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(12)
+
+
+# ==== 직렬화 ====
+def snapshot(state) -> dict:
+    return {k: state[k] for k in SNAPSHOT_KEYS if k in state}
+
+
+def _jsonable(value):
+    if isinstance(value, MappingProxyType):  # 체크포인트 스냅샷 (scene_graph.freeze)
+        return dict(value)
+    raise TypeError(f"not serializable: {type(value).__name__}")
+
+
+def dumps(state) -> bytes:
+    """상태 → 압축 JSON 바이트 (수 KB 이하라 zlib 레벨 1 로 충분)."""
+    body = {"v": FORMAT_VERSION, "s": snapshot(state)}
+    return zlib.compress(json.dumps(body, ensure_ascii=False, separators=(",", ":"), default=_jsonable).encode(), 1)
+
+
+def loads(blob: bytes):
+    """dumps 의 역. 형식이 다르거나 깨졌으면 None."""
+    try:
+        body = json.loads(zlib.decompress(blob))
+    except (zlib.error, ValueError):
+        return None
+    if body.get("v") != FORMAT_VERSION:
+        return None
+    state = body["s"]
+    # JSON 은 튜플을 리스트로 돌려주므로 원래 모양으로 되돌린다
+    if "history" in state:
+        state["history"] = [tuple(turn) for turn in state["history"]]
+    if state.get("checkpoint") is not None:
+        state["checkpoint"] = tuple(state["checkpoint"])
+    if "checkpoints" in state:
+        state["checkpoints"] = scene_graph.load_checkpoints(state["checkpoints"])
+    return state
+
+
+# ==== 저장소 백엔드 ====
+class MemoryBackend:
+    """프로세스 내 dict. 단일 워커 개발용이자 Redis 백엔드의 로컬 대역 (같은 get/put_many/delete 인터페이스)."""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._data = {}  # token -> (만료 시각, blob)
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            item = self._data.get(token)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._data[token]
+                return None
+            return item[1]
+
+    def put_many(self, items):
+        expires = time.time() + self.ttl
+        with self._lock:
+            for token, blob in items:
+                self._data[token] = (expires, blob)
+
+    def delete(self, token):
+        with self._lock:
+            self._data.pop(token, None)
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """
+    SQLite WAL 파일. 여러 워커 프로세스가 같은 파일을 열어도 되고(읽기는 쓰기를 막지 않음),
+    put_many 한 번이 트랜잭션 하나 = fsync 한 번이다.
+    """
+
+    def __init__(self, path=SESSION_DB, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " token TEXT PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated)")
+
+    def get(self, token):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM sessions WHERE token = ? AND updated >= ?", (token, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sessions (token, data, updated) VALUES (?, ?, ?)",
+                    [(token, blob, now) for token, blob in items],
+                )
+                self._writes += 1
+                if self._writes % 500 == 0:
+                    self._db.execute("DELETE FROM sessions WHERE updated < ?", (now - self.ttl,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def delete(self, token):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RedisBackend:
+    """Redis (또는 호환 서버). 배치는 파이프라인 한 번으로 보내고, 만료는 서버의 TTL 에 맡긴다."""
+
+    def __init__(self, url=REDIS_URL, ttl=SESSION_TTL, prefix="mi:session:"):
+        if not _has_redis:
+            raise RuntimeError("redis package not installed")
+        import redis
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self._r = redis.Redis.from_url(url)
+
+    def get(self, token):
+        return self._r.get(self.prefix + token)
+
+    def put_many(self, items):
+        pipe = self._r.pipeline(transaction=False)
+        for token, blob in items:
+            pipe.set(self.prefix + token, blob, ex=self.ttl)
+        pipe.execute()
+
+    def delete(self, token):
+        self._r.delete(self.prefix + token)
+
+    def close(self):
+        self._r.close()
+
+
+def make_backend(kind=None):
+    kind = (kind or SESSION_STORE).lower()
+    if kind == "off":
+        return None
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "redis":
+        return RedisBackend()
+    return SQLiteBackend()
+
+
+# ==== write-behind ====
+class SessionStore:
+    """
+    save() 는 직렬화해서 토큰별 최신본만 대기열(dict)에 남기고 바로 돌아온다.
+    flusher 스레드가 flush_interval 마다 대기열을 통째로 가져가 backend.put_many 한 번으로 쓴다.
+    load() 는 아직 쓰이지 않은 대기열부터 본다.
+    """
+
+    def __init__(self, backend, flush_interval=SESSION_FLUSH_SECONDS, dedup_keys=SESSION_DEDUP_KEYS):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.dedup_keys = dedup_keys
+        self._pending = {}          # token -> blob (아직 쓰지 않은 최신본)
+        self._last = OrderedDict()  # token -> 마지막으로 대기열에 넣은 blob 의 crc32 (LRU, 변화 없으면 건너뜀)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="session-store", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def save(self, token, state):
+        started = time.perf_counter()
+        blob = dumps(state)
+        crc = zlib.crc32(blob)
+        with self._lock:
+            if self._last.get(token) == crc:
+                self._last.move_to_end(token)
+                return
+            self._remember(token, crc)
+            self._pending[token] = blob
+        metrics.observe("session_save_seconds", time.perf_counter() - started)
+
+    def load(self, token):
+        """토큰의 상태 dict. 없거나 만료/손상이면 None."""
+        if not token:
+            return None
+        with self._lock:
+            blob = self._pending.get(token)
+        if blob is None:
+            try:
+                blob = self.backend.get(token)
+            except Exception:
+                metrics.inc("session_store", result="load_error")
+                return None
+        state = loads(blob) if blob else None
+        metrics.inc("session_store", result="resumed" if state else "miss")
+        if state is not None:
+            with self._lock:
+                self._remember(token, zlib.crc32(blob))
+        return state
+
+    def _remember(self, token, crc):
+        """잠금을 쥔 채로 부른다. 오래 저장하지 않은 토큰부터 잊는다 (잊으면 다음 저장이 한 번 더 쓰일 뿐)."""
+        self._last[token] = crc
+        self._last.move_to_end(token)
+        while len(self._last) > self.dedup_keys:
+            self._last.popitem(last=False)
+
+    def forget(self, token):
+        with self._lock:
+            self._pending.pop(token, None)
+            self._last.pop(token, None)
+        try:
+            self.backend.delete(token)
+        except Exception:
+            metrics.inc("session_store", result="delete_error")
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        try:
+            self.backend.put_many(batch.items())
+        except Exception:
+            # 다음 주기에 다시 쓴다. 그 사이 더 새로운 저장이 있으면 그쪽이 우선.
+            with self._lock:
+                for token, blob in batch.items():
+                    self._pending.setdefault(token, blob)
+            metrics.inc("session_store", result="flush_error")
+            return 0
+        metrics.observe("session_flush_seconds", time.perf_counter() - started)
+        metrics.inc("session_store", len(batch), result="written")
+        return len(batch)
+
+    def _loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=2.0)
+        self.flush()
+        self.backend.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """프로세스 당 하나. SESSION_STORE=off 이면 None."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = make_backend()
+            if backend is None:
+                return None
+            _store = SessionStore(backend)
+        return _store
+
+
+# ==== 벤치마크 ====
+def main(argv=None):
+    import random
+    import tempfile
+    import scenes
+    from loadtest import playthrough, random_policy, start_state
+
+    ap = argparse.ArgumentParser(description="세션 저장 지연 측정 (클릭 한 번 = save 한 번)")
+    ap.add_argument("--backend", default="sqlite", choices=("sqlite", "memory"))
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--clicks", type=int, default=40, help="세션 당 클릭 수")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteBackend(os.path.join(tmp, "s.sqlite3")) if args.backend == "sqlite" else MemoryBackend()
+        store = SessionStore(backend)
+        engine = scene_graph.Engine(scenes.GRAPH)
+        tokens, states = [new_token() for _ in range(args.sessions)], []
+        for i in range(args.sessions):
+            state = start_state(f"요원{i}")
+            state["show_narrative"] = "내레이션 " * 80
+            states.append(state)
+        plays = [playthrough(engine, state, random_policy, rng) for state in states]
+        lat = []
+        for _ in range(args.clicks):
+            for token, state, play in zip(tokens, states, plays):
+                next(play, None)  # 끝난 판도 클릭 한 번 = 저장 한 번으로 센다
+                started = time.perf_counter()
+                store.save(token, state)
+                lat.append(time.perf_counter() - started)
+        store.close()
+        lat.sort()
+        p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000
+        print(f"backend={args.backend} saves={len(lat)} p50={p(0.5):.3f}ms p99={p(0.99):.3f}ms max={lat[-1] * 1000:.3f}ms")
+        check = SQLiteBackend(os.path.join(tmp, "s.sqlite3")) if args.backend == "sqlite" else backend
+        ok = all(loads(check.get(t))["stage"] == s["stage"] for t, s in zip(tokens, states))
+        print(f"all sessions restorable: {ok}")
+    return 0 if ok and p(0.99) < 1.0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
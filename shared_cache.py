@@ -0,0 +1,167 @@
+# shared_cache.py
+# 여러 Streamlit 워커 프로세스가 함께 쓰는 캐시 계층 (SQLite WAL 파일 하나).
+# 한 워커가 만든 내레이션/인코딩한 배경/읽은 BGM 을 다른 워커가 그대로 가져다 쓴다.
+# 페이지는 mmap 으로 읽으므로 데이터는 OS 페이지 캐시에 한 번만 올라가고, 워커 수가 늘어도 메모리가 늘지 않는다.
+# 전체 크기는 SHARED_CACHE_MB 로 제한하고, 넘으면 가장 오래 쓰이지 않은 항목부터 지운다.
+#
+#   SHARED_CACHE_DB=.cache/shared.sqlite3   SHARED_CACHE_MB=256
+import os
+import time
+import sqlite3
+import threading
+
+from metrics import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_CACHE_DB = os.getenv("SHARED_CACHE_DB", os.path.join(BASE_DIR, ".cache", "shared.sqlite3"))
+SHARED_CACHE_MB = int(os.getenv("SHARED_CACHE_MB", "256"))
+TOUCH_SECONDS = 60.0    # 읽을 때 사용 시각을 갱신하는 최소 간격 (매 읽기마다 쓰지 않도록)
+EVICT_TO = 0.9          # 상한을 넘으면 이 비율까지 줄인다
+EVICT_BATCH = 64        # 정리할 때 한 번에 읽는 오래된 항목 수
+
+
+class SharedCache:
+    """
+    (namespace, key) → bytes. 쓰기는 BEGIN IMMEDIATE 트랜잭션이라 여러 프로세스가 동시에 써도 안전하고,
+    update() 로 읽고-고쳐-쓰기도 한 트랜잭션 안에서 할 수 있다.
+    """
+
+    def __init__(self, path=SHARED_CACHE_DB, max_bytes=SHARED_CACHE_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10.0, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # 캐시라서 전원 장애 시 마지막 몇 건을 잃어도 된다
+        self._db.execute(f"PRAGMA mmap_size={max(max_bytes * 2, 64 * 1024 * 1024)}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " used REAL NOT NULL, PRIMARY KEY (ns, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries(used)")
+        # 전체 크기는 쓰기마다 같은 트랜잭션에서 증감해 두고 (매번 SUM 하지 않도록), 처음 만들 때만 한 번 센다
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO meta (name, value) "
+                         "SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries")
+
+    # ---- 내부 ----
+    def _write(self, fn):
+        """fn(db) 를 쓰기 트랜잭션 안에서 실행한다. 다른 프로세스가 쓰는 중이면 timeout 까지 기다린다."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._db)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            return result
+
+    @staticmethod
+    def _grow(db, delta: int):
+        if delta:
+            db.execute("UPDATE meta SET value = value + ? WHERE name = 'bytes'", (delta,))
+
+    @staticmethod
+    def _size(db, ns, key) -> int:
+        row = db.execute("SELECT size FROM entries WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+        return row[0] if row else 0
+
+    def _evict(self, db):
+        """상한을 넘었으면 가장 오래 쓰이지 않은 항목부터 EVICT_BATCH 개씩 지운다 (used 인덱스 순서로)."""
+        total = db.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * EVICT_TO)
+        freed, evicted = 0, 0
+        while freed < target:
+            rows = db.execute("SELECT ns, key, size FROM entries ORDER BY used LIMIT ?", (EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+            for ns, key, size in rows:
+                if freed >= target:
+                    break
+                db.execute("DELETE FROM entries WHERE ns = ? AND key = ?", (ns, key))
+                freed += size
+                evicted += 1
+        self._grow(db, -freed)
+        metrics.inc("shared_cache_evicted", evicted)
+
+    def _put(self, db, ns, key, value: bytes):
+        old = self._size(db, ns, key)
+        db.execute("INSERT OR REPLACE INTO entries (ns, key, value, size, used) VALUES (?, ?, ?, ?, ?)",
+                   (ns, key, value, len(value), time.time()))
+        self._grow(db, len(value) - old)
+
+    # ---- 공개 API ----
+    def get(self, ns: str, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT value, used FROM entries WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+        if row is None:
+            metrics.inc("shared_cache", ns=ns, result="miss")
+            return None
+        metrics.inc("shared_cache", ns=ns, result="hit")
+        now = time.time()
+        if now - row[1] > TOUCH_SECONDS:
+            try:
+                self._write(lambda db: db.execute("UPDATE entries SET used = ? WHERE ns = ? AND key = ?", (now, ns, key)))
+            except sqlite3.OperationalError:
+                pass  # 사용 시각 갱신은 놓쳐도 된다
+        return row[0]
+
+    def put(self, ns: str, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        def fn(db):
+            self._put(db, ns, key, value)
+            self._evict(db)
+        self._write(fn)
+
+    def update(self, ns: str, key: str, fn):
+        """
+        fn(이전 값 또는 None) → 새 값(None 이면 삭제). 다른 워커의 동시 갱신을 잃지 않도록
+        읽기와 쓰기를 한 쓰기 트랜잭션 안에서 한다. 새 값을 돌려준다.
+        """
+        def tx(db):
+            row = db.execute("SELECT value FROM entries WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+            value = fn(row[0] if row else None)
+            if value is None:
+                self._grow(db, -self._size(db, ns, key))
+                db.execute("DELETE FROM entries WHERE ns = ? AND key = ?", (ns, key))
+            else:
+                self._put(db, ns, key, value)
+                self._evict(db)
+            return value
+        return self._write(tx)
+
+    def delete_where(self, ns: str, older_than: float):
+        """ns 에서 used 가 older_than 보다 오래된 항목을 지운다 (TTL 정리용)."""
+        def fn(db):
+            freed = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE ns = ? AND used < ?",
+                               (ns, older_than)).fetchone()[0]
+            db.execute("DELETE FROM entries WHERE ns = ? AND used < ?", (ns, older_than))
+            self._grow(db, -freed)
+        self._write(fn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT ns, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY ns").fetchall()
+        return {ns: {"entries": n, "bytes": size} for ns, n, size in rows}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared():
+    """프로세스 당 하나. SHARED_CACHE_DB 가 비어 있으면 None (프로세스 내 캐시만 쓴다)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None and SHARED_CACHE_DB:
+            try:
+                _shared = SharedCache()
+            except sqlite3.Error:
+                return None
+        return _shared
@@ -0,0 +1,132 @@
+# telemetry.py
+# LLM 호출 단위 계측: 장면(stage/sub)별 지연, 토큰, 추정 비용, 캐시 적중/대체 내레이션 여부.
+# 집계는 metrics.py 가 하고, 여기서는 기록 도우미와 내보내기(Prometheus HTTP 엔드포인트 / 파일 주기 저장)를 맡는다.
+#
+#   METRICS_PORT=9464        -> http://<host>:9464/metrics
+#   METRICS_FILE=metrics.prom -> METRICS_FLUSH_SECONDS 마다 원자적으로 덮어쓴다 (node_exporter textfile collector 호환)
+import os
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import llm_client
+from metrics import metrics
+
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "mi_")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))           # 0 이면 HTTP 엔드포인트를 띄우지 않음
+METRICS_FILE = os.getenv("METRICS_FILE", "")                 # 비어 있으면 파일로 내보내지 않음
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "15"))
+
+# 1M 토큰당 USD (입력, 캐시된 입력, 출력). LLM_PRICES 에 같은 모양의 JSON 을 주면 덮어쓴다.
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+metrics.set_buckets("llm_prompt_tokens_per_call", (256, 512, 1024, 2048, 4096, 8192))
+metrics.set_buckets("llm_completion_tokens_per_call", (64, 128, 256, 512, 1024))
+metrics.set_buckets("llm_cost_usd_per_call", (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+
+
+def estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens) -> float:
+    """모르는 모델이면 0."""
+    price = PRICES.get(model)
+    if price is None:
+        return 0.0
+    inp, cached, out = price
+    fresh = max(0, prompt_tokens - cached_tokens)
+    return (fresh * inp + cached_tokens * cached + completion_tokens * out) / 1_000_000
+
+
+# ==== 기록 ====
+@llm_client.on_usage
+def record_usage(info):
+    """응답 usage 를 토큰/비용 카운터와 호출당 히스토그램으로 남긴다 (이벤트 루프 스레드에서 호출됨)."""
+    labels = {"model": info["model"], **info.get("tags", {})}
+    cost = estimate_cost(info["model"], info["prompt_tokens"], info["cached_tokens"], info["completion_tokens"])
+    metrics.inc("llm_prompt_tokens", info["prompt_tokens"], **labels)
+    metrics.inc("llm_cached_prompt_tokens", info["cached_tokens"], **labels)
+    metrics.inc("llm_completion_tokens", info["completion_tokens"], **labels)
+    metrics.inc("llm_cost_usd", cost, **labels)
+    metrics.observe("llm_prompt_tokens_per_call", info["prompt_tokens"], **labels)
+    metrics.observe("llm_completion_tokens_per_call", info["completion_tokens"], **labels)
+    metrics.observe("llm_cost_usd_per_call", cost, **labels)
+
+
+def narration(stage, sub, source, seconds=None, ttft=None):
+    """
+    내레이션 한 건의 출처와 지연. source 는 다음 중 하나:
+    pack / cache_memory / cache_disk / prefetch / llm / fallback / breaker_open / static
+    """
+    metrics.inc("narration", stage=stage, sub=sub, source=source)
+    if seconds is not None:
+        metrics.observe("narration_seconds", seconds, stage=stage, sub=sub, source=source)
+    if ttft is not None:
+        metrics.observe("llm_ttft_seconds", ttft, stage=stage, sub=sub)
+
+
+def render() -> str:
+    return metrics.render_prometheus(METRICS_PREFIX)
+
+
+# ==== 내보내기 ====
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def flush_to_file(path=None):
+    """Prometheus 텍스트를 임시 파일에 쓴 뒤 교체한다 (수집기가 반쯤 쓴 파일을 읽지 않도록)."""
+    path = path or METRICS_FILE
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def _flush_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_to_file(path)
+        except OSError:
+            pass
+
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def start_exporters(port=None, path=None, interval=None):
+    """프로세스 당 한 번만 내보내기 스레드를 띄운다. 이후 호출은 아무 일도 하지 않는다."""
+    global _started
+    port = METRICS_PORT if port is None else port
+    path = METRICS_FILE if path is None else path
+    interval = METRICS_FLUSH_SECONDS if interval is None else interval
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError:
+            server = None  # 다른 프로세스가 이미 포트를 쓰는 중
+        if server is not None:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if path:
+        threading.Thread(target=_flush_loop, args=(path, interval), name="metrics-flush", daemon=True).start()
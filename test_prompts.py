@@ -0,0 +1,26 @@
+# test_prompts.py
+# 단계별 프롬프트 슬라이스(prompts.STAGE_SECTIONS)가 장면 그래프의 모든 단계를 덮는지 검사한다.
+# 단계가 빠지거나 섹션 헤더가 어긋나면 앱은 죽지 않고 전체 프롬프트로 대신하므로 (비용만 늘어난다) 여기서 잡는다.
+#   python -m pytest -q test_prompts.py
+import pytest
+
+import prompts
+import scenes
+
+STAGES = sorted({scene.stage for scene in scenes.SCENES})
+
+
+@pytest.mark.parametrize("stage", STAGES)
+def test_every_scene_stage_has_sections(stage):
+    assert stage in prompts.STAGE_SECTIONS
+
+
+@pytest.mark.parametrize("stage", sorted(prompts.STAGE_SECTIONS))
+def test_slices_are_nonempty_and_shorter_than_full_prompt(stage):
+    _, sections = prompts.parse_sections(prompts.BASE_PROMPT)
+    for name in prompts.STAGE_SECTIONS[stage]:
+        assert sections.get(name), f"{stage}: section {name!r} is empty"
+    prefix = prompts.prefix_for(stage)
+    assert prefix
+    assert len(prefix) < len(prompts.prefix_for("(unknown)"))
+    assert prompts.prefix_sha(stage) == prompts.PREFIX_SHA[stage]
@@ -0,0 +1,250 @@
+# walkthrough.py
+# 브라우저 없이 streamlit.testing(AppTest)으로 game.py 를 실제로 클릭해 보는 스모크 검사.
+# 이름 등록 → 선택지(합류, 정보 메뉴 → 엔티티 → 돌아가기) → 답변(대사 / "훔친다") → 실패 장면 → 체크포인트 재개
+# → 전체 리셋까지 한 바퀴 돌면서, 매 클릭마다 스크립트 예외가 없는지와 기대한 장면에 도착했는지 확인한다.
+# AppTest 의 클릭은 전체 실행으로 처리되므로, 조각(st.fragment) 안의 버튼이 전체 실행 중에 눌린 경우
+# (rerun_fragment 가 scope="fragment" 를 쓰면 안 되는 경우)도 함께 검사된다.
+# AppTest 는 조각만 다시 실행하는 경로를 돌지 않으므로, --live 는 실제 `streamlit run` 서버에 브라우저처럼
+# 웹소켓으로 붙어 조각 재실행을 보낸다: 첫 화면 배경 조각의 타이머 재실행, 사이드바 BGM 버튼, 장면 패널 버튼.
+#
+#   python walkthrough.py              # 실패하면 종료 코드 1
+#   python walkthrough.py --verbose    # 단계마다 도착한 장면 출력
+#   python walkthrough.py --live       # 위에 더해 실제 서버에서 조각 재실행 검사 (websockets 패키지 필요)
+#   LLM_BASE_URL=http://127.0.0.1:8765/v1 python walkthrough.py   # fake_openai_server.py 에 물려서
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from importlib.util import find_spec
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(BASE_DIR, "game.py")
+TIMEOUT = float(os.getenv("WALKTHROUGH_TIMEOUT", "60"))
+
+# (동작, 위젯 key, 입력값, 도착해야 할 장면 "stage/sub")
+STEPS = (
+    ("name", "name_input", "테스터", "intro/show_welcome_narrative"),
+    ("click", "intro_next", None, "briefing/ask_join"),
+    ("click", "brief_join_yes", None, "briefing/show_choose_narrative"),
+    ("click", "brief_info", None, "info/menu"),
+    ("click", "menu_entity", None, "info/entity"),
+    ("click", "entity_back", None, "info/menu"),
+    ("click", "menu_stop", None, "info/show_report_narrative"),
+    ("click", "report_no", None, "story1/show_story1_intro"),
+    ("click", "to_s1_mission_accept", None, "story1/accept_mission"),
+    ("click", "s1_accept_yes", None, "story1/show_emergency1_narrative"),
+    ("click", "to_emergency1_line_intro", None, "story1/emergency1_line_intro"),
+    ("answer", "s1_line", "알라나입니다, 거래를 시작하죠.", "story1/show_choice1_narrative"),
+    ("click", "to_choice1_sleep", None, "story1/choice1_sleep"),
+    ("click", "s1_sleep_drug", None, "story1/show_choice2_narrative"),
+    ("click", "to_choice2_deal", None, "story1/choice2_deal"),
+    ("click", "s1_deal_refuse", None, "story1/show_emergency2_narrative"),
+    ("click", "to_emergency2_theft", None, "story1/emergency2_theft"),
+    ("answer", "s1_em2", "모르겠다", "story1/emergency2_theft"),
+    ("answer", "s1_em2", "몰래 훔친다", "story1/show_emergency3_narrative"),
+    ("click", "to_emergency3_train", None, "story1/emergency3_train"),
+    ("click", "s1_train_parachute", None, "story1/s1_fail_narrative"),
+    ("click", "retry_checkpoint", None, "story1/emergency3_train"),
+    ("click", "s1_train_trust_ethan", None, "story2/show_s2_intro_narrative"),
+)
+
+
+def _send_key(input_key):
+    """답변 입력칸 key → 같은 장면의 전송 버튼 key."""
+    import scenes
+    for scene in scenes.SCENES:
+        if scene.answer is not None and scene.answer.input_key == input_key:
+            return scene.answer.button_key
+    raise KeyError(input_key)
+
+
+def _step(at, action, key, value):
+    if action == "name":
+        at.text_input(key=key).input(value)
+        at.button[0].click()  # 폼의 "등록" 버튼 (폼 제출 버튼은 key 가 없다)
+    elif action == "answer":
+        at.text_input(key=key).input(value)
+        at.button(key=_send_key(key)).click()
+    else:
+        at.button(key=key).click()
+    return at.run()
+
+
+def walk(verbose=False):
+    """STEPS 를 차례로 실행하고 실패 메시지 목록을 돌려준다 (비어 있으면 통과)."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=TIMEOUT).run()
+    if at.exception:
+        return [f"첫 화면: {at.exception[0].value}"]
+    for i, (action, key, value, expected) in enumerate(STEPS, 1):
+        try:
+            at = _step(at, action, key, value)
+        except (KeyError, IndexError) as e:
+            return [f"{i:2d} {action} {key}: 위젯 없음 ({e})"]
+        if at.exception:
+            return [f"{i:2d} {action} {key}: 스크립트 예외 {at.exception[0].value}"]
+        ss = at.session_state
+        arrived = f"{ss['stage']}/{ss['sub']}"
+        if verbose:
+            print(f"{i:2d} {action:6s} {key:24s} → {arrived} (신뢰도 {ss['trust']})")
+        if arrived != expected:
+            return [f"{i:2d} {action} {key}: {expected} 이어야 하는데 {arrived}"]
+    # 마지막으로 전체 리셋 → 이름 등록 폼으로 돌아와야 한다
+    at = at.button(key="reset_all").click().run()
+    if at.exception:
+        return [f"reset_all: 스크립트 예외 {at.exception[0].value}"]
+    if not any(w.key == "name_input" for w in at.text_input):
+        return ["reset_all: 이름 등록 폼이 다시 그려지지 않음"]
+    return []
+
+
+# ==== 실제 서버 (조각 재실행) ====
+class LiveSession:
+    """브라우저 대신 /_stcore/stream 웹소켓으로 BackMsg 를 보내고, 실행 하나가 끝날 때까지 ForwardMsg 를 모은다."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.script_hash = ""
+        self.query = ""
+        self.widgets = {}    # 위젯 key → 위젯 id (가장 최근에 그려진 것)
+        self.fragments = {}  # 위젯 key → 그 위젯을 그린 조각 id
+        self.auto_rerun = None
+
+    async def run(self, fragment_id="", auto=False, trigger=None, text=None):
+        """한 번 실행하고 (그린 요소들, 끝난 상태) 를 돌려준다. trigger/text: {위젯 key: 값}."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        rerun = msg.rerun_script
+        rerun.query_string, rerun.page_script_hash = self.query, self.script_hash
+        rerun.fragment_id, rerun.is_auto_rerun = fragment_id, auto
+        for key, value in (trigger or {}).items():
+            state = rerun.widget_states.widgets.add(id=self.widgets[key])
+            state.trigger_value = value
+        for key, value in (text or {}).items():
+            rerun.widget_states.widgets.add(id=self.widgets[key], string_value=value)
+        await self.ws.send(msg.SerializeToString())
+        elements = []
+        while True:
+            out = ForwardMsg()
+            out.ParseFromString(await asyncio.wait_for(self.ws.recv(), TIMEOUT))
+            kind = out.WhichOneof("type")
+            if kind == "new_session":
+                self.script_hash = out.new_session.main_script_hash
+            elif kind == "page_info_changed":
+                self.query = out.page_info_changed.query_string
+            elif kind == "auto_rerun":
+                self.auto_rerun = out.auto_rerun.fragment_id
+            elif kind == "delta" and out.delta.WhichOneof("type") == "new_element":
+                element = out.delta.new_element
+                elements.append(element)
+                widget = getattr(element, element.WhichOneof("type"))
+                wid = getattr(widget, "id", "")
+                if wid.startswith("$$ID-"):
+                    key = wid.split("-", 2)[2]
+                    self.widgets[key], self.fragments[key] = wid, out.delta.fragment_id
+            elif kind == "script_finished" and out.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return elements, out.script_finished
+
+
+def _errors(elements):
+    return [e.exception.message for e in elements if e.WhichOneof("type") == "exception"]
+
+
+def _text(elements):
+    return "\n".join(e.markdown.body for e in elements if e.WhichOneof("type") == "markdown")
+
+
+async def _live_checks(port, verbose):
+    import websockets
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    fragment_done = ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY
+    failures = []
+
+    def check(name, elements, finished, ok):
+        errors = _errors(elements)
+        if verbose:
+            print(f"live {name:26s} finished={finished} elements={len(elements)}")
+        if errors or finished != fragment_done or not ok:
+            failures.append(f"live {name}: finished={finished} errors={errors[:1]}")
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None) as ws:
+        live = LiveSession(ws)
+        elements, _ = await live.run()
+        if _errors(elements) or live.auto_rerun is None:
+            return [f"live 첫 화면: {_errors(elements)[:1] or '배경 조각의 타이머가 없음'}"]
+        # 1) 배경 조각: 첫 화면 뒤 타이머 재실행에서 배경 <style> 을 넣는다
+        elements, finished = await live.run(live.auto_rerun, auto=True)
+        check("lazy_bg auto rerun", elements, finished, "background" in _text(elements))
+        # 2) 사이드바 조각의 BGM 버튼: rerun_fragment → scope="fragment"
+        elements, finished = await live.run(live.fragments["bgm_start"], trigger={"bgm_start": True})
+        check("sidebar bgm_start", elements, finished,  # 오디오 요소 (파일이 없으면 안내 문구)
+              any(e.WhichOneof("type") == "audio" for e in elements) or "BGM 파일" in _text(elements))
+        # 3) 등록(전체 실행) 뒤 장면 패널 조각의 버튼: rerun_scene → scope="fragment"
+        submit = next(k for k in live.widgets if k.startswith("FormSubmitter:name_form"))
+        elements, _ = await live.run(text={"name_input": "테스터"}, trigger={submit: True})
+        if _errors(elements) or "intro_next" not in live.widgets:
+            return failures + [f"live 등록: {_errors(elements)[:1] or '장면 패널이 그려지지 않음'}"]
+        elements, finished = await live.run(live.fragments["intro_next"], trigger={"intro_next": True})
+        check("scene_panel intro_next", elements, finished, any(
+            e.WhichOneof("type") == "button" and e.button.id == live.widgets.get("brief_join_yes") for e in elements))
+    return failures
+
+
+def live(verbose=False):
+    """game.py 를 실제 서버로 띄워 조각 재실행 경로를 검사하고 실패 메시지 목록을 돌려준다."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen([sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true",
+                               "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+                              cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), 0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    return ["live: 서버가 뜨지 않음"]
+                time.sleep(0.1)
+        return asyncio.run(_live_checks(port, verbose))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="AppTest 로 game.py 를 한 바퀴 클릭해 보는 스모크 검사")
+    ap.add_argument("--verbose", action="store_true", help="단계마다 도착한 장면 출력")
+    ap.add_argument("--live", action="store_true", help="실제 서버에서 조각 재실행 경로도 검사")
+    args = ap.parse_args(argv)
+    sys.path.insert(0, BASE_DIR)
+    try:
+        import streamlit  # noqa: F401
+    except ImportError:
+        print("streamlit 이 설치되어 있지 않아 건너뜀")
+        return 0
+    failures = walk(args.verbose)
+    if args.live and not failures:
+        if find_spec("websockets") is None:
+            print("websockets 패키지가 없어 --live 검사를 건너뜀")
+        else:
+            failures = live(args.verbose)
+    for msg in failures:
+        print(f"FAIL {msg}")
+    if not failures:
+        print(f"OK {len(STEPS)}단계")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())